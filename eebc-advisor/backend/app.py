@@ -1,78 +1,85 @@
 import os
-from flask import Flask, request, jsonify
+import json
+import time
+import threading
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 
+from rag.net import request_deadline
+# Index paths and sources (env-overridable) live in a side-effect-free module the CLI shares
+from rag.paths import FAISS_PATH, CHUNKS_PATH, MANIFEST_PATH, LOCK_PATH, SOURCES
+from rag.metrics import request_trace, observe_request, render as render_metrics, CONTENT_TYPE, METRICS_CONFIG
+
 app = Flask(__name__)
 CORS(app)
 
-APP_DIR = os.path.dirname(__file__)
-DATA_DIR = os.path.join(APP_DIR, "data")
-PDF_PATH = os.path.join(DATA_DIR, "EEBC 2021.pdf")
-FAISS_PATH = os.path.join(DATA_DIR, "index.faiss")
-CHUNKS_PATH = os.path.join(DATA_DIR, "chunks.json")
-XLSX_PATH = os.path.join(DATA_DIR, "application-and-compliance-forms-for-energy-efficiency-building-code.xlsx")
-
-# Allow overriding paths via environment variables
-FAISS_PATH = os.getenv("FAISS_PATH", FAISS_PATH)
-CHUNKS_PATH = os.getenv("CHUNKS_PATH", CHUNKS_PATH)
 SKIP_INDEX_BUILD = os.getenv("SKIP_INDEX_BUILD", "false").lower() in ("1", "true", "yes")
+# Seconds a chat request may spend on provider calls (retries included); keep below gunicorn's --timeout
+REQUEST_BUDGET_S = float(os.getenv("REQUEST_BUDGET_S", "60"))
+# Load the index when this module is imported: in the gunicorn master with --preload (workers
+# then share it copy-on-write), otherwise in each worker before it accepts requests
+PRELOAD_INDEX = os.getenv("PRELOAD_INDEX", "true").lower() in ("1", "true", "yes")
+# Prime embedder, search and LLM connections before /ready reports the worker as ready
+WARMUP = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
 
 _store = None
 _pipeline = None
+_store_lock = threading.Lock()
+_warmup_lock = threading.Lock()
 
-_store = None
+# Load state reported by /ready
+_status = {"state": "cold", "load_seconds": None, "error": None, "warmup": None, "warmup_started": False}
 
 def get_store():
-    """Lazy-load vector store and FAISS index on first use"""
+    """Load vector store and FAISS index (at import with PRELOAD_INDEX, else on first use)"""
     global _store
     if _store is not None:
         return _store
 
-    print(">>> Initializing vector store...")
-    from rag.index import VectorStore
-    _store = VectorStore()
-
-    # Load existing FAISS index and chunks if available
-    if os.path.exists(FAISS_PATH) and os.path.exists(CHUNKS_PATH):
-        print(">>> Loading FAISS index from disk...")
-        _store.load(FAISS_PATH, CHUNKS_PATH)
-        print(">>> FAISS index loaded successfully.")
-    else:
-        if not SKIP_INDEX_BUILD:
-            print(">>> Building FAISS index from PDF (this may take a minute)...")
-            from rag.ingest import extract_pages, split_into_chunks
-            pages = extract_pages(PDF_PATH)
-            chunks = split_into_chunks(pages)
-            _store.build(chunks)
-            _store.save(FAISS_PATH, CHUNKS_PATH)
-            print(">>> FAISS index built & saved.")
-        else:
-            print(">>> WARNING: Index files not found and SKIP_INDEX_BUILD=True — operating without index.")
-
-    # -----------------------------
-    # OPTIONAL: append Excel file if env flag is set
-    # -----------------------------
-    if os.getenv("APPEND_EXCEL", "true").lower() in ("1", "true", "yes"):
-        from app import append_excel_if_needed
-        append_excel_if_needed()
-    # -----------------------------
-
+    with _store_lock:
+        if _store is None:
+            _status["state"] = "loading"
+            start = time.perf_counter()
+            try:
+                _store = _init_store()
+            except Exception as e:
+                _status.update(state="error", error=str(e))
+                raise
+            _status.update(state="ready", load_seconds=round(time.perf_counter() - start, 3))
+            if _store.index is None and not SKIP_INDEX_BUILD:
+                # Serving without an index was not asked for (e.g. a model mismatch): stay unready
+                _status.update(state="error", error=_status["error"] or "no index was loaded or built")
     return _store
 
-def append_excel_if_needed():
-    store = get_store()
+def _init_store():
+    print(">>> Initializing vector store...")
+    from rag.index import VectorStore, IndexMismatchError
+    from rag.manifest import sync_sources
+    from rag.utils import file_lock
 
-    from rag.ingest import extract_excel, split_into_chunks
+    store = VectorStore()
 
-    pages = extract_excel(XLSX_PATH)
-    new_chunks = split_into_chunks(pages)
+    # Several gunicorn workers start at once: only one may ingest/save at a time,
+    # the others wait and then load what it wrote.
+    with file_lock(LOCK_PATH):
+        if os.path.exists(FAISS_PATH) and os.path.exists(CHUNKS_PATH):
+            print(">>> Loading FAISS index from disk...")
+            try:
+                store.load(FAISS_PATH, CHUNKS_PATH)
+                print(">>> FAISS index loaded successfully.")
+            except IndexMismatchError as e:
+                # Never rebuild implicitly: serve without an index until an explicit rebuild
+                print(f">>> ERROR: {e}")
+                _status["error"] = str(e)
+                return store
 
-    # tag source (important)
-    for c in new_chunks:
-        c["source"] = "excel_forms"
+        if not SKIP_INDEX_BUILD:
+            if sync_sources(store, SOURCES, FAISS_PATH, CHUNKS_PATH, MANIFEST_PATH):
+                print(">>> FAISS index updated & saved.")
+        elif store.index is None:
+            print(">>> WARNING: Index files not found and SKIP_INDEX_BUILD=True — operating without index.")
 
-    store.append(new_chunks)
-    store.save(FAISS_PATH, CHUNKS_PATH)
+    return store
 
 def get_pipeline():
     """Lazy-load RAG pipeline on first use"""
@@ -85,32 +92,199 @@ def get_pipeline():
     _pipeline = run_pipeline
     return _pipeline
 
+def preload():
+    """Load everything a request needs that is safe to share across a fork (no threads, no sockets)."""
+    store = get_store()
+    get_pipeline()
+    if store.index is not None:
+        store.lexical  # BM25 arrays: shared copy-on-write with --preload
+    return store
+
+def warmup():
+    """
+    Pay the first request's costs up front: embedder model/connection, FAISS
+    and BM25 pages, reranker and tokenizer, and the pooled Groq connection.
+    Best effort; per-step milliseconds (or errors) are reported by /ready.
+    """
+    with _warmup_lock:
+        if _status["warmup"] is not None:
+            return _status["warmup"]
+        _status["warmup_started"] = True
+        store = preload()
+        from rag.agents import warmup_clients
+        from rag.rerank import rerank
+        from rag.context import count_tokens
+
+        steps = {}
+
+        def step(name, fn):
+            start = time.perf_counter()
+            try:
+                fn()
+                steps[name] = round((time.perf_counter() - start) * 1000.0, 1)
+            except Exception as e:
+                print(f"WARNING: warmup step '{name}' failed: {e}")
+                steps[name] = f"error: {e}"
+
+        if store.index is not None:
+            step("embedder", store.embedder.warmup)
+            step("search", lambda: rerank("roof insulation requirements",
+                                          store.search_many(["roof insulation requirements"], top_k=8)))
+        step("tokenizer", lambda: count_tokens("warmup"))
+        step("llm", warmup_clients)
+        _status["warmup"] = steps
+        print(f">>> Warmup done (pid {os.getpid()}): {steps}")
+        return steps
+
+def readiness():
+    """(body, status code) for /ready: 200 once loaded (and warmed up, if WARMUP)."""
+    if WARMUP and not _status["warmup_started"] and _status["state"] == "ready":
+        # No post-fork hook ran (plain gunicorn/flask): warm up in the background, stay unready meanwhile
+        _status["warmup_started"] = True
+        threading.Thread(target=warmup, name="warmup", daemon=True).start()
+    ready = _status["state"] == "ready" and (not WARMUP or _status["warmup"] is not None)
+    body = {
+        "ready": ready,
+        "state": _status["state"],
+        "pid": os.getpid(),
+        "load_seconds": _status["load_seconds"],
+        "warmup": _status["warmup"],
+    }
+    if _status["error"]:
+        body["error"] = _status["error"]
+    if _store is not None:
+        body.update(_store.describe())
+    return body, 200 if ready else 503
+
+@app.before_request
+def _start_timer():
+    g.start = time.perf_counter()
+
+@app.after_request
+def _record_request(resp):
+    start = g.pop("start", None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        observe_request(endpoint, resp.status_code, time.perf_counter() - start)
+    return resp
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.post("/api/chat")
 def chat():
     from rag.schemas import ChatRequest, ChatResponse
+    from rag.agents import session_id_for
 
     data = request.get_json(force=True)
     req = ChatRequest(**data)
 
     store = get_store()
     pipeline = get_pipeline()
-    answer, applies, reason, sources = pipeline(req.message, req.context, store)
+    session_id = session_id_for(req.session_id)
+    with request_trace() as trace, request_deadline(REQUEST_BUDGET_S):
+        answer, applies, reason, sources = pipeline(req.message, req.context, store, session_id)
 
     resp = ChatResponse(
         answer=answer,
         applies=applies,
         reason=reason,
-        sources=sources
+        sources=sources,
+        session_id=session_id,
+    )
+    out = jsonify(resp.model_dump())
+    if METRICS_CONFIG["timing_header"]:
+        out.headers["Server-Timing"] = trace.server_timing()
+    return out
+
+@app.post("/api/chat/stream")
+def chat_stream():
+    """Server-sent events: `meta` (applies/reason/sources/session_id), then `token`s, then `done`."""
+    from rag.schemas import ChatRequest, Source
+    from rag.agents import run_pipeline_stream, session_id_for
+
+    data = request.get_json(force=True)
+    req = ChatRequest(**data)
+    store = get_store()
+    session_id = session_id_for(req.session_id)
+
+    def events():
+        try:
+            with request_trace() as trace, request_deadline(REQUEST_BUDGET_S):
+                for event, payload in run_pipeline_stream(req.message, req.context, store, session_id):
+                    if event == "meta":
+                        payload = dict(payload, sources=[Source(**s).model_dump() for s in payload["sources"]],
+                                       session_id=session_id)
+                    elif event == "done" and METRICS_CONFIG["timing_header"]:
+                        # Headers are gone by now: the stage breakdown rides on the last event
+                        payload = dict(payload, timings=trace.as_dict())
+                    yield _sse(event, payload)
+        except Exception as e:
+            print(f"ERROR: streaming chat failed: {e}")
+            yield _sse("error", {"error": "Answer generation failed."})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return jsonify(resp.model_dump())
+
+def _portfolio_frame(files, data: bytes, content_type: str, filename: str = None):
+    """Normalised portfolio from an upload: JSON {"buildings": [...]}, or a CSV/XLSX file or body."""
+    from rag.portfolio import read_portfolio, normalize_portfolio
+
+    if "file" in files:
+        f = files["file"]
+        return normalize_portfolio(read_portfolio(f.read(), f.filename)), {}
+    if content_type.startswith("application/json"):
+        body = json.loads(data or b"{}")
+        if not isinstance(body.get("buildings"), list):
+            raise ValueError('JSON body must be {"buildings": [{...}, ...]}.')
+        return normalize_portfolio(read_portfolio(body["buildings"])), body
+    if not data:
+        raise ValueError("Upload a CSV/XLSX portfolio (multipart 'file' or request body) or JSON buildings.")
+    return normalize_portfolio(read_portfolio(data, filename)), {}
+
+@app.post("/api/portfolio")
+def portfolio():
+    """
+    Bulk applicability screening; streams NDJSON, one result per building,
+    then a {"summary": ...} line. ?llm=off skips the intake LLM entirely.
+    """
+    from rag.portfolio import screen, to_ndjson
+
+    try:
+        df, opts = _portfolio_frame(request.files, request.get_data(), request.content_type or "")
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    llm = request.args.get("llm") or opts.get("llm")
+    store = get_store()
+
+    return Response(stream_with_context(to_ndjson(screen(df, store, llm=llm))), mimetype="application/x-ndjson",
+                    headers={"X-Accel-Buffering": "no"})
 
 @app.get("/health")
 def health():
+    """Liveness only; load balancers should route on /ready."""
     return {"ok": True}
 
+@app.get("/ready")
+def ready():
+    return readiness()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format; per worker process."""
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+if PRELOAD_INDEX:
+    preload()
+
 if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "5000"))
     debug = os.getenv("FLASK_DEBUG", "0") in ("1", "true", "yes")
+    if WARMUP:
+        warmup()
     app.run(host=host, port=port, debug=debug)
 
@@ -0,0 +1,177 @@
+"""
+ASGI entry point: the same /api/chat, /api/chat/stream, /api/portfolio and
+/health contract as the Flask app (app.py), served by an asyncio event loop
+so one process holds many concurrent conversations while they wait on Groq.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+
+Index loading, ingestion, warmup and /ready are shared with app.py; the
+index is loaded and the worker warmed up during lifespan startup. Raise
+GROQ_ASYNC_CONCURRENCY (default 64) to allow more concurrent Groq calls per
+process.
+"""
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+from pydantic import ValidationError
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse, Response
+from starlette.routing import Route
+
+from app import get_store, preload, warmup, readiness, WARMUP, REQUEST_BUDGET_S, _sse, _portfolio_frame
+from rag.net import request_deadline, aclose_shared_clients
+from rag.agents import awarmup_clients
+from rag.metrics import request_trace, observe_request, render as render_metrics, CONTENT_TYPE, METRICS_CONFIG
+from rag.schemas import ChatRequest, ChatResponse, Source
+
+
+async def _chat_request(request: Request) -> ChatRequest:
+    return ChatRequest(**(await request.json()))
+
+
+async def chat(request: Request):
+    from rag.agents import arun_pipeline, session_id_for
+
+    try:
+        req = await _chat_request(request)
+    except (ValueError, ValidationError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    store = await asyncio.to_thread(get_store)
+    session_id = session_id_for(req.session_id)
+    with request_trace() as trace, request_deadline(REQUEST_BUDGET_S):
+        answer, applies, reason, sources = await arun_pipeline(req.message, req.context, store, session_id)
+
+    resp = ChatResponse(
+        answer=answer,
+        applies=applies,
+        reason=reason,
+        sources=sources,
+        session_id=session_id,
+    )
+    headers = {"Server-Timing": trace.server_timing()} if METRICS_CONFIG["timing_header"] else None
+    return JSONResponse(resp.model_dump(), headers=headers)
+
+
+async def chat_stream(request: Request):
+    """Server-sent events: `meta` (applies/reason/sources/session_id), then `token`s, then `done`."""
+    from rag.agents import arun_pipeline_stream, session_id_for
+
+    try:
+        req = await _chat_request(request)
+    except (ValueError, ValidationError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    store = await asyncio.to_thread(get_store)
+    session_id = session_id_for(req.session_id)
+
+    async def events():
+        try:
+            with request_trace() as trace, request_deadline(REQUEST_BUDGET_S):
+                async for event, payload in arun_pipeline_stream(req.message, req.context, store, session_id):
+                    if event == "meta":
+                        payload = dict(payload, sources=[Source(**s).model_dump() for s in payload["sources"]],
+                                       session_id=session_id)
+                    elif event == "done" and METRICS_CONFIG["timing_header"]:
+                        payload = dict(payload, timings=trace.as_dict())
+                    yield _sse(event, payload)
+        except Exception as e:
+            print(f"ERROR: streaming chat failed: {e}")
+            yield _sse("error", {"error": "Answer generation failed."})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def portfolio(request: Request):
+    """Bulk applicability screening as NDJSON (JSON buildings, or a CSV/XLSX request body)."""
+    from rag.portfolio import screen, to_ndjson
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/"):
+        return JSONResponse({"error": "Send the CSV/XLSX file as the request body (multipart is not supported here)."},
+                            status_code=415)
+    try:
+        df, opts = _portfolio_frame({}, await request.body(), content_type, request.query_params.get("filename"))
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    llm = request.query_params.get("llm") or opts.get("llm")
+    store = await asyncio.to_thread(get_store)
+    # Sync iterator: Starlette pulls it on a worker thread, the LLM rows block there, not on the loop
+    return StreamingResponse(to_ndjson(screen(df, store, llm=llm)), media_type="application/x-ndjson",
+                             headers={"X-Accel-Buffering": "no"})
+
+
+async def health(request: Request):
+    """Liveness only; load balancers should route on /ready."""
+    return JSONResponse({"ok": True})
+
+
+async def ready(request: Request):
+    body, status = readiness()
+    return JSONResponse(body, status_code=status)
+
+
+async def metrics(request: Request):
+    return Response(render_metrics(), headers={"Content-Type": CONTENT_TYPE})
+
+
+class RequestMetrics:
+    """ASGI middleware: request count and duration per route (until the response has been sent)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # Route template, never the raw path (unknown URLs would explode label cardinality)
+            endpoint = getattr(scope.get("route"), "path", None) or "unmatched"
+            observe_request(endpoint, status["code"], time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await asyncio.to_thread(preload)
+    if WARMUP:
+        await asyncio.to_thread(warmup)
+        try:
+            await awarmup_clients()  # the async Groq client has its own connection pool
+        except Exception as e:
+            print(f"WARNING: async LLM warmup failed: {e}")
+    yield
+    await aclose_shared_clients()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/chat", chat, methods=["POST"]),
+        Route("/api/chat/stream", chat_stream, methods=["POST"]),
+        Route("/api/portfolio", portfolio, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/ready", ready, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    middleware=[
+        Middleware(RequestMetrics),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+    ],
+    lifespan=lifespan,
+)
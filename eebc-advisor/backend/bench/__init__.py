@@ -0,0 +1,71 @@
+"""
+Offline benchmarks: no Groq or Voyage quota is spent.
+
+    python -m bench.fakes --port 8099 --print-env      # local Groq/Voyage stand-ins
+    python -m bench.micro                              # chunker, search, retrieval, regex intake
+    python -m bench.load --concurrency 16 --requests 400            # in-process Flask app + fakes
+    python -m bench.load --url http://127.0.0.1:5000 --duration 60  # an already running server
+
+Run from the backend directory. To size gunicorn workers, start the fakes,
+export the variables they print, start gunicorn as in the Procfile and point
+bench.load --url at it. Both micro and load take --json (save results) and
+--baseline (compare with saved results, exit 1 on a regression).
+"""
+import os
+import json
+import math
+from typing import List, Dict, Any, Optional
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "questions.jsonl")
+
+
+def load_questions(path: str = QUESTIONS_PATH, category: Optional[str] = None) -> List[Dict[str, Any]]:
+    """The replay corpus: {"id", "category", "message"[, "context"]} per line."""
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    if category:
+        rows = [r for r in rows if r["category"] in category.split(",")]
+    return rows
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(ms: List[float], seconds: float = None) -> Dict[str, float]:
+    """n, mean/p50/p95/p99/max in milliseconds, and ops/s (over `seconds` wall time, else back to back)."""
+    v = sorted(ms)
+    n = len(v)
+    total = seconds if seconds is not None else sum(v) / 1000.0
+    return {
+        "n": n,
+        "mean_ms": round(sum(v) / n, 3) if n else 0.0,
+        "p50_ms": round(percentile(v, 50), 3),
+        "p95_ms": round(percentile(v, 95), 3),
+        "p99_ms": round(percentile(v, 99), 3),
+        "max_ms": round(v[-1], 3) if n else 0.0,
+        "ops_s": round(n / total, 1) if total else 0.0,
+    }
+
+
+def save_results(path: str, results: Dict[str, Dict[str, Any]]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: str, tolerance: float,
+            key: str = "p50_ms") -> List[str]:
+    """Benchmarks whose `key` grew by more than `tolerance` (0.25 = 25%) against a saved run."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    regressions = []
+    for name, r in results.items():
+        old = (base.get(name) or {}).get(key)
+        new = r.get(key)
+        if old and new is not None and new > old * (1.0 + tolerance):
+            regressions.append(f"{name}: {key} {old:.3f} -> {new:.3f} (+{(new / old - 1.0) * 100:.0f}%)")
+    return regressions
@@ -0,0 +1,334 @@
+"""
+Local stand-ins for the Groq and Voyage HTTP APIs, for benchmarks and load
+tests that must not spend quota or depend on the network.
+
+    python -m bench.fakes --port 8099 --llm-latency-ms 300 --token-ms 10 --rate-429 0.02 --print-env
+
+Point the app at it with GROQ_BASE_URL / VOYAGE_BASE_URL (and any non-empty
+GROQ_API_KEY / VOYAGE_API_KEY): the real SDKs, connection pools, retry
+policies and metrics are exercised, only the provider is simulated.
+
+- Groq: POST /openai/v1/chat/completions (JSON, or SSE with stream=true and
+  usage on the last chunk) and GET /openai/v1/models. Replies are canned by
+  system prompt: intake JSON, {"queries": [...]}, or a bulleted answer that
+  cites the sources in the prompt.
+- Voyage: POST /v1/embeddings. Vectors are deterministic (the hashing
+  embedder at the model's dimension), so the same text always gets the same
+  vector and retrieval behaves sensibly.
+
+Every response waits latency + uniform(0, jitter) (LLM replies also
+token_ms per completion token, both scaled by small_model_factor for 8B
+models), and a rate_429 fraction of requests is rejected with 429 and a
+retry-after-ms header. A draft_miss_rate fraction of 8B answers drops its
+citations, so ANSWER_MODE=cascade escalates them.
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List
+
+FAKE_DEFAULTS = {
+    "llm_latency_ms": 250.0,    # time to first token
+    "token_ms": 8.0,            # per completion token (streamed at this pace)
+    "embed_latency_ms": 60.0,   # per embeddings request
+    "jitter_ms": 50.0,          # added uniformly to every delay above
+    "rate_429": 0.0,            # fraction of requests rejected as rate limited
+    "retry_after_ms": 200.0,
+    "answer_tokens": 150,       # approximate length of a canned answer
+    "small_model_factor": 1.0,  # latency and token_ms multiplier for 8B models (e.g. 0.4)
+    "draft_miss_rate": 0.0,     # fraction of 8B answers without citations (answer cascade escalations)
+}
+
+_INTAKE_FIELDS = ("district", "building_type", "is_new_building", "floor_area_m2", "electrical_demand_kva",
+                  "cooling_capacity_kwth", "heating_capacity_kwth", "wwr_percent", "skylight_percent",
+                  "glazing_vlt", "hvac_type", "operating_hours")
+_SOURCE_LINE_RE = re.compile(r"^\[S\d+\] (?P<label>p\.\d+|Form '[^']*') \S+: (?P<excerpt>.*)$", re.M)
+_CITATION_RE = re.compile(r" \((?:p\.\d+|Form '[^']*')\)")
+_STOP = {"the", "a", "an", "of", "for", "to", "in", "is", "are", "what", "which", "do", "does", "i", "we",
+         "my", "our", "and", "or", "with", "how", "be", "on", "this", "that", "must", "need", "should"}
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[A-Za-z0-9][A-Za-z0-9.\-/%²]*", text)
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def canned_reply(system: str, prompt: str, answer_tokens: int) -> str:
+    """What the fake model answers, chosen by the agent's system prompt."""
+    low = system.lower()
+    if "extract building context" in low:
+        return json.dumps({f: None for f in _INTAKE_FIELDS})
+    if "search queries" in low:
+        m = re.search(r"User question:\s*(.*)", prompt)
+        question = m.group(1).strip() if m else prompt.strip()
+        keywords = " ".join(w for w in _words(question) if w.lower() not in _STOP)
+        return json.dumps({"queries": [question, keywords + " requirements", "EEBC " + keywords]})
+
+    # Answer agent: one bullet per source, padded to roughly answer_tokens
+    bullets = []
+    for m in _SOURCE_LINE_RE.finditer(prompt):
+        words = _words(m.group("excerpt"))[:18]
+        bullets.append(f"- {' '.join(words)} ({m.group('label')}).")
+    if not bullets:
+        bullets = ["- The provided sources do not cover this question."]
+    out = []
+    while len(out) < 4 * len(bullets) and sum(_approx_tokens(b) for b in out) < answer_tokens:
+        out.append(bullets[len(out) % len(bullets)])
+    return "\n".join(out)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs (clients pool connections)
+    server_version = "eebc-fake/1.0"
+    disable_nagle_algorithm = True  # headers and body are separate writes; no 40 ms delayed-ACK stalls
+
+    def log_message(self, fmt, *args):
+        pass
+
+    @property
+    def fake(self) -> "FakeProviders":
+        return self.server.fake
+
+    # ---- plumbing ----
+    def _body(self) -> Dict[str, Any]:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}") if n else {}
+
+    def _json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _rate_limited(self, provider: str) -> bool:
+        if not self.fake.should_reject():
+            return False
+        self.fake.count(provider, "429")
+        ms = self.fake.config["retry_after_ms"]
+        self._json(429, {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_exceeded"}},
+                   {"retry-after-ms": f"{ms:.0f}", "retry-after": str(max(1, round(ms / 1000.0)))})
+        return True
+
+    # ---- routes ----
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/openai/v1/models"):
+            self.fake.count("groq", "models")
+            models = [{"id": m, "object": "model", "created": 0, "owned_by": "fake", "active": True,
+                       "context_window": 131072} for m in ("llama-3.1-8b-instant", "llama-3.3-70b-versatile")]
+            return self._json(200, {"object": "list", "data": models})
+        self._json(404, {"error": {"message": f"no route {self.path}"}})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        try:
+            body = self._body()
+        except ValueError:
+            return self._json(400, {"error": {"message": "invalid JSON"}})
+        if path.endswith("/chat/completions"):
+            return self._chat(body)
+        if path.endswith("/embeddings"):
+            return self._embeddings(body)
+        self._json(404, {"error": {"message": f"no route {self.path}"}})
+
+    def _chat(self, body: Dict[str, Any]):
+        if self._rate_limited("groq"):
+            return
+        msgs = body.get("messages") or []
+        system = next((m.get("content", "") for m in msgs if m.get("role") == "system"), "")
+        prompt = next((m.get("content", "") for m in msgs if m.get("role") == "user"), "")
+        model = body.get("model", "fake")
+        text = canned_reply(system, prompt, min(self.fake.config["answer_tokens"], int(body.get("max_tokens") or 10 ** 6)))
+        small = "8b" in model.lower()
+        if small and _SOURCE_LINE_RE.search(prompt) and self.fake.chance(self.fake.config["draft_miss_rate"]):
+            text = _CITATION_RE.sub("", text)
+        usage = {"prompt_tokens": _approx_tokens(system + prompt), "completion_tokens": _approx_tokens(text)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        cid = f"chatcmpl-fake-{self.fake.count('groq', 'chat')}"
+        factor = self.fake.config["small_model_factor"] if small else 1.0
+        token_s = self.fake.config["token_ms"] * factor / 1000.0
+
+        self.fake.sleep(self.fake.config["llm_latency_ms"] * factor)
+        if not body.get("stream"):
+            time.sleep(token_s * usage["completion_tokens"])
+            return self._json(200, {
+                "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": usage, "system_fingerprint": "fake",
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta: Dict[str, Any], finish=None, **extra) -> bytes:
+            chunk = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish, "logprobs": None}], **extra}
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        self._chunk(event({"role": "assistant", "content": ""}))
+        for piece in re.findall(r"\S+\s*", text):
+            time.sleep(token_s * _approx_tokens(piece))
+            self._chunk(event({"content": piece}))
+        self._chunk(event({}, "stop", x_groq={"id": cid, "usage": usage}))
+        self._chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _embeddings(self, body: Dict[str, Any]):
+        if self._rate_limited("voyage"):
+            return
+        texts = body.get("input") or []
+        if isinstance(texts, str):
+            texts = [texts]
+        model = body.get("model", "voyage-3")
+        self.fake.count("voyage", "embeddings")
+        self.fake.count("voyage", "texts", len(texts))
+        vecs = self.fake.embed(model, texts)
+        self.fake.sleep(self.fake.config["embed_latency_ms"])
+        self._json(200, {
+            "object": "list",
+            "data": [{"object": "embedding", "embedding": v, "index": i} for i, v in enumerate(vecs)],
+            "model": model,
+            "usage": {"total_tokens": sum(_approx_tokens(t) for t in texts)},
+        })
+
+
+class _Server(ThreadingHTTPServer):
+    # socketserver's default backlog of 5 drops connection bursts (the client retries a SYN after 1 s)
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Clients that time out or cancel a stream hang up mid-reply; that is expected, not a server error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeProviders:
+    """
+    The fake Groq + Voyage server on a background thread.
+
+        with FakeProviders(llm_latency_ms=100) as fake:
+            os.environ.update(fake.env())
+            ...
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, seed: int = 0, **config):
+        unknown = set(config) - set(FAKE_DEFAULTS)
+        if unknown:
+            raise TypeError(f"unknown fake option(s): {sorted(unknown)}")
+        self.config = dict(FAKE_DEFAULTS, **config)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._embedders = {}
+        self.stats: Dict[str, Dict[str, int]] = {"groq": {}, "voyage": {}}
+        self._server = _Server((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points the app's Groq and Voyage clients at this server."""
+        return {
+            "GROQ_API_KEY": "fake-groq-key",
+            "GROQ_BASE_URL": self.url,
+            "VOYAGE_API_KEY": "fake-voyage-key",
+            "VOYAGE_BASE_URL": self.url + "/v1",
+        }
+
+    def start(self) -> "FakeProviders":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-providers", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- used by the handler ----
+    def count(self, provider: str, key: str, n: int = 1) -> int:
+        with self._lock:
+            s = self.stats[provider]
+            s[key] = s.get(key, 0) + n
+            return s[key]
+
+    def chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def should_reject(self) -> bool:
+        return self.chance(self.config["rate_429"])
+
+    def sleep(self, base_ms: float):
+        with self._lock:
+            jitter = self._rng.uniform(0.0, self.config["jitter_ms"])
+        time.sleep(max(0.0, base_ms + jitter) / 1000.0)
+
+    def embed(self, model: str, texts: List[str]) -> List[List[float]]:
+        from rag.embedder import HashingEmbedder, model_dim
+
+        dim = model_dim(model) or 1024
+        with self._lock:
+            emb = self._embedders.get(dim)
+            if emb is None:
+                emb = self._embedders[dim] = HashingEmbedder(model=f"hashing-{dim}")
+        return emb._embed(texts).tolist() if texts else []
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.fakes", description="Fake Groq/Voyage API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--print-env", action="store_true", help="print export lines for the app's environment")
+    for key, default in FAKE_DEFAULTS.items():
+        parser.add_argument("--" + key.replace("_", "-"), type=type(default), default=default)
+    args = parser.parse_args(argv)
+
+    fake = FakeProviders(args.host, args.port, seed=args.seed, **{k: getattr(args, k) for k in FAKE_DEFAULTS})
+    print(f"Fake Groq/Voyage listening on {fake.url} ({', '.join(f'{k}={v}' for k, v in fake.config.items())})")
+    if args.print_env:
+        for k, v in fake.env().items():
+            print(f"export {k}={v}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake._server.server_close()
+        print(f"stats: {json.dumps(fake.stats)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
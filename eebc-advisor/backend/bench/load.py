@@ -0,0 +1,247 @@
+"""
+Concurrent load driver: replays the question corpus against /api/chat (or
+/api/chat/stream) and reports latency percentiles and throughput.
+
+    python -m bench.load --concurrency 16 --requests 400
+    python -m bench.load --stream --duration 30 --llm-latency-ms 400 --rate-429 0.05
+    python -m bench.load --url http://127.0.0.1:5000 --concurrency 64 --duration 60
+
+Without --url the Flask app runs in this process (threaded werkzeug server)
+on an index built from data/chunks.json, with Groq and Voyage replaced by
+bench.fakes; the --*-ms / --rate-429 options shape the fakes. With --url any
+running server is measured as it is (gunicorn, uvicorn asgi:app, ...): to
+size gunicorn workers, run it against the fakes (python -m bench.fakes
+--print-env) and sweep --workers/--threads and --concurrency.
+
+Server-side stage times come from the Server-Timing header (the SSE "done"
+event when streaming) and are reported as means per request.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from bench import load_questions, summarize, save_results, compare  # noqa: E402
+from bench.fakes import FakeProviders, FAKE_DEFAULTS  # noqa: E402
+
+
+# ----------------------------
+# In-process target
+# ----------------------------
+def start_local_app(fake: FakeProviders, workdir: str, answer_cache: bool) -> str:
+    """Build an index through the fake Voyage, then serve app.py on a random port; returns its URL."""
+    os.environ.update(fake.env())
+    os.environ.update({
+        "EMBEDDER": os.getenv("EMBEDDER", "voyage"),
+        "FAISS_PATH": os.path.join(workdir, "index.faiss"),
+        "CHUNKS_PATH": os.path.join(workdir, "chunks.json"),
+        "SKIP_INDEX_BUILD": "true",
+        "EMBED_CACHE_DIR": os.path.join(workdir, "embed_cache"),  # never the real cache
+        "ANSWER_CACHE": "memory" if answer_cache else "off",
+    })
+
+    from rag.index import VectorStore
+
+    with open(os.path.join(BACKEND_DIR, "data", "chunks.json"), "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    store = VectorStore()
+    store.build(chunks)
+    store.save(os.environ["FAISS_PATH"], os.environ["CHUNKS_PATH"])
+
+    import app as flask_app
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server("127.0.0.1", 0, flask_app.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    flask_app.warmup()
+    return url
+
+
+# ----------------------------
+# Driver
+# ----------------------------
+def _server_timing(header: Optional[str]) -> Dict[str, float]:
+    out = {}
+    for part in (header or "").split(","):
+        name, _, rest = part.strip().partition(";")
+        for attr in rest.split(";"):
+            if attr.strip().startswith("dur="):
+                out[name] = float(attr.strip()[4:])
+    return out
+
+
+def _one(session, url: str, q: Dict[str, Any], stream: bool, timeout: float) -> Dict[str, Any]:
+    body = {"message": q["message"], "context": q.get("context")}
+    start = time.perf_counter()
+    r = {"status": 0, "ttft_ms": None, "stages": {}}
+    try:
+        if not stream:
+            resp = session.post(url + "/api/chat", json=body, timeout=timeout)
+            resp.content
+            r["status"] = resp.status_code
+            r["stages"] = _server_timing(resp.headers.get("Server-Timing"))
+        else:
+            with session.post(url + "/api/chat/stream", json=body, timeout=timeout, stream=True) as resp:
+                r["status"] = resp.status_code
+                event = None
+                for line in resp.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                        if event == "token" and r["ttft_ms"] is None:
+                            r["ttft_ms"] = (time.perf_counter() - start) * 1000.0
+                    elif line.startswith("data:") and event in ("done", "error"):
+                        payload = json.loads(line[5:])
+                        r["stages"] = payload.get("timings") or {}
+                        if event == "error":
+                            r["status"] = "stream-error"
+    except Exception as e:
+        r["status"] = type(e).__name__
+    r["ms"] = (time.perf_counter() - start) * 1000.0
+    return r
+
+
+def drive(url: str, questions: List[Dict[str, Any]], concurrency: int, requests_total: int = 0,
+          duration: float = 0.0, stream: bool = False, timeout: float = 120.0, seed: int = 0) -> Dict[str, Any]:
+    """Replay `questions` from `concurrency` threads until requests_total are sent or duration elapses."""
+    import requests
+
+    order = list(questions)
+    random.Random(seed).shuffle(order)
+    lock = threading.Lock()
+    sent = [0]
+    results: List[Dict[str, Any]] = []
+    stop_at = time.perf_counter() + duration if duration else None
+
+    def next_question():
+        with lock:
+            if requests_total and sent[0] >= requests_total:
+                return None
+            if stop_at is not None and time.perf_counter() >= stop_at:
+                return None
+            sent[0] += 1
+            return order[(sent[0] - 1) % len(order)]
+
+    def worker():
+        with requests.Session() as session:
+            while True:
+                q = next_question()
+                if q is None:
+                    return
+                r = _one(session, url, q, stream, timeout)
+                with lock:
+                    results.append(r)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f"load-{i}") for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    ok = [r for r in results if r["status"] == 200]
+    report = {
+        "wall_s": round(wall, 3),
+        "statuses": statuses,
+        "latency": summarize([r["ms"] for r in ok], wall),
+        "stages_mean_ms": {},
+    }
+    if stream:
+        report["ttft"] = summarize([r["ttft_ms"] for r in ok if r["ttft_ms"] is not None], wall)
+    stage_sums: Dict[str, float] = {}
+    for r in ok:
+        for k, v in r["stages"].items():
+            stage_sums[k] = stage_sums.get(k, 0.0) + v
+    report["stages_mean_ms"] = {k: round(v / len(ok), 1) for k, v in sorted(stage_sums.items())} if ok else {}
+    return report
+
+
+def _print_summary(label: str, s: Dict[str, float]):
+    print(f"{label:<10}n={s['n']:<6} p50={s['p50_ms']:.1f}ms  p95={s['p95_ms']:.1f}ms  "
+          f"p99={s['p99_ms']:.1f}ms  max={s['max_ms']:.1f}ms  {s['ops_s']:.1f} req/s")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.load", description="EEBC /api/chat load test")
+    parser.add_argument("--url", help="server to measure (default: in-process app against the fakes)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=0, help="total requests (default 200 without --duration)")
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds to run instead of --requests")
+    parser.add_argument("--warmup", type=int, default=0, help="requests sent (and not measured) before the run")
+    parser.add_argument("--stream", action="store_true", help="use /api/chat/stream and report time to first token")
+    parser.add_argument("--category", help="only these corpus categories (comma-separated)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--answer-cache", action="store_true", help="in-process app: keep the answer cache on")
+    for key, default in FAKE_DEFAULTS.items():
+        parser.add_argument("--" + key.replace("_", "-"), type=type(default), default=default,
+                            help="fake providers (in-process app only)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare p95 latency with a saved --json report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown vs --baseline")
+    args = parser.parse_args(argv)
+    if not args.requests and not args.duration:
+        args.requests = 200
+
+    questions = load_questions(category=args.category)
+    fake, url = None, args.url
+    workdir = tempfile.TemporaryDirectory(prefix="eebc-bench-")
+    try:
+        if url is None:
+            fake = FakeProviders(seed=args.seed, **{k: getattr(args, k) for k in FAKE_DEFAULTS}).start()
+            url = start_local_app(fake, workdir.name, args.answer_cache)
+        url = url.rstrip("/")
+
+        if args.warmup:
+            drive(url, questions, min(args.concurrency, args.warmup), requests_total=args.warmup,
+                  stream=args.stream, timeout=args.timeout, seed=args.seed + 1)
+        print(f"target={url} concurrency={args.concurrency} "
+              + (f"duration={args.duration}s" if args.duration else f"requests={args.requests}")
+              + (" stream" if args.stream else ""))
+        report = drive(url, questions, args.concurrency, requests_total=args.requests, duration=args.duration,
+                       stream=args.stream, timeout=args.timeout, seed=args.seed)
+    finally:
+        if fake is not None:
+            fake.stop()
+        workdir.cleanup()
+
+    print(f"statuses: {report['statuses']}  wall={report['wall_s']}s")
+    _print_summary("latency", report["latency"])
+    if "ttft" in report:
+        _print_summary("ttft", report["ttft"])
+    if report["stages_mean_ms"]:
+        print("server stages (mean ms): " + ", ".join(f"{k}={v}" for k, v in report["stages_mean_ms"].items()))
+    if fake is not None:
+        report["fakes"] = fake.stats
+        print(f"fakes: {json.dumps(fake.stats)}")
+
+    if args.json:
+        save_results(args.json, report)
+    if args.baseline:
+        results = {k: report[k] for k in ("latency", "ttft") if k in report}
+        regressions = compare(results, args.baseline, args.tolerance, key="p95_ms")
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0 if report["statuses"].get("200") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Microbenchmarks of the hot paths, offline:
+
+    python -m bench.micro                      # all
+    python -m bench.micro --only search,regex_fill --min-time 2
+    python -m bench.micro --json bench.json    # save; later: --baseline bench.json
+
+- chunker:     split_into_chunks over pages rebuilt from data/chunks.json
+- search:      VectorStore.search / search_many (hashing embedder, in memory)
+- retrieval:   retrieval_multi against the fake Groq (--llm-latency-ms, 0 by default)
+- regex_fill:  the regex intake (_regex_fill) over the question corpus
+
+Numbers are per call; ops/s is back to back on one thread.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Callable, List, Dict, Any
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from bench import load_questions, summarize, save_results, compare  # noqa: E402
+from bench.fakes import FakeProviders  # noqa: E402
+
+DEFAULT_CHUNKS = os.path.join(BACKEND_DIR, "data", "chunks.json")
+
+
+def run(fn: Callable[[Any], Any], inputs: List[Any], min_time: float, min_calls: int = 20) -> Dict[str, float]:
+    """Call fn over inputs (cycling) for at least min_time seconds and min_calls calls."""
+    fn(inputs[0])  # first call pays imports and lazy setup
+    ms = []
+    start = time.perf_counter()
+    i = 0
+    while time.perf_counter() - start < min_time or len(ms) < min_calls:
+        t = time.perf_counter()
+        fn(inputs[i % len(inputs)])
+        ms.append((time.perf_counter() - t) * 1000.0)
+        i += 1
+    return summarize(ms)
+
+
+def _pages(chunks: List[Dict[str, Any]], copies: int) -> List[Dict[str, Any]]:
+    """PDF-like pages rebuilt from the chunk texts (Excel sheets skipped), repeated `copies` times."""
+    by_page: Dict[int, List[str]] = {}
+    for c in chunks:
+        if not c.get("sheet") and "rows" not in c:
+            by_page.setdefault(int(c["page"]), []).append(c["text"])
+    base = [{"page": p, "text": "\n".join(by_page[p])} for p in sorted(by_page)]
+    last = base[-1]["page"] if base else 0
+    return [dict(pg, page=pg["page"] + k * last) for k in range(copies) for pg in base]
+
+
+def bench_chunker(args, chunks, questions):
+    from rag.ingest import split_into_chunks
+
+    pages = _pages(chunks, args.copies)
+    r = run(lambda _: split_into_chunks(pages), [None], args.min_time, min_calls=3)
+    r["pages"] = len(pages)
+    return {"split_into_chunks": r}
+
+
+def _store(chunks, model: str):
+    from rag.index import VectorStore
+
+    store = VectorStore(model=model, backend="hashing")
+    store.build(chunks)
+    return store
+
+
+def bench_search(args, chunks, questions):
+    store = _store(chunks, args.model)
+    msgs = [q["message"] for q in questions]
+    out = {}
+    for mode in ("dense", "lexical", "hybrid"):
+        out[f"search[{mode}]"] = run(lambda m: store.search(m, top_k=8, mode=mode), msgs, args.min_time)
+    triples = [[m, m + " requirements", "EEBC " + m] for m in msgs]
+    out["search_many[hybrid,3]"] = run(lambda qs: store.search_many(qs, top_k=6), triples, args.min_time)
+    return out
+
+
+def bench_retrieval(args, chunks, questions):
+    from rag.agents import retrieval_multi, _regex_fill
+    from rag.schemas import BuildingContext
+
+    store = _store(chunks, args.model)
+    inputs = [(q["message"], _regex_fill(BuildingContext(**(q.get("context") or {})), q["message"]))
+              for q in questions]
+    return {"retrieval_multi": run(lambda a: retrieval_multi(a[0], a[1], store), inputs, args.min_time)}
+
+
+def bench_regex_fill(args, chunks, questions):
+    from rag.agents import _regex_fill
+    from rag.schemas import BuildingContext
+
+    msgs = [q["message"] for q in questions]
+    return {"regex_fill": run(lambda m: _regex_fill(BuildingContext(), m), msgs, args.min_time, min_calls=200)}
+
+
+BENCHES = {
+    "chunker": bench_chunker,
+    "search": bench_search,
+    "retrieval": bench_retrieval,
+    "regex_fill": bench_regex_fill,
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.micro", description="EEBC microbenchmarks (offline)")
+    parser.add_argument("--only", default=",".join(BENCHES), help="comma-separated: " + ", ".join(BENCHES))
+    parser.add_argument("--chunks", default=DEFAULT_CHUNKS, help="chunks.json to build pages and the index from")
+    parser.add_argument("--copies", type=int, default=1, help="repeat the corpus N times (bigger index/pages)")
+    parser.add_argument("--model", default="hashing-1024", help="hashing-<dim> model for the in-memory index")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="fake Groq latency for retrieval")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per benchmark")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare p50 with a saved --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown vs --baseline")
+    args = parser.parse_args(argv)
+
+    # Benchmarks must never write to the real embedding cache
+    os.environ.setdefault("EMBED_CACHE", "false")
+    os.environ.setdefault("ANSWER_CACHE", "off")
+
+    with open(args.chunks, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    chunks = [dict(c, chunk_id=f"{c['chunk_id']}~{k}") if k else c for k in range(args.copies) for c in chunks]
+    questions = load_questions()
+
+    # rag.agents builds its Groq clients at import: point them at the fake (query generation)
+    fake = FakeProviders(llm_latency_ms=args.llm_latency_ms, token_ms=0.0, jitter_ms=0.0).start()
+    os.environ.update(fake.env())
+
+    results = {}
+    print(f"chunks={len(chunks)} questions={len(questions)} model={args.model}")
+    print(f"{'benchmark':<26}{'n':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}")
+    for name in args.only.split(","):
+        if name not in BENCHES:
+            print(f"Unknown benchmark: {name}")
+            return 2
+        for label, r in BENCHES[name](args, chunks, questions).items():
+            results[label] = r
+            print(f"{label:<26}{r['n']:>7}{r['mean_ms']:>10.3f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}"
+                  f"{r['p99_ms']:>10.3f}{r['ops_s']:>10.1f}")
+
+    fake.stop()
+
+    if args.json:
+        save_results(args.json, results)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+import os
+
+# Import app.py (and so load the index, see PRELOAD_INDEX) once in the master:
+# workers fork with the index, chunk store and BM25 arrays already in memory
+# and share those pages copy-on-write.
+preload_app = os.getenv("PRELOAD_INDEX", "true").lower() in ("1", "true", "yes")
+
+
+def post_worker_init(worker):
+    # Threads and sockets don't survive fork: warm each worker's own connections
+    # before it accepts requests, so /ready only passes on warm workers.
+    from app import WARMUP, warmup
+    if WARMUP:
+        warmup()
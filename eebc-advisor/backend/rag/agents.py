@@ -1,9 +1,24 @@
+import os
 import re
 import json
-from typing import Optional, Tuple, List, Dict, Any
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional, Tuple, List, Dict, Any, Iterator, AsyncIterator, Callable, Generator, NamedTuple
+
+import numpy as np
 
 from .schemas import BuildingContext
 from .llm_groq import GroqLLM
+from .answer_cache import AnswerCache
+from .sessions import SessionStore, SESSION_CONFIG, new_session_id, valid_session_id
+from .lexical import CLAUSE_REF_RE, rrf
+from .index import chunk_source, DEFAULT_SOURCE
+from .net import submit, stage_deadline
+from .context import pack_sources, compact_context, source_label
+from .rerank import rerank
+from .verify import check_answer
+from .metrics import traced, register_collector, cache_families, stage as trace_stage, STAGE_ERRORS, ANSWER_CASCADE
 
 # ----------------------------
 # Groq model/config selection
@@ -12,53 +27,202 @@ GROQ_CONFIG = {
     "models": {
         "extract": "llama-3.1-8b-instant",      # fast extraction / routing
         "reason":  "llama-3.3-70b-versatile",   # final answer
+        "draft":   "llama-3.1-8b-instant",      # cascade: first try at the final answer
     },
     "params": {
         "extract": {"temperature": 0.0, "max_tokens": 500},
         "reason":  {"temperature": 0.1, "max_tokens": 1000},
-    }
+        "draft":   {"temperature": 0.1, "max_tokens": 1000},
+    },
+    # Final answer: "single" (reason model only) or "cascade" (the draft model
+    # answers first; the reason model redoes only drafts that fail the local
+    # checks in rag/verify.py)
+    "answer_mode": os.getenv("ANSWER_MODE", "single").lower(),
+}
+
+# ----------------------------
+# Pipeline mode: "sequential" (default) or "concurrent"
+# In concurrent mode intake, query generation and the raw-message search start
+# together on a bounded thread pool; each stage falls back when it times out.
+# ----------------------------
+PIPELINE_CONFIG = {
+    "mode": os.getenv("PIPELINE_MODE", "sequential").lower(),
+    "max_workers": int(os.getenv("PIPELINE_MAX_WORKERS", "8")),
+    "timeouts": {  # seconds, measured from pipeline start
+        "intake":  float(os.getenv("PIPELINE_INTAKE_TIMEOUT", "6")),
+        "queries": float(os.getenv("PIPELINE_QUERIES_TIMEOUT", "6")),
+        "search":  float(os.getenv("PIPELINE_SEARCH_TIMEOUT", "8")),
+    },
 }
 
+# ----------------------------
+# Rule-based shortcuts (no LLM call):
+#   applicability  answer "does EEBC apply?" questions from the thresholds
+#   skip_intake    skip the intake LLM when regex already fills the context
+#   router         narrow retrieval to a source / chapter / page range first
+# ----------------------------
+FAST_PATH_CONFIG = {
+    "applicability": os.getenv("APPLICABILITY_FAST_PATH", "true").lower() in ("1", "true", "yes"),
+    "skip_intake": os.getenv("INTAKE_SKIP", "true").lower() in ("1", "true", "yes"),
+    "router": os.getenv("SEARCH_ROUTER", "true").lower() in ("1", "true", "yes"),
+}
+
+_pool = None
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=PIPELINE_CONFIG["max_workers"], thread_name_prefix="pipeline")
+    return _pool
+
+# Semantic answer cache (ANSWER_CACHE=memory|sqlite|off)
+_answer_cache = AnswerCache.from_env()
+
+# Conversation sessions (SESSIONS=off|memory|sqlite)
+_sessions = SessionStore.from_env()
+
 _llm_extract = GroqLLM(model=GROQ_CONFIG["models"]["extract"], **GROQ_CONFIG["params"]["extract"])
 _llm_reason  = GroqLLM(model=GROQ_CONFIG["models"]["reason"],  **GROQ_CONFIG["params"]["reason"])
+_llm_draft   = GroqLLM(model=GROQ_CONFIG["models"]["draft"],   **GROQ_CONFIG["params"]["draft"])
 
 # ----------------------------
 # Robust regex extractors
 # ----------------------------
-AREA_RE = re.compile(r'(?P<val>\d+(?:\.\d+)?)\s*(m²|m2|sqm|sq\s*m|square\s*meters?)', re.I)
-KVA_RE  = re.compile(r'(?P<val>\d+(?:\.\d+)?)\s*kva\b', re.I)
-COOL_RE = re.compile(r'(?P<val>\d+(?:\.\d+)?)\s*(kwth|kWth)\b', re.I)  # simplistic; user may say "cooling 400 kWth"
-WWR_RE  = re.compile(r'\bwwr\b[^0-9]{0,20}(?P<val>\d+(?:\.\d+)?)\s*%', re.I)
+NUM = r'(?P<val>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)'
+AREA_RE = re.compile(NUM + r'\s*(m²|m2|sqm|sq\.?\s*m\b|square\s*met(?:er|re)s?)', re.I)
+KVA_RE  = re.compile(NUM + r'\s*(?P<unit>kva|mva)\b', re.I)
+# Thermal capacity: kWth, or refrigeration tons (1 TR = 3.517 kWth); plain "kW" only next to a heating/cooling word
+CAP_RE  = re.compile(NUM + r'\s*(?P<unit>kw\s*th|kwth|kw|tr|rt|tons?(?:\s+of\s+refrigeration)?)\b', re.I)
+HEAT_WORDS_RE = re.compile(r'heat|boiler|hot\s*water', re.I)
+COOL_WORDS_RE = re.compile(r'cool|chiller|a/?c\b|air[\s-]*condition', re.I)
+WWR_RE  = re.compile(r'\b(?:wwr|window[\s-]+to[\s-]+wall(?:\s+ratio)?)\b[^0-9]{0,20}' + NUM + r'\s*%'
+                     r'|' + NUM.replace('val', 'val2') + r'\s*%\s*(?:wwr|window[\s-]+to[\s-]+wall)', re.I)
+SKYLIGHT_RE = re.compile(r'\bskylights?\b[^0-9%]{0,25}' + NUM + r'\s*%'
+                         r'|' + NUM.replace('val', 'val2') + r'\s*%\s*skylights?', re.I)
+VLT_RE  = re.compile(r'\b(?:vlt|visible\s+light\s+transmittance)\b[^0-9]{0,20}(?P<val>\d*\.\d+|\d+)\s*%?', re.I)
+HOURS_RE = re.compile(r'\b(?:24\s*/\s*7|\d{1,2}(?::\d{2})?\s*(?:am|pm)?\s*(?:-|to)\s*\d{1,2}(?::\d{2})?\s*(?:am|pm)'
+                      r'|\d{1,2}\s*(?:hours?|hrs?)(?:\s*(?:a|per)\s*day)?)', re.I)
+NEW_RE      = re.compile(r'\b(?:brand[\s-]*new|new|proposed|under\s+construction|to\s+be\s+built)\b', re.I)
+EXISTING_RE = re.compile(r'\b(?:existing|retrofit\w*|renovat\w*|refurbish\w*)\b', re.I)
+HVAC_RE = re.compile(r'\b(vrf|vrv|chillers?|split(?:\s+units?)?|packaged?\s+units?|central\s+a/?c|fan\s+coil\s+units?)\b', re.I)
+NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)*')
 
-def _regex_fill(ctx: BuildingContext, message: str) -> BuildingContext:
-    if ctx.floor_area_m2 is None:
-        m = AREA_RE.search(message)
-        if m: ctx.floor_area_m2 = float(m.group("val"))
+BUILDING_TYPES = [
+    ("office", r'offices?'),
+    ("hotel", r'hotels?|resorts?'),
+    ("hospital", r'hospitals?|clinics?|healthcare'),
+    ("retail", r'shopping|malls?|retail|supermarkets?'),
+    ("school", r'schools?|universit(?:y|ies)|colleges?|educational'),
+    ("residential", r'apartments?|condominiums?|housing|residential'),
+    ("industrial", r'factor(?:y|ies)|industrial|manufacturing'),
+    ("warehouse", r'warehouses?'),
+]
+BUILDING_TYPE_RE = [(name, re.compile(r'\b(?:' + pat + r')\b', re.I)) for name, pat in BUILDING_TYPES]
 
-    if ctx.electrical_demand_kva is None:
-        m = KVA_RE.search(message)
-        if m: ctx.electrical_demand_kva = float(m.group("val"))
+SL_DISTRICTS = [
+    "Ampara", "Anuradhapura", "Badulla", "Batticaloa", "Colombo", "Galle", "Gampaha", "Hambantota",
+    "Jaffna", "Kalutara", "Kandy", "Kegalle", "Kilinochchi", "Kurunegala", "Mannar", "Matale", "Matara",
+    "Monaragala", "Mullaitivu", "Nuwara Eliya", "Polonnaruwa", "Puttalam", "Ratnapura", "Trincomalee", "Vavuniya",
+]
+DISTRICT_RE = re.compile(r'\b(' + "|".join(SL_DISTRICTS) + r')\b', re.I)
 
-    if ctx.wwr_percent is None:
-        m = WWR_RE.search(message)
-        if m: ctx.wwr_percent = float(m.group("val"))
+def _num(m: re.Match) -> float:
+    val = m.group("val") if m.group("val") is not None else m.group("val2")
+    return float(val.replace(",", ""))
 
-    low = message.lower()
-    if ctx.district is None:
-        if "colombo" in low: ctx.district = "Colombo"
-    if ctx.is_new_building is None:
-        if "new" in low or "brand new" in low: ctx.is_new_building = True
+def _nearest_service(message: str, m: re.Match) -> Optional[str]:
+    """"heat" or "cool", whichever keyword sits closest to the value (40 chars before / 25 after)."""
+    lo, hi = max(0, m.start() - 40), m.end() + 25
+    best, best_dist = None, None
+    for kind, rx in (("heat", HEAT_WORDS_RE), ("cool", COOL_WORDS_RE)):
+        for k in rx.finditer(message, lo, hi):
+            dist = m.start() - k.end() if k.end() <= m.start() else k.start() - m.end()
+            if best_dist is None or abs(dist) < best_dist:
+                best, best_dist = kind, abs(dist)
+    return best
+
+def _regex_extract(message: str) -> Tuple[Dict[str, Any], List[Tuple[int, int]]]:
+    """Context fields found by regex, plus the spans they consumed."""
+    fields: Dict[str, Any] = {}
+    spans: List[Tuple[int, int]] = []
 
+    def take(field, value, m):
+        fields.setdefault(field, value)
+        spans.append(m.span())
+
+    for m in AREA_RE.finditer(message):
+        take("floor_area_m2", _num(m), m)
+    for m in KVA_RE.finditer(message):
+        take("electrical_demand_kva", _num(m) * (1000 if m.group("unit").lower() == "mva" else 1), m)
+    for m in CAP_RE.finditer(message):
+        unit = m.group("unit").lower().replace(" ", "")
+        kind = _nearest_service(message, m)
+        if unit in ("tr", "rt") or unit.startswith("ton"):
+            take("cooling_capacity_kwth", round(_num(m) * 3.517, 1), m)
+        elif kind == "heat":
+            take("heating_capacity_kwth", _num(m), m)
+        elif kind == "cool" or unit == "kwth":
+            take("cooling_capacity_kwth", _num(m), m)
+    for m in WWR_RE.finditer(message):
+        take("wwr_percent", _num(m), m)
+    for m in SKYLIGHT_RE.finditer(message):
+        take("skylight_percent", _num(m), m)
+    for m in VLT_RE.finditer(message):
+        v = float(m.group("val"))
+        take("glazing_vlt", v / 100 if v > 1 else v, m)
+    for m in HOURS_RE.finditer(message):
+        take("operating_hours", m.group(0).strip(), m)
+
+    for name, rx in BUILDING_TYPE_RE:
+        if rx.search(message):
+            fields["building_type"] = name
+            break
+    m = HVAC_RE.search(message)
+    if m:
+        fields["hvac_type"] = m.group(1).lower()
+    m = DISTRICT_RE.search(message)
+    if m:
+        fields["district"] = next(d for d in SL_DISTRICTS if d.lower() == m.group(1).lower())
+    if EXISTING_RE.search(message):
+        fields["is_new_building"] = False
+    elif NEW_RE.search(message):
+        fields["is_new_building"] = True
+
+    # Clause/table numbers are not context values
+    spans.extend(m.span() for m in CLAUSE_REF_RE.finditer(message))
+    return fields, spans
+
+def _regex_fill(ctx: BuildingContext, message: str) -> BuildingContext:
+    fields, _ = _regex_extract(message)
+    for k, v in fields.items():
+        if getattr(ctx, k) is None:
+            setattr(ctx, k, v)
     return ctx
 
+THRESHOLD_FIELDS = ("floor_area_m2", "electrical_demand_kva", "cooling_capacity_kwth", "heating_capacity_kwth")
+
+def _numbers_placed(message: str) -> bool:
+    """True when every number in the message was claimed by a regex extractor."""
+    _, spans = _regex_extract(message)
+    return all(any(a <= m.start() and m.end() <= b for a, b in spans) for m in NUMBER_RE.finditer(message))
+
+def _regex_covers(message: str, ctx: BuildingContext) -> bool:
+    """
+    True when the intake LLM has nothing left to add: every number in the
+    message was claimed by a regex extractor and at least one applicability
+    threshold field is known.
+    """
+    if not any(getattr(ctx, f) is not None for f in THRESHOLD_FIELDS):
+        return False
+    return _numbers_placed(message)
+
 # ----------------------------
 # Agent 1: Intake (LLM -> JSON) + regex patch
 # ----------------------------
-def intake(message: str, ctx: Optional[BuildingContext]) -> BuildingContext:
-    ctx = ctx or BuildingContext()
+INTAKE_SYSTEM = "Extract building context fields as strict JSON only. No extra text."
 
-    sys = "Extract building context fields as strict JSON only. No extra text."
-    user = f"""
+def _intake_prompt(message: str) -> str:
+    return f"""
 Return JSON for these fields (use null if unknown):
 district, building_type, is_new_building, floor_area_m2, electrical_demand_kva,
 cooling_capacity_kwth, heating_capacity_kwth, wwr_percent, skylight_percent,
@@ -67,8 +231,17 @@ glazing_vlt, hvac_type, operating_hours
 User text:
 {message}
 """
+
+def _intake_shortcut(message: str, ctx: BuildingContext) -> Optional[BuildingContext]:
+    """The regex-filled context when it already covers the message (no LLM call needed)."""
+    if FAST_PATH_CONFIG["skip_intake"]:
+        regex_ctx = _regex_fill(ctx.model_copy(), message)
+        if _regex_covers(message, regex_ctx):
+            return regex_ctx
+    return None
+
+def _intake_merge(message: str, ctx: BuildingContext, raw: Optional[str]) -> BuildingContext:
     try:
-        raw = _llm_extract.chat(sys, user)
         jtxt = raw[raw.find("{"): raw.rfind("}") + 1]
         data = json.loads(jtxt)
         merged = ctx.model_dump()
@@ -83,9 +256,43 @@ User text:
     # Always patch numeric fields with regex (super important)
     return _regex_fill(ctx, message)
 
+@traced("intake")
+def intake(message: str, ctx: Optional[BuildingContext], strict: bool = False) -> BuildingContext:
+    """Regex + LLM extraction; a failed LLM call falls back to regex only, or raises when `strict`."""
+    ctx = ctx or BuildingContext()
+    shortcut = _intake_shortcut(message, ctx)
+    if shortcut is not None:
+        return shortcut
+    try:
+        raw = _llm_extract.chat(INTAKE_SYSTEM, _intake_prompt(message))
+    except Exception:
+        if strict:
+            raise
+        raw = None
+    return _intake_merge(message, ctx, raw)
+
+@traced("intake")
+async def aintake(message: str, ctx: Optional[BuildingContext]) -> BuildingContext:
+    ctx = ctx or BuildingContext()
+    shortcut = _intake_shortcut(message, ctx)
+    if shortcut is not None:
+        return shortcut
+    try:
+        raw = await _llm_extract.achat(INTAKE_SYSTEM, _intake_prompt(message))
+    except Exception:
+        raw = None
+    return _intake_merge(message, ctx, raw)
+
 # ----------------------------
 # Agent 2: Applicability (area OR kVA OR HVAC thresholds)
 # ----------------------------
+APPLICABILITY_REASONS = {
+    "yes": "EEBC likely applies because at least one threshold is met.",
+    "no": "EEBC likely not mandatory based on provided values; you can still use it as best practice.",
+    "unknown": "Need at least floor area (m²) or electrical demand (kVA) or HVAC capacities (kWth).",
+}
+
+@traced("applicability")
 def applicability(ctx: BuildingContext) -> Tuple[str, str]:
     known_any = False
     applies = False
@@ -130,11 +337,111 @@ def applicability(ctx: BuildingContext) -> Tuple[str, str]:
         reasons.append("Heating capacity missing (kWth).")
 
     if not known_any:
-        return "unknown", "Need at least floor area (m²) or electrical demand (kVA) or HVAC capacities (kWth)."
+        return "unknown", APPLICABILITY_REASONS["unknown"]
 
     if applies:
-        return "yes", "EEBC likely applies because at least one threshold is met."
-    return "no", "EEBC likely not mandatory based on provided values; you can still use it as best practice."
+        return "yes", APPLICABILITY_REASONS["yes"]
+    return "no", APPLICABILITY_REASONS["no"]
+
+# ----------------------------
+# Agent 2b: Applicability fast path (rule-based, no LLM)
+# "Does EEBC apply to my 1500 m² office?" is fully decided by applicability();
+# answer it from a template that cites the scope clause (2.3).
+# ----------------------------
+APPLIES_Q_RE = re.compile(
+    r"\b(?:does|do|will|would|is|are)\b[^?]{0,60}\b(?:eebc|code|regulations?)\b[^?]{0,30}"
+    r"\b(?:apply|applies|applicable|mandatory|required|compulsory|cover)"
+    r"|\b(?:need|have|required)\s+to\s+(?:comply|follow|meet)\b"
+    r"|\b(?:applicab\w*|covered\s+by)\b[^?]{0,20}\b(?:eebc|code)\b", re.I)
+# Anything asking for more than yes/no goes to the full pipeline
+DETAIL_RE = re.compile(
+    r"\b(?:how|which|why|requirements?|provisions?|limits?|calculat\w*|explain|steps?|documents?|submi\w*|"
+    r"u[\s-]?values?|insulation|lighting|ettv|rttv|shgc|efficiency|what\s+(?:are|is|should))\b", re.I)
+
+THRESHOLDS = [  # field, label, unit, limit, inclusive
+    ("floor_area_m2", "floor area", "m²", 1000, True),
+    ("electrical_demand_kva", "electrical demand", "kVA", 500, True),
+    ("cooling_capacity_kwth", "cooling capacity", "kWth", 350, False),
+    ("heating_capacity_kwth", "heating capacity", "kWth", 250, False),
+]
+SCOPE_CLAUSE = {
+    "section": "2.3",
+    "page": 16,
+    "query": "commercial buildings industrial facilities housing developments meeting any of the following "
+             "criteria floor area 1,000 m2 electrical power demand 500 kVA cooling capacity 350 heating 250",
+    "excerpt": "2.3 All commercial buildings, industrial facilities and large scale housing developments meeting "
+               "any of the following criteria must meet the requirements of this Code: a) Floor area of 1,000 m2 "
+               "or greater b) Electrical power demand of 500 kVA or greater c) Air-conditioning cooling ...",
+}
+_scope_sources: Dict[str, List[Dict[str, Any]]] = {}
+
+def _is_applicability_query(message: str) -> bool:
+    return bool(APPLIES_Q_RE.search(message)) and not DETAIL_RE.search(message)
+
+def _scope_sources_for(store) -> List[Dict[str, Any]]:
+    """Indexed chunks that state the scope thresholds; looked up once per index (BM25, no network)."""
+    fallback = [{"page": SCOPE_CLAUSE["page"], "chunk_id": "eebc-" + SCOPE_CLAUSE["section"], "score": 1.0,
+                 "excerpt": SCOPE_CLAUSE["excerpt"]}]
+    if not store or not len(store.chunks):
+        return fallback
+    key = store.lexical.fingerprint
+    if key not in _scope_sources:
+        found = []
+        for i, score in store.lexical.search(SCOPE_CLAUSE["query"], 5):
+            c = store.chunks[i]
+            m = re.search(r"500\s*kVA", c["text"], re.I)
+            # Only PDF pages: Excel chunks carry sheet numbers, not citable pages
+            if m and chunk_source(c) == DEFAULT_SOURCE:
+                start = max(0, c["text"].rfind("\n", 0, max(0, m.start() - 120)) + 1)
+                found.append({"page": c["page"], "chunk_id": c["chunk_id"], "score": float(score),
+                              "excerpt": c["text"][start:start + 260].replace("\n", " ")})
+        _scope_sources[key] = found[:2] or fallback
+    return _scope_sources[key]
+
+def _threshold_status(ctx: BuildingContext):
+    met, below, missing = [], [], []
+    for field, label, unit, limit, inclusive in THRESHOLDS:
+        v = getattr(ctx, field)
+        rule = f"{label} {'≥' if inclusive else '>'} {limit:,} {unit}"
+        if v is None:
+            missing.append(rule)
+        elif v >= limit if inclusive else v > limit:
+            met.append(f"{label} {v:,g} {unit} meets {rule}")
+        else:
+            below.append(f"{label} {v:,g} {unit} is below {rule}")
+    return met, below, missing
+
+def applicability_answer(ctx: BuildingContext, applies: str, sources: List[Dict[str, Any]]) -> str:
+    cite = ", ".join(f"p.{p}" for p in sorted({s["page"] for s in sources}))
+    met, below, missing = _threshold_status(ctx)
+    rule = (f"- Clause {SCOPE_CLAUSE['section']}: commercial buildings, industrial facilities and large-scale "
+            f"housing developments must comply if they meet any one criterion: floor area ≥ 1,000 m², "
+            f"electrical demand ≥ 500 kVA, cooling capacity > 350 kWth or heating capacity > 250 kWth ({cite}).")
+    if applies == "yes":
+        lines = [f"- **EEBC applies**: {'; '.join(met)} ({cite}).", rule,
+                 "- Ask about envelope, HVAC, lighting, water heating or electrical requirements for the clauses that apply."]
+    else:
+        lines = [f"- EEBC is **likely not mandatory** on the values given: {'; '.join(below)} ({cite}).", rule]
+        if missing:
+            lines.append(f"- It would still apply if any of these holds: {'; '.join(missing)}. Please confirm these values.")
+        lines.append("- You can still use EEBC as best practice.")
+    return "\n".join(lines)
+
+@traced("fast_path")
+def applicability_fast_path(message: str, ctx: Optional[BuildingContext], store) -> Optional[Tuple[str, str, str, List[Dict[str, Any]]]]:
+    """
+    Templated answer for pure applicability questions whose context regex can
+    fill; None when the question needs the full pipeline.
+    """
+    if not FAST_PATH_CONFIG["applicability"] or not _is_applicability_query(message):
+        return None
+    ctx2 = _regex_fill((ctx or BuildingContext()).model_copy(), message)
+    applies, reason = applicability(ctx2)
+    # "no" must not rest on a number regex couldn't place (the intake LLM might)
+    if applies == "unknown" or (applies == "no" and not _regex_covers(message, ctx2)):
+        return None
+    sources = _scope_sources_for(store)
+    return applicability_answer(ctx2, applies, sources), applies, reason, sources
 
 # ----------------------------
 # Agent 3: Intent router (beginner vs compliance)
@@ -143,21 +450,76 @@ def _is_beginner_query(message: str) -> bool:
     low = message.lower()
     return any(k in low for k in ["what is", "explain", "i'm new", "im new", "beginner", "simple", "overview"])
 
+# ----------------------------
+# Agent 3b: Search router (rules, no LLM)
+# Picks a metadata filter for the vector search: form questions go to the
+# Excel forms, topic questions to their EEBC chapters (the PDF clauses and
+# the form rows that cite them), "page 45" / "pages 40-50" to those pages.
+# Questions touching more than two chapters are not narrowed, and a
+# filtered search that finds too little is redone unfiltered.
+# ----------------------------
+FORMS_SOURCE = "excel_forms"  # source name of the compliance forms workbook (paths.SOURCES)
+
+FORM_Q_RE = re.compile(r"\b(?:forms?|sheets?|checklists?|fill(?:ing)?\s+(?:in|out)|worksheets?)\b", re.I)
+PAGE_Q_RE = re.compile(r"\b(?:pages?|pp?\.)\s*(\d{1,4})(?:\s*(?:-|–|to)\s*(\d{1,4}))?", re.I)
+EEBC_CHAPTERS = [  # section prefix, topic words
+    ("5", r"envelope|roofs?|walls?|insulation|u[\s-]?values?|glaz\w*|windows?|fenestration|wwr|shgc|skylights?|shading|vlt"),
+    ("6", r"hvac|air[\s-]?condition\w*|chillers?|ventilation|vrf|vrv|cop|eer|iplv|ducts?|ahus?|cooling\s+towers?"),
+    ("7", r"service\s+water|hot\s+water|swh|water\s+heat\w*|solar\s+water"),
+    ("8", r"electrical\s+power|power\s+distribution|transformers?|power\s+factor|voltage\s+drop|feeders?|sub-?meter\w*|metering"),
+    ("9", r"lighting|illuminance|lux|luminaires?|lpd|daylight\w*|occupancy\s+sensors?|lamps?"),
+    ("10", r"motors?|pumps?|elevators?|escalators?|lifts?"),
+    ("11", r"simulation|performance\s+path|energy\s+model\w*|baseline\s+model"),
+]
+EEBC_CHAPTER_RE = [(num, re.compile(r"\b(?:" + pat + r")\b", re.I)) for num, pat in EEBC_CHAPTERS]
+ROUTE_MIN_HITS = 3
+
+def route(message: str) -> Optional[Dict[str, Any]]:
+    """Metadata filter for the searches of this question (see VectorStore.search), or None."""
+    if not FAST_PATH_CONFIG["router"]:
+        return None
+    where: Dict[str, Any] = {}
+    m = PAGE_Q_RE.search(message)
+    if m:
+        first = int(m.group(1))
+        where["pages"] = (first, int(m.group(2) or first))
+    if FORM_Q_RE.search(message):
+        where["source"] = FORMS_SOURCE
+    else:
+        chapters = [num for num, rx in EEBC_CHAPTER_RE if rx.search(message)]
+        if 0 < len(chapters) <= 2:
+            where["section"] = chapters
+    return where or None
+
+def _routed_search(store, queries: List[str], top_k: int, where: Optional[Dict[str, Any]],
+                   qvecs=None) -> List[Dict[str, Any]]:
+    """store.search_many within `where`, redone over the whole index if that finds fewer than ROUTE_MIN_HITS."""
+    hits = store.search_many(queries, top_k=top_k, where=where, qvecs=qvecs)
+    if where is not None and len(hits) < ROUTE_MIN_HITS:
+        hits = store.search_many(queries, top_k=top_k, qvecs=qvecs)
+    return hits
+
+async def _arouted_search(store, queries: List[str], top_k: int, where: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """_routed_search with the query embeddings awaited first; only the index search runs in a thread."""
+    qvecs = await store.aembed_queries(queries)
+    return await asyncio.to_thread(_routed_search, store, queries, top_k, where, qvecs)
+
 # ----------------------------
 # Agent 4: Multi-query retrieval agent
-# store.search(query, top_k) must exist (your VectorStore)
+# store.search_many(queries, top_k) must exist (your VectorStore)
 # ----------------------------
-def retrieval_multi(message: str, ctx: BuildingContext, store, top_k_each: int = 6) -> List[Dict[str, Any]]:
-    # Generate 3 retrieval queries (LLM), then merge results
-    sys = "Generate short search queries for retrieving the best EEBC clauses from a PDF. Output JSON only."
-    user = f"""
+QUERIES_SYSTEM = "Generate short search queries for retrieving the best EEBC clauses from a PDF. Output JSON only."
+
+def _queries_prompt(message: str, ctx: BuildingContext) -> str:
+    return f"""
 Return JSON like: {{"queries": ["...", "...", "..."]}}
 User question: {message}
 Context: {ctx.model_dump()}
 """
+
+def _parse_queries(message: str, raw: Optional[str]) -> List[str]:
     queries = [message]
     try:
-        raw = _llm_extract.chat(sys, user)
         jtxt = raw[raw.find("{"): raw.rfind("}") + 1]
         data = json.loads(jtxt)
         q = data.get("queries") or []
@@ -166,32 +528,97 @@ Context: {ctx.model_dump()}
             queries = q[:3]
     except Exception:
         pass
+    return queries
+
+@traced("queries")
+def generate_queries(message: str, ctx: BuildingContext) -> List[str]:
+    # Generate 3 retrieval queries (LLM); fall back to the raw message
+    try:
+        raw = _llm_extract.chat(QUERIES_SYSTEM, _queries_prompt(message, ctx))
+    except Exception:
+        raw = None
+    return _parse_queries(message, raw)
 
+@traced("queries")
+async def agenerate_queries(message: str, ctx: BuildingContext) -> List[str]:
+    try:
+        raw = await _llm_extract.achat(QUERIES_SYSTEM, _queries_prompt(message, ctx))
+    except Exception:
+        raw = None
+    return _parse_queries(message, raw)
+
+@traced("retrieval")
+def retrieval_multi(message: str, ctx: BuildingContext, store, top_k_each: int = 6) -> List[Dict[str, Any]]:
+    queries = generate_queries(message, ctx)
+
+    # One embedding call + one batched FAISS search for all queries;
+    # hits come back merged (best score per chunk) and sorted by score desc
+    out = _routed_search(store, queries, top_k_each, route(message))
+    return out[:10]
+
+def _merge_hits(*hit_lists: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     merged: Dict[str, Dict[str, Any]] = {}
-    for q in queries:
-        for r in store.search(q, top_k=top_k_each):
+    for hits in hit_lists:
+        for r in hits:
             cid = r.get("chunk_id") or f"{r.get('page')}-{hash(r.get('text','')[:80])}"
             if cid not in merged or r.get("score", 0) > merged[cid].get("score", 0):
                 merged[cid] = r
-
-    # Sort by score desc
     out = list(merged.values())
     out.sort(key=lambda x: x.get("score", 0), reverse=True)
-    return out[:10]
+    return out
+
+def _submit_stage(pool, seconds: float, fn, *args):
+    """
+    submit() under the stage's own deadline: once _join has given up on it,
+    its provider calls stop (DeadlineExceeded) instead of holding a pool
+    thread that later requests queue behind.
+    """
+    with stage_deadline(seconds):
+        return submit(pool, fn, *args)
+
+def _join(future, deadline: float, fallback, stage: str):
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeout:
+        print(f"WARNING: pipeline stage '{stage}' timed out; using fallback.")
+        STAGE_ERRORS.inc(stage=stage, error="PipelineTimeout")
+    except Exception as e:
+        print(f"WARNING: pipeline stage '{stage}' failed ({e}); using fallback.")
+    return fallback
+
+@traced("retrieval")
+def intake_and_retrieve_concurrent(message: str, ctx: Optional[BuildingContext], store, top_k_each: int = 6) -> Tuple[BuildingContext, List[Dict[str, Any]]]:
+    """
+    Run both extraction-model calls (intake + query generation) and the
+    raw-message search at once, then search the generated queries.
+    Fallbacks: regex-only context for intake, the raw message for queries.
+    """
+    pool = _get_pool()
+    start = time.monotonic()
+    timeouts = PIPELINE_CONFIG["timeouts"]
+
+    regex_ctx = _regex_fill((ctx or BuildingContext()).model_copy(), message)
+    where = route(message)
+    f_intake = _submit_stage(pool, timeouts["intake"], intake, message, ctx.model_copy() if ctx else None)
+    f_queries = _submit_stage(pool, timeouts["queries"], generate_queries, message, regex_ctx)
+    f_raw = _submit_stage(pool, timeouts["search"], _routed_search, store, [message], top_k_each, where) \
+        if store else None
+
+    ctx2 = _join(f_intake, start + timeouts["intake"], regex_ctx, "intake")
+    queries = _join(f_queries, start + timeouts["queries"], [message], "queries")
+    raw_hits = _join(f_raw, start + timeouts["search"], [], "search") if f_raw else []
+
+    extra = [q for q in queries if q != message]
+    hits = _routed_search(store, extra, top_k_each, where) if (store and extra) else []
+    return ctx2, _merge_hits(raw_hits, hits)[:10]
 
 # ----------------------------
 # Agent 5: Answer agent (must cite pages)
 # ----------------------------
-def build_answer(message: str, ctx: BuildingContext, retrieved: List[Dict[str, Any]], applies: str, reason: str) -> Tuple[str, List[Dict[str, Any]]]:
-    # Keep sources compact for UI
-    sources = []
-    for r in retrieved[:6]:
-        sources.append({
-            "page": r["page"],
-            "chunk_id": r["chunk_id"],
-            "score": r.get("score", 0.0),
-            "excerpt": r["text"][:260].replace("\n", " ")
-        })
+def answer_prompt(message: str, ctx: BuildingContext, retrieved: List[Dict[str, Any]], applies: str, reason: str,
+                  history: Optional[List[Dict[str, str]]] = None) -> Tuple[str, str, List[Dict[str, Any]]]:
+    # Most relevant sentences of the top chunks, within the prompt token budget
+    sources = pack_sources(message, retrieved)
 
     if _is_beginner_query(message):
         # No need to overwhelm; still cite
@@ -200,20 +627,29 @@ def build_answer(message: str, ctx: BuildingContext, retrieved: List[Dict[str, A
         sys = "You are an EEBC compliance assistant. Answer clearly, step-by-step, using ONLY the provided sources. Every rule must have (p.X) citations."
 
     # Pack sources
-    src_block = "\n".join([f"[S{i+1}] p.{s['page']} {s['chunk_id']}: {s['excerpt']}" for i, s in enumerate(sources)])
+    src_block = "\n".join([f"[S{i+1}] {source_label(s)} {s['chunk_id']}: {s['excerpt']}" for i, s in enumerate(sources)])
+
+    # Follow-ups: the last few turns (answers clipped) so "and lighting?" has a referent
+    history_block = ""
+    if history:
+        turns = "\n".join(f"Q: {h['q']}\nA: {h['a']}" for h in history)
+        history_block = f"""
+Earlier in this conversation:
+{turns}
+"""
 
-    user = f"""
+    user = f"""{history_block}
 User question:
 {message}
 
 Parsed context:
-{ctx.model_dump()}
+{compact_context(ctx)}
 
 Applicability:
 applies={applies}
 reason={reason}
 
-Sources (you must cite pages like (p.39)):
+Sources (you must cite pages like (p.39), or forms like (Form 'Summary page')):
 {src_block}
 
 Write:
@@ -221,19 +657,490 @@ Write:
 - If info is missing, ask 2–3 short questions
 - Do NOT invent
 """
-    answer = _llm_reason.chat(sys, user)
-    return answer, sources
+    return sys, user, sources
+
+# ----------------------------
+# Answer cascade (GROQ_CONFIG["answer_mode"] == "cascade")
+# The draft is not streamed: it is checked whole, then sent as one token
+# event, or dropped for the reason model's (streamed) answer.
+# ----------------------------
+_cascade_counts = {"drafts": 0, "escalated": 0}
+
+def _cascade() -> bool:
+    return GROQ_CONFIG["answer_mode"] == "cascade"
+
+def _accept_draft(draft: Optional[str], user: str, sources: List[Dict[str, Any]]) -> Optional[str]:
+    """The draft when it passes the local checks, else None (and the escalation is counted)."""
+    failed = ["error"] if draft is None else check_answer(draft, user, sources)
+    _cascade_counts["drafts"] += 1
+    if failed:
+        _cascade_counts["escalated"] += 1
+        ANSWER_CASCADE.inc(outcome="escalated", check=failed[0])
+        return None
+    ANSWER_CASCADE.inc(outcome="served", check="none")
+    return draft
+
+def _draft(sys: str, user: str, sources: List[Dict[str, Any]]) -> Optional[str]:
+    try:
+        draft = _llm_draft.chat(sys, user)
+    except Exception as e:
+        print(f"WARNING: draft answer failed ({e}); escalating.")
+        draft = None
+    return _accept_draft(draft, user, sources)
+
+async def _adraft(sys: str, user: str, sources: List[Dict[str, Any]]) -> Optional[str]:
+    try:
+        draft = await _llm_draft.achat(sys, user)
+    except Exception as e:
+        print(f"WARNING: draft answer failed ({e}); escalating.")
+        draft = None
+    return _accept_draft(draft, user, sources)
+
+def _answer_deltas(sys: str, user: str, sources: List[Dict[str, Any]]) -> Iterator[str]:
+    draft = _draft(sys, user, sources) if _cascade() else None
+    if draft is not None:
+        yield draft
+        return
+    yield from _llm_reason.stream(sys, user)
+
+async def _aanswer_deltas(sys: str, user: str, sources: List[Dict[str, Any]]) -> AsyncIterator[str]:
+    draft = await _adraft(sys, user, sources) if _cascade() else None
+    if draft is not None:
+        yield draft
+        return
+    async for delta in _llm_reason.astream(sys, user):
+        yield delta
+
+def _answer_text(sys: str, user: str, sources: List[Dict[str, Any]]) -> str:
+    answer = _draft(sys, user, sources) if _cascade() else None
+    return answer if answer is not None else _llm_reason.chat(sys, user)
+
+async def _aanswer_text(sys: str, user: str, sources: List[Dict[str, Any]]) -> str:
+    answer = await _adraft(sys, user, sources) if _cascade() else None
+    return answer if answer is not None else await _llm_reason.achat(sys, user)
+
+@register_collector
+def _cascade_metrics():
+    if not _cascade_counts["drafts"]:
+        return []
+    return [("eebc_answer_escalation_ratio", "gauge", "Cascade drafts escalated to the reason model / drafts.",
+             [({}, _cascade_counts["escalated"] / _cascade_counts["drafts"])])]
+
+@traced("answer")
+def build_answer(message: str, ctx: BuildingContext, retrieved: List[Dict[str, Any]], applies: str, reason: str,
+                 history: Optional[List[Dict[str, str]]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    sys, user, sources = answer_prompt(message, ctx, retrieved, applies, reason, history)
+    return _answer_text(sys, user, sources), sources
 
 # ----------------------------
-# Single entry point used by Flask
+# Entry points used by Flask
 # ----------------------------
-def run_pipeline(message: str, ctx: Optional[BuildingContext], store) -> Tuple[str, str, str, List[Dict[str, Any]]]:
-    ctx2 = intake(message, ctx)
+def _context_and_retrieval(message: str, ctx: Optional[BuildingContext], store,
+                           sess: Optional[Dict[str, Any]] = None) -> Tuple[BuildingContext, str, str, List[Dict[str, Any]]]:
+    if sess is not None:
+        ctx2 = intake(message, ctx) if not _numbers_placed(message) else ctx
+        with trace_stage("retrieval"):
+            retrieved = _followup_retrieval(message, store, sess)
+        applies, reason = applicability(ctx2)
+    elif PIPELINE_CONFIG["mode"] == "concurrent":
+        ctx2, retrieved = intake_and_retrieve_concurrent(message, ctx, store, top_k_each=6)
+        applies, reason = applicability(ctx2)
+    else:
+        ctx2 = intake(message, ctx)
+        applies, reason = applicability(ctx2)
+
+        # Retrieval is still useful even in beginner mode (for citations),
+        # but if no PDF indexed yet, handle gracefully
+        retrieved = retrieval_multi(message, ctx2, store, top_k_each=6) if store else []
+    # One batched rescoring of the merged candidates; the prompt keeps only the best few
+    return ctx2, applies, reason, rerank(message, retrieved)
+
+@traced("answer_cache")
+def _cache_probe(message: str, ctx: Optional[BuildingContext], store, followup: bool = False):
+    """
+    Look the question up in the answer cache before any Groq call.
+    The key uses the regex-filled request context (deterministic, no LLM) and
+    the query embedding, which search reuses via the embedding cache.
+    Follow-up turns are never cached: their answers depend on the conversation.
+    Returns (key_ctx, qvec, cached_response_or_None); all None when caching is off.
+    """
+    if not _cache_applies(message, store, followup):
+        return None, None, None
+    try:
+        key_ctx = _regex_fill((ctx or BuildingContext()).model_copy(), message)
+        qvec = store.embed_query(message)
+    except Exception as e:
+        print(f"WARNING: answer cache lookup skipped ({e})")
+        return None, None, None
+    return _cache_lookup(key_ctx, qvec, store)
+
+@traced("answer_cache")
+async def _acache_probe(message: str, ctx: Optional[BuildingContext], store, followup: bool = False):
+    """_cache_probe with the query embedding awaited; the sqlite lookup runs in a thread."""
+    if not _cache_applies(message, store, followup):
+        return None, None, None
+    try:
+        key_ctx = _regex_fill((ctx or BuildingContext()).model_copy(), message)
+        qvec = await store.aembed_query(message)
+    except Exception as e:
+        print(f"WARNING: answer cache lookup skipped ({e})")
+        return None, None, None
+    return await asyncio.to_thread(_cache_lookup, key_ctx, qvec, store)
+
+def _cache_applies(message: str, store, followup: bool) -> bool:
+    # Clause lookups are served from BM25 without any embedding call; don't add one here
+    return _answer_cache is not None and bool(store) and not followup and not store.lexical_fast_path(message)
+
+def _cache_lookup(key_ctx, qvec, store):
+    try:
+        return key_ctx, qvec, _answer_cache.lookup(key_ctx, qvec, _embed_model(store))
+    except Exception as e:
+        # A broken cache (locked sqlite file, bad row) costs a miss, never the request
+        print(f"WARNING: answer cache lookup failed ({e})")
+        _answer_cache.misses += 1
+        return key_ctx, qvec, None
+
+def _cache_store(key_ctx, qvec, answer: str, applies: str, reason: str, sources: List[Dict[str, Any]],
+                 store=None):
+    if key_ctx is None or not answer:
+        return
+    try:
+        _answer_cache.store(key_ctx, qvec, {"answer": answer, "applies": applies, "reason": reason,
+                                            "sources": sources}, _embed_model(store))
+    except Exception as e:
+        print(f"WARNING: answer not cached ({e})")
+
+def _embed_model(store) -> str:
+    """Embedding space of the cached query vectors (backend and model; lookup adds the dimension)."""
+    return f"{store.backend}:{store.model}" if store is not None else ""
+
+# ----------------------------
+# Conversation sessions
+# A follow-up turn starts from the session's context and candidate chunks:
+# intake runs only when the message has numbers regex can't place, and
+# retrieval is one search of the message fused with the carried candidates
+# (rescored with their stored embeddings) instead of query generation and a
+# multi-query search.
+# ----------------------------
+def session_id_for(requested: Optional[str]) -> Optional[str]:
+    """
+    The request's session id, or a new one when it sent "new" (or a
+    malformed id). None when sessions are off or the request sent no id:
+    one-shot questions create no session.
+    """
+    if _sessions is None or not requested:
+        return None
+    return requested if valid_session_id(requested) else new_session_id()
+
+@traced("session")
+def _session_begin(message: str, ctx: Optional[BuildingContext], session_id: Optional[str]) -> Tuple[Optional[Dict[str, Any]], Optional[BuildingContext]]:
+    """
+    (session or None, context for this turn). On a follow-up the context is
+    the session's, updated with the request's fields and with the facts regex
+    finds in the message (a restated value replaces the old one).
+    """
+    if _sessions is None or not session_id:
+        return None, ctx
+    try:
+        sess = _sessions.get(session_id)
+    except Exception as e:
+        print(f"WARNING: session lookup failed ({e}); answering as a first turn.")
+        return None, ctx
+    if sess is None:
+        return None, ctx
+    merged = dict(sess["ctx"])
+    if ctx is not None:
+        merged.update(ctx.model_dump(exclude_none=True))
+    merged.update(_regex_extract(message)[0])
+    return sess, BuildingContext(**merged)
+
+def _session_history(sess: Optional[Dict[str, Any]]) -> Optional[List[Dict[str, str]]]:
+    return sess["history"] if sess else None
+
+def _carried_ranking(message: str, store, sess: Dict[str, Any], qvec=None) -> List[Tuple[int, float]]:
+    """The session's candidates (index position, score), best match to the message first."""
+    cands = sess.get("candidates") or []
+    if not cands or sess.get("fingerprint") != store.fingerprint:
+        return []  # the index changed since: stored positions are stale
+    positions = [c["pos"] for c in cands]
+    vecs = sess.get("vecs")
+    if vecs is None or vecs.shape[1] != store.index.d or store.lexical_fast_path(message):
+        # Clause lookups don't embed the message; keep the previous order
+        return [(p, 0.0) for p in positions]
+    scores = vecs.astype(np.float32) @ (qvec if qvec is not None else store.embed_query(message))
+    return [(positions[i], float(scores[i])) for i in np.argsort(-scores)]
+
+def _followup_retrieval(message: str, store, sess: Dict[str, Any], top_k: int = 8,
+                        qvecs=None) -> List[Dict[str, Any]]:
+    """
+    One search of the message (its embedding is reused from the rescoring of
+    the carried candidates, or taken from `qvecs`), fused with those
+    candidates by weighted RRF.
+    """
+    if not store:
+        return []
+    carried = store.hits(_carried_ranking(message, store, sess, (qvecs or {}).get(message)))
+    fresh = _routed_search(store, [message], top_k, route(message), qvecs)
+    fused = rrf([[(h["chunk_id"], h["score"]) for h in fresh], [(h["chunk_id"], h["score"]) for h in carried]],
+                weights=[1.0, SESSION_CONFIG["carry_weight"]])
+    by_id = {h["chunk_id"]: h for h in carried + fresh}
+    return [dict(by_id[cid], score=s) for cid, s in fused[:10]]
+
+@traced("session")
+def _session_end(session_id: Optional[str], sess: Optional[Dict[str, Any]], message: str,
+                 ctx: Optional[BuildingContext], answer: str, retrieved: Optional[List[Dict[str, Any]]], store):
+    """
+    Record the turn: merged context, clipped history and the candidate pool
+    (this turn's chunks first, then the carried ones, with their embeddings).
+    `retrieved` is None when the turn did no retrieval (the pool is kept).
+    """
+    if _sessions is None or not session_id:
+        return
+    prev = sess or {}
+    history = list(prev.get("history") or [])
+    history.append({"q": message, "a": (answer or "")[:SESSION_CONFIG["answer_chars"]]})
+    new = {
+        "ctx": _regex_fill((ctx or BuildingContext()).model_copy(), message).model_dump(exclude_none=True),
+        "history": history[-SESSION_CONFIG["history"]:],
+        "turns": prev.get("turns", 0) + 1,
+        "fingerprint": prev.get("fingerprint", ""),
+        "candidates": prev.get("candidates") or [],
+        "vecs": prev.get("vecs"),
+    }
+    try:
+        if retrieved and store and store.index is not None:
+            fingerprint = store.fingerprint
+            ids = [r["chunk_id"] for r in retrieved if r.get("chunk_id")]
+            if new["fingerprint"] == fingerprint:
+                ids += [c["chunk_id"] for c in new["candidates"]]
+            ids = list(dict.fromkeys(ids))
+            pool = [(cid, pos) for cid, pos in zip(ids, store.positions(ids)) if pos is not None]
+            pool = pool[:SESSION_CONFIG["pool"]]
+            new.update(
+                fingerprint=fingerprint,
+                candidates=[{"chunk_id": cid, "pos": pos} for cid, pos in pool],
+                vecs=store.vectors([pos for _, pos in pool]).astype(np.float16) if pool else None,
+            )
+        _sessions.save(session_id, new)
+    except Exception as e:
+        print(f"WARNING: session not saved ({e})")
+
+def session_stats() -> Optional[Dict[str, Any]]:
+    return _sessions.stats() if _sessions is not None else None
+
+@register_collector
+def _session_metrics():
+    if _sessions is None:
+        return []
+    fams = cache_families("session", _sessions.hits, _sessions.misses)
+    fams.append(("eebc_sessions", "gauge", "Conversation sessions stored.", [({}, _sessions.backend.size())]))
+    return fams
+
+def warmup_clients():
+    """Open the pooled Groq connection (both models share it) before the first request."""
+    _llm_extract.warmup()
+
+async def awarmup_clients():
+    await _llm_extract.awarmup()
+
+def answer_cache_stats() -> Optional[Dict[str, Any]]:
+    return _answer_cache.stats() if _answer_cache is not None else None
+
+@register_collector
+def _answer_cache_metrics():
+    if _answer_cache is None:
+        return []
+    fams = cache_families("answer", _answer_cache.hits, _answer_cache.misses)
+    fams.append(("eebc_answer_cache_entries", "gauge", "Answers stored in the semantic answer cache.",
+                 [({}, _answer_cache.backend.size())]))
+    return fams
+
+# ----------------------------
+# Pipeline steps
+# One generator holds the order of the stages for all four entry points. It
+# yields the (event, data) pairs of run_pipeline_stream, a _Call for each
+# blocking stage and an _Answer for the answer; the driver runs those (in
+# place, or awaited) and sends the result back in.
+# ----------------------------
+class _Call(NamedTuple):
+    """A blocking stage: fn(*args) in place, or awaited (afn, else fn in a worker thread)."""
+    fn: Callable
+    args: tuple
+    afn: Optional[Callable] = None
+
+class _Answer(NamedTuple):
+    """The answer stage; the driver streams it as token events or makes one call, and sends back the text."""
+    sys: str
+    user: str
+    sources: List[Dict[str, Any]]
+
+def _pipeline_steps(message: str, ctx: Optional[BuildingContext], store,
+                    session_id: Optional[str]) -> Generator[Any, Any, None]:
+    sess, ctx = yield _Call(_session_begin, (message, ctx, session_id))
+    fast = applicability_fast_path(message, ctx, store)
+    if fast is not None:
+        answer, applies, reason, sources = fast
+        yield "meta", {"applies": applies, "reason": reason, "sources": sources}
+        yield "token", {"text": answer}
+        yield _Call(_session_end, (session_id, sess, message, ctx, answer, None, store))
+        yield "done", {"answer": answer}
+        return
+
+    key_ctx, qvec, hit = yield _Call(_cache_probe, (message, ctx, store, sess is not None), _acache_probe)
+    if hit is not None:
+        yield "meta", {"applies": hit["applies"], "reason": hit["reason"], "sources": hit["sources"]}
+        yield "token", {"text": hit["answer"]}
+        # The cached sources are citations, not a ranking of this index: keep the carried pool as it is
+        yield _Call(_session_end, (session_id, sess, message, ctx, hit["answer"], None, store))
+        yield "done", {"answer": hit["answer"]}
+        return
+
+    ctx2, applies, reason, retrieved = yield _Call(_context_and_retrieval, (message, ctx, store, sess),
+                                                   _acontext_and_retrieval)
+    sys, user, sources = answer_prompt(message, ctx2, retrieved, applies, reason, _session_history(sess))
+    yield "meta", {"applies": applies, "reason": reason, "sources": sources}
+    answer = yield _Answer(sys, user, sources)
+    yield _Call(_cache_store, (key_ctx, qvec, answer, applies, reason, sources, store))
+    yield _Call(_session_end, (session_id, sess, message, ctx2, answer, retrieved, store))
+    yield "done", {"answer": answer}
+
+def _drive(message: str, ctx: Optional[BuildingContext], store, session_id: Optional[str],
+           stream: bool) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    steps = _pipeline_steps(message, ctx, store, session_id)
+    reply = None
+    while True:
+        try:
+            step = steps.send(reply)
+        except StopIteration:
+            return
+        reply = None
+        if isinstance(step, _Call):
+            reply = step.fn(*step.args)
+        elif isinstance(step, _Answer):
+            with trace_stage("answer"):
+                if not stream:
+                    reply = _answer_text(*step)
+                    continue
+                parts = []
+                for delta in _answer_deltas(*step):
+                    parts.append(delta)
+                    yield "token", {"text": delta}
+                reply = "".join(parts).strip()
+        else:
+            yield step
+
+async def _adrive(message: str, ctx: Optional[BuildingContext], store, session_id: Optional[str],
+                  stream: bool) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    steps = _pipeline_steps(message, ctx, store, session_id)
+    reply = None
+    while True:
+        try:
+            step = steps.send(reply)
+        except StopIteration:
+            return
+        reply = None
+        if isinstance(step, _Call):
+            reply = await (step.afn(*step.args) if step.afn else asyncio.to_thread(step.fn, *step.args))
+        elif isinstance(step, _Answer):
+            with trace_stage("answer"):
+                if not stream:
+                    reply = await _aanswer_text(*step)
+                    continue
+                parts = []
+                async for delta in _aanswer_deltas(*step):
+                    parts.append(delta)
+                    yield "token", {"text": delta}
+                reply = "".join(parts).strip()
+        else:
+            yield step
+
+def _result(out: Dict[str, Any]) -> Tuple[str, str, str, List[Dict[str, Any]]]:
+    """The (answer, applies, reason, sources) tuple from the merged meta and done events."""
+    return out["answer"], out["applies"], out["reason"], out["sources"]
+
+def run_pipeline(message: str, ctx: Optional[BuildingContext], store,
+                 session_id: Optional[str] = None) -> Tuple[str, str, str, List[Dict[str, Any]]]:
+    out: Dict[str, Any] = {}
+    for event, data in _drive(message, ctx, store, session_id, stream=False):
+        if event != "token":
+            out.update(data)
+    return _result(out)
+
+def run_pipeline_stream(message: str, ctx: Optional[BuildingContext], store,
+                        session_id: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of run_pipeline. Yields (event, data) pairs:
+      ("meta",  {"applies", "reason", "sources"})  as soon as retrieval is done
+      ("token", {"text"})                           answer deltas from the reason model
+      ("done",  {"answer"})                         full answer text
+    """
+    return _drive(message, ctx, store, session_id, stream=True)
+
+# ----------------------------
+# Async entry points used by the ASGI server (asgi.py)
+# Groq calls and Voyage query embeddings are awaited on async clients, so a
+# slow provider holds no thread; each is capped by its policy's
+# async_concurrency (rag/net.py), not by the default executor. FAISS/BM25
+# search, reranking and cache I/O are short CPU/disk work and run in worker
+# threads (asyncio.to_thread carries the request deadline).
+# ----------------------------
+async def _ajoin(aw, deadline: float, fallback, stage: str):
+    try:
+        return await asyncio.wait_for(aw, timeout=max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        print(f"WARNING: pipeline stage '{stage}' timed out; using fallback.")
+        STAGE_ERRORS.inc(stage=stage, error="PipelineTimeout")
+    except Exception as e:
+        print(f"WARNING: pipeline stage '{stage}' failed ({e}); using fallback.")
+    return fallback
+
+@traced("retrieval")
+async def _acontext_and_retrieval(message: str, ctx: Optional[BuildingContext], store,
+                                  sess: Optional[Dict[str, Any]] = None) -> Tuple[BuildingContext, str, str, List[Dict[str, Any]]]:
+    """
+    Same stages as the concurrent pipeline: intake, query generation and the
+    raw-message search at once, then the generated queries. Awaiting costs
+    no thread, so this is always the concurrent shape. Follow-ups take the
+    session path of _context_and_retrieval.
+    """
+    if sess is not None:
+        ctx2 = await aintake(message, ctx) if not _numbers_placed(message) else ctx
+        qvecs = await store.aembed_queries([message]) if store else None
+        retrieved = await asyncio.to_thread(_followup_retrieval, message, store, sess, 8, qvecs)
+        retrieved = await asyncio.to_thread(rerank, message, retrieved)
+        applies, reason = applicability(ctx2)
+        return ctx2, applies, reason, retrieved
+
+    start = time.monotonic()
+    timeouts = PIPELINE_CONFIG["timeouts"]
+
+    regex_ctx = _regex_fill((ctx or BuildingContext()).model_copy(), message)
+    where = route(message)
+    t_raw = None
+    if store:
+        # A task copies the context now, so its embedding call and thread see the stage deadline
+        with stage_deadline(timeouts["search"]):
+            t_raw = asyncio.ensure_future(_arouted_search(store, [message], 6, where))
+    ctx2, queries, raw_hits = await asyncio.gather(
+        _ajoin(aintake(message, ctx.model_copy() if ctx else None), start + timeouts["intake"], regex_ctx, "intake"),
+        _ajoin(agenerate_queries(message, regex_ctx), start + timeouts["queries"], [message], "queries"),
+        _ajoin(t_raw, start + timeouts["search"], [], "search") if t_raw else asyncio.sleep(0, []),
+    )
+    extra = [q for q in queries if q != message]
+    hits = await _arouted_search(store, extra, 6, where) if (store and extra) else []
+    retrieved = await asyncio.to_thread(rerank, message, _merge_hits(raw_hits, hits)[:10])
     applies, reason = applicability(ctx2)
+    return ctx2, applies, reason, retrieved
 
-    # Retrieval is still useful even in beginner mode (for citations),
-    # but if no PDF indexed yet, handle gracefully
-    retrieved = retrieval_multi(message, ctx2, store, top_k_each=6) if store else []
+async def arun_pipeline(message: str, ctx: Optional[BuildingContext], store,
+                        session_id: Optional[str] = None) -> Tuple[str, str, str, List[Dict[str, Any]]]:
+    out: Dict[str, Any] = {}
+    async for event, data in _adrive(message, ctx, store, session_id, stream=False):
+        if event != "token":
+            out.update(data)
+    return _result(out)
 
-    answer, sources = build_answer(message, ctx2, retrieved, applies, reason)
-    return answer, applies, reason, sources
+def arun_pipeline_stream(message: str, ctx: Optional[BuildingContext], store,
+                         session_id: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Async variant of run_pipeline_stream (same events)."""
+    return _adrive(message, ctx, store, session_id, stream=True)
@@ -0,0 +1,172 @@
+import os
+import time
+from typing import Dict, Any, List
+
+import numpy as np
+import faiss
+
+# ----------------------------
+# Index type/config selection (env-tunable)
+#   flat      exact IndexFlatIP (default; right for one PDF)
+#   hnsw      graph index, no training, best latency/recall trade-off in RAM
+#   ivf_flat  inverted lists over full vectors, needs training
+#   ivf_pq    inverted lists over product-quantized codes, smallest RAM
+# ----------------------------
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+INDEX_CONFIG = {
+    "type": os.getenv("INDEX_TYPE", "flat").lower(),
+    "nlist": int(os.getenv("INDEX_NLIST", "0")),            # 0 = ~4*sqrt(n)
+    "nprobe": int(os.getenv("INDEX_NPROBE", "16")),
+    "hnsw_m": int(os.getenv("INDEX_HNSW_M", "32")),
+    "ef_construction": int(os.getenv("INDEX_EF_CONSTRUCTION", "200")),
+    "ef_search": int(os.getenv("INDEX_EF_SEARCH", "64")),
+    "pq_m": int(os.getenv("INDEX_PQ_M", "0")),              # 0 = dim/16 sub-quantizers
+    "pq_bits": int(os.getenv("INDEX_PQ_BITS", "8")),
+}
+
+# faiss wants ~39 training points per centroid
+_TRAIN_POINTS_PER_CENTROID = 39
+
+
+def _nlist_for(n: int, cfg: Dict[str, Any]) -> int:
+    nlist = cfg["nlist"] or int(4 * np.sqrt(max(n, 1)))
+    return max(1, min(nlist, n // _TRAIN_POINTS_PER_CENTROID))
+
+
+def _pq_m_for(dim: int, cfg: Dict[str, Any]) -> int:
+    m = cfg["pq_m"] or max(1, dim // 16)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def resolve_type(kind: str, n: int, dim: int, cfg: Dict[str, Any]) -> str:
+    """Fall back to a simpler index when the corpus is too small to train `kind`."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown INDEX_TYPE '{kind}' (expected one of {INDEX_TYPES})")
+    if kind == "ivf_pq" and n < _TRAIN_POINTS_PER_CENTROID * (1 << cfg["pq_bits"]):
+        print(f"WARNING: {n} vectors are too few to train IVF-PQ; using ivf_flat instead.")
+        kind = "ivf_flat"
+    if kind == "ivf_flat" and n < _TRAIN_POINTS_PER_CENTROID * 4:
+        print(f"WARNING: {n} vectors are too few to train IVF; using flat instead.")
+        kind = "flat"
+    return kind
+
+
+def build_index(embs: np.ndarray, kind: str = None, cfg: Dict[str, Any] = None):
+    """Create, train (if needed) and fill an inner-product index over normalized `embs`."""
+    cfg = dict(INDEX_CONFIG, **(cfg or {}))
+    n, dim = embs.shape
+    kind = resolve_type(kind or cfg["type"], n, dim, cfg)
+
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, cfg["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = cfg["ef_construction"]
+    else:
+        nlist = _nlist_for(n, cfg)
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m_for(dim, cfg), cfg["pq_bits"],
+                                     faiss.METRIC_INNER_PRODUCT)
+        index.train(embs)
+
+    index.add(embs)
+    apply_search_params(index, cfg)
+    return index
+
+
+def index_type_of(index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def apply_search_params(index, cfg: Dict[str, Any] = None):
+    """Set query-time knobs (nprobe / efSearch); they are not persisted by faiss."""
+    cfg = dict(INDEX_CONFIG, **(cfg or {}))
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(cfg["nprobe"], index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = cfg["ef_search"]
+
+
+def filtered_search_params(index, selector):
+    """Search parameters restricting `index` to the ids in `selector`, keeping its nprobe / efSearch."""
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def reconstruct_all(index) -> np.ndarray:
+    """All stored vectors, in id order (approximate for IVF-PQ)."""
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def reconstruct_ids(index, ids) -> np.ndarray:
+    """Stored vectors of the given ids (approximate for IVF-PQ)."""
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    out = np.empty((len(ids), index.d), dtype="float32")
+    for row, i in enumerate(ids):
+        out[row] = index.reconstruct(int(i))
+    return out
+
+
+def index_nbytes(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+# ----------------------------
+# recall@k vs latency against the exact Flat baseline
+# ----------------------------
+def recall_latency_report(corpus: np.ndarray, queries: np.ndarray, k: int = 10,
+                          variants: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Build each variant ({"type", **cfg overrides}) over `corpus`, run
+    `queries` one at a time (the serving pattern) and compare to exact search.
+    """
+    exact = faiss.IndexFlatIP(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+
+    variants = variants or [{"type": t} for t in INDEX_TYPES]
+    rows = []
+    for v in variants:
+        cfg = {key: val for key, val in v.items() if key != "type"}
+        t0 = time.perf_counter()
+        index = build_index(corpus, v["type"], cfg)
+        build_s = time.perf_counter() - t0
+
+        lat, found = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            _, ids = index.search(q[None, :], k)
+            lat.append(time.perf_counter() - t0)
+            found.append(ids[0])
+        found = np.array(found)
+
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        lat_ms = np.array(lat) * 1000
+        rows.append({
+            "variant": v["type"] + "".join(f" {key}={val}" for key, val in cfg.items()),
+            "actual_type": index_type_of(index),
+            "recall_at_k": float(recall),
+            "p50_ms": float(np.percentile(lat_ms, 50)),
+            "p95_ms": float(np.percentile(lat_ms, 95)),
+            "build_s": build_s,
+            "mbytes": index_nbytes(index) / 1e6,
+        })
+    return rows
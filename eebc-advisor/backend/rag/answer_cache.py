@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+from .schemas import BuildingContext
+from .utils import reset_after_fork
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "answer_cache.sqlite")
+
+
+def context_key(ctx: BuildingContext, space: str = "") -> str:
+    """
+    Stable key for a building context: null fields dropped, strings
+    case-folded, numbers rounded. `space` names the embedding model and
+    dimension, so vectors of another model are never compared.
+    """
+    norm = {"_space": space} if space else {}
+    for k, v in ctx.model_dump(exclude_none=True).items():
+        if isinstance(v, str):
+            v = " ".join(v.lower().split())
+        elif isinstance(v, float):
+            v = round(v, 2)
+        norm[k] = v
+    return hashlib.sha1(json.dumps(norm, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# ----------------------------
+# Backends: same small interface, entry = {"id", "vec", "response", "created", "last_used"}
+# ----------------------------
+class MemoryBackend:
+    """In-process backend (one cache per gunicorn worker)."""
+
+    def __init__(self):
+        self._entries = OrderedDict()   # id -> entry, oldest use first
+        self._by_ctx = {}               # ctx_key -> set(id)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def candidates(self, ctx_key: str, min_created: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            ids = self._by_ctx.get(ctx_key, ())
+            return [self._entries[i] for i in ids if self._entries[i]["created"] >= min_created]
+
+    def touch(self, entry_id, now: float):
+        with self._lock:
+            if entry_id in self._entries:
+                self._entries[entry_id]["last_used"] = now
+                self._entries.move_to_end(entry_id)
+
+    def put(self, ctx_key: str, vec: np.ndarray, response: Dict[str, Any], now: float):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {"id": entry_id, "ctx_key": ctx_key, "vec": vec,
+                                       "response": response, "created": now, "last_used": now}
+            self._by_ctx.setdefault(ctx_key, set()).add(entry_id)
+
+    def evict(self, max_entries: int, min_created: float):
+        with self._lock:
+            stale = {i for i, e in self._entries.items() if e["created"] < min_created}
+            overflow = max(0, len(self._entries) - len(stale) - max_entries)
+            if overflow:
+                # entries are kept in least-recently-used order
+                stale.update([i for i in self._entries if i not in stale][:overflow])
+            for i in stale:
+                e = self._entries.pop(i)
+                ids = self._by_ctx.get(e["ctx_key"])
+                if ids is not None:
+                    ids.discard(i)
+                    if not ids:
+                        del self._by_ctx[e["ctx_key"]]
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """Local sqlite file, shared by all gunicorn workers on the host."""
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        reset_after_fork(self, lambda b: setattr(b, "_local", threading.local()))
+        conn = self._conn()
+        conn.execute("""CREATE TABLE IF NOT EXISTS answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ctx_key TEXT NOT NULL,
+            vec BLOB NOT NULL,
+            response TEXT NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS answers_ctx ON answers (ctx_key)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def candidates(self, ctx_key: str, min_created: float) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT id, vec, response, created, last_used FROM answers WHERE ctx_key = ? AND created >= ?",
+            (ctx_key, min_created),
+        ).fetchall()
+        return [{"id": r[0], "vec": np.frombuffer(r[1], dtype=np.float32), "response": json.loads(r[2]),
+                 "created": r[3], "last_used": r[4]} for r in rows]
+
+    def touch(self, entry_id, now: float):
+        conn = self._conn()
+        conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, entry_id))
+        conn.commit()
+
+    def put(self, ctx_key: str, vec: np.ndarray, response: Dict[str, Any], now: float):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO answers (ctx_key, vec, response, created, last_used) VALUES (?, ?, ?, ?, ?)",
+            (ctx_key, np.asarray(vec, dtype=np.float32).tobytes(), json.dumps(response, ensure_ascii=False), now, now),
+        )
+        conn.commit()
+
+    def evict(self, max_entries: int, min_created: float):
+        conn = self._conn()
+        conn.execute("DELETE FROM answers WHERE created < ?", (min_created,))
+        conn.execute(
+            "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        )
+        conn.commit()
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+# ----------------------------
+# Cache
+# ----------------------------
+class AnswerCache:
+    """
+    Semantic cache of ChatResponse payloads.
+
+    An entry matches when the normalized BuildingContext and the embedding
+    space (model name) are identical and the cosine similarity of the query
+    embeddings is >= threshold.
+    """
+
+    def __init__(self, backend, threshold: float = 0.97, ttl_seconds: float = 86400, max_entries: int = 5000):
+        self.backend = backend
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        """ANSWER_CACHE=memory|sqlite|off; returns None when off."""
+        kind = os.getenv("ANSWER_CACHE", "memory").lower()
+        if kind in ("0", "off", "false", "no", "none"):
+            return None
+        if kind == "sqlite":
+            backend = SqliteBackend(os.getenv("ANSWER_CACHE_PATH", DEFAULT_SQLITE_PATH))
+        else:
+            backend = MemoryBackend()
+        return cls(
+            backend,
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000")),
+        )
+
+    @staticmethod
+    def space(model: str, dim: int) -> str:
+        return f"{model}/{int(dim)}"
+
+    def lookup(self, ctx: BuildingContext, qvec: np.ndarray, model: str = "") -> Optional[Dict[str, Any]]:
+        now = time.time()
+        best, best_score = None, self.threshold
+        for e in self.backend.candidates(context_key(ctx, self.space(model, qvec.shape[0])), now - self.ttl_seconds):
+            if e["vec"].shape != qvec.shape:
+                continue  # written under another space (e.g. before the model was part of the key)
+            score = float(np.dot(e["vec"], qvec))
+            if score >= best_score:
+                best, best_score = e, score
+
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.backend.touch(best["id"], now)
+        return best["response"]
+
+    def store(self, ctx: BuildingContext, qvec: np.ndarray, response: Dict[str, Any], model: str = ""):
+        now = time.time()
+        qvec = np.asarray(qvec, dtype=np.float32)
+        self.backend.put(context_key(ctx, self.space(model, qvec.shape[0])), qvec, response, now)
+        self.backend.evict(self.max_entries, now - self.ttl_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_ratio": (self.hits / total) if total else 0.0, "size": self.backend.size()}
@@ -0,0 +1,251 @@
+import re
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple
+
+# "6.3.3.2 Off-hour control". Needs a dotted number and a worded title, so
+# table rows ("0 to 3 R-1.41") and values ("3.90 ICOP") don't qualify.
+HEADING_RE = re.compile(r"^(?P<num>\d{1,2}(?:\.\d{1,2}){1,5})\.?\s+(?P<title>[A-Z(][^\n]*[a-z][^\n]*)$")
+TABLE_RE = re.compile(r"^Table\s+[A-Z]?\d+(?:\.\d+)*(?:-\d+)?\s*[:.\-]", re.I)
+EXCEPTION_RE = re.compile(r"^Exceptions?\s+to\s+\d+(?:\.\d+)*", re.I)
+CLAUSE_NUM_RE = re.compile(r"\(?(\d{1,2}(?:\.\d{1,2}){1,5})(?:-[\d.]+)?\)?")
+CONTINUED = " (continued)"
+
+# Running page furniture of the EEBC PDF: title line, "34 ı Sri Lanka
+# Sustainable Energy Authority", the chapter tab ("06") and the rotated side
+# label, which pdfplumber reads back to front ("METSYS", "CAVH").
+FURNITURE_RE = [
+    re.compile(r"^Energy Efficiency Building Code of Sri Lanka$", re.I),
+    re.compile(r"^(?:\d+\s+\S\s+)?Sri Lanka Sustainable Energy Authority(?:\s+\d+)?$", re.I),
+    re.compile(r"^\d{1,2}$"),
+    re.compile(r"^[A-Z]{3,}$"),
+]
+_DOT_LEADER_RE = re.compile(r"\s*\.{4,}\s*")
+
+
+def strip_furniture(lines: List[str]) -> List[str]:
+    """Drop the running header block at the top of a page."""
+    i = 0
+    while i < len(lines) and (not lines[i].strip() or any(r.match(lines[i].strip()) for r in FURNITURE_RE)):
+        i += 1
+    return lines[i:]
+
+
+def heading_of(line: str) -> Optional[Tuple[str, str]]:
+    m = HEADING_RE.match(line.strip())
+    if not m or "...." in line:
+        return None
+    title = m.group("title").strip()
+    if title.endswith(CONTINUED):
+        title = title[: -len(CONTINUED)]
+    return m.group("num"), title
+
+
+def last_section(text: str) -> Optional[Tuple[str, str]]:
+    """The clause in effect at the end of a chunk's text (its last heading, or its continuation label)."""
+    for line in reversed(text.split("\n")):
+        h = heading_of(line)
+        if h:
+            return h
+    return None
+
+
+def section_tags(c: Dict[str, Any]) -> List[str]:
+    """
+    Clause numbers a chunk covers: tagged at ingest ("section", plus
+    "sections" when it spans several), else read from its headings (chunks
+    indexed before sections were tagged).
+    """
+    if c.get("sections"):
+        return list(c["sections"])
+    if c.get("section"):
+        return [c["section"]]
+    tags = []
+    for line in c["text"].split("\n"):
+        h = heading_of(line)
+        if h and h[0] not in tags:
+            tags.append(h[0])
+    return tags
+
+
+def content_id(text: str, salt: str = "") -> str:
+    """Chunk ID from the chunk's own content, so unchanged text keeps its ID across re-ingests."""
+    return "c" + hashlib.sha1((salt + "\0" + text).encode("utf-8")).hexdigest()[:15]
+
+
+class StructureChunker:
+    """
+    Clause-, table- and sheet-aware chunker.
+
+    PDF pages are cut at clause headings ("6.3.4.1 Duct and plenum
+    insulation"), table captions and "Exceptions to ..." lines, then small
+    blocks are packed up to max_chars. Oversized blocks split on line
+    boundaries and repeat their heading. Chunks never span pages (so page
+    hashes stay exact), but text continuing a clause from the previous page
+    is labelled "<num> <title> (continued)" and tagged with that section.
+
+    Excel sheets (pages with "rows") give one chunk per table row plus
+    per-sheet overview chunks.
+
+    Pages must be fed in order; for pages chunked out of sequence
+    (incremental re-ingest), `section_before(page)` supplies the clause in
+    effect at the end of the previous page, and `seen` the chunk_ids the
+    index keeps, so a re-chunked page never reuses one of them.
+    """
+
+    def __init__(self, max_chars: int = 1800, min_chars: int = 300, section_before=None, seen=None):
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self.section_before = section_before
+        self._section = None
+        self._last_page = None
+        self._seen = set(seen or ())
+
+    def chunk_pages(self, pages):
+        for pg in pages:
+            yield from self.chunk_page(pg)
+
+    def chunk_page(self, pg: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if "rows" in pg:
+            chunks = self._chunk_sheet(pg)
+        else:
+            if self._last_page is None or pg["page"] != self._last_page + 1:
+                self._section = self.section_before(pg["page"]) if self.section_before else None
+            self._last_page = pg["page"]
+            chunks = self._chunk_text_page(pg)
+        for c in chunks:
+            # Repeated text (page furniture, identical form rows) is salted with its page, then a counter
+            cid, n = content_id(c["text"]), 0
+            while cid in self._seen:
+                cid = content_id(c["text"], salt=str(c["page"]) + (f":{n}" if n else ""))
+                n += 1
+            self._seen.add(cid)
+            c["chunk_id"] = cid
+        return chunks
+
+    # ---- PDF pages ----
+    def _blocks(self, lines: List[str]) -> List[Dict[str, Any]]:
+        cur = {"section": self._section, "head": None, "lines": []}
+        blocks = [cur]
+        for raw in lines:
+            line = _DOT_LEADER_RE.sub(" ... ", raw.strip())
+            if not line:
+                continue
+            h = heading_of(raw)
+            if h or TABLE_RE.match(line) or EXCEPTION_RE.match(line):
+                if h:
+                    self._section = h
+                cur = {"section": self._section, "head": line, "lines": []}
+                blocks.append(cur)
+            else:
+                cur["lines"].append(line)
+        return [b for b in blocks if b["head"] or b["lines"]]
+
+    def _block_text(self, b) -> Tuple[str, str]:
+        """(first line, continuation prefix) of a block."""
+        if b["head"]:
+            return b["head"], b["head"] + CONTINUED
+        if b["section"]:
+            label = f"{b['section'][0]} {b['section'][1]}{CONTINUED}"
+            return label, label
+        return "", ""
+
+    def _split(self, b) -> List[str]:
+        first, cont = self._block_text(b)
+        pieces, cur = [], first
+        for line in b["lines"]:
+            if cur and cur not in (first, cont) and len(cur) + 1 + len(line) > self.max_chars:
+                pieces.append(cur)
+                cur = cont
+            cur = (cur + "\n" + line) if cur else line
+        if cur and cur not in (first, cont) or not pieces:
+            pieces.append(cur)
+        return pieces
+
+    def _chunk_text_page(self, pg) -> List[Dict[str, Any]]:
+        out = []
+        cur = None
+        for b in self._blocks(strip_furniture((pg["text"] or "").split("\n"))):
+            for piece in self._split(b):
+                if cur and len(cur["text"]) + 2 + len(piece) <= self.max_chars:
+                    cur["text"] += "\n\n" + piece
+                    if b["section"] and b["section"][0] != cur.get("section"):
+                        tags = cur.setdefault("sections", [cur["section"]] if cur.get("section") else [])
+                        if b["section"][0] not in tags:
+                            tags.append(b["section"][0])
+                    continue
+                cur = {"page": pg["page"], "text": piece}
+                if b["section"]:
+                    cur["section"] = b["section"][0]
+                out.append(cur)
+
+        # A short tail reads better folded into the previous chunk
+        if len(out) > 1 and len(out[-1]["text"]) < self.min_chars \
+                and len(out[-2]["text"]) + len(out[-1]["text"]) <= self.max_chars + self.min_chars:
+            out[-2]["text"] += "\n\n" + out.pop()["text"]
+        # Blank and divider pages leave nothing worth embedding
+        return [c for c in out if sum(ch.isalnum() for ch in c["text"]) >= 30]
+
+    # ---- Excel sheets ----
+    def _chunk_sheet(self, pg) -> List[Dict[str, Any]]:
+        """
+        Sheet rows are [(row_no, [cell, ...])] with "" for empty cells.
+        Single-cell rows are headings; a row of >= 3 short text cells followed by
+        filled rows is a table header, and every filled row under it becomes
+        a "Header: value; ..." chunk.
+        """
+        sheet = pg["sheet"]
+        rows = [(n, cells) for n, cells in pg["rows"] if any(cells)]
+        if not rows:
+            return []
+        # Title: a lone cell among the first rows, else the sheet name
+        title = next((c for _, cells in rows[:3] for c in cells if c and sum(1 for x in cells if x) == 1), sheet)
+        crumb = f"Form '{sheet}'" + (f": {title}" if title != sheet else "")
+
+        out, lines, section, header = [], [], None, None
+        for i, (n, cells) in enumerate(rows):
+            filled = [(j, c) for j, c in enumerate(cells) if c]
+            lines.append(" | ".join(c for _, c in filled))
+            if len(filled) == 1:
+                section, header = filled[0][1], None
+                continue
+            nxt = rows[i + 1][1] if i + 1 < len(rows) else []
+            if header is None and len(filled) >= 3 and sum(1 for c in nxt if c) >= 2 \
+                    and not any(_is_number(c) or len(c) > 60 for _, c in filled):
+                header = dict(filled)
+                continue
+            if header is None:
+                continue
+            pairs = [f"{header[j]}: {c}" if header.get(j) else c for j, c in filled]
+            text = crumb + (f" / {section}" if section and section != title else "") + "\n" + "; ".join(pairs)
+            row = {"page": pg["page"], "text": text, "sheet": sheet, "row": n}
+            ref = next((m.group(1) for _, c in filled for m in [CLAUSE_NUM_RE.fullmatch(c)] if m), None) \
+                or _section_num(section)
+            if ref:
+                row["section"] = ref
+            out.append(row)
+
+        # Per-sheet overview, split on row boundaries
+        piece = crumb
+        for line in lines:
+            if line == title:
+                continue
+            if len(piece) + 1 + len(line) > self.max_chars and piece != crumb:
+                out.append({"page": pg["page"], "text": piece, "sheet": sheet})
+                piece = crumb + CONTINUED
+            piece += "\n" + line
+        if piece not in (crumb, crumb + CONTINUED):
+            out.append({"page": pg["page"], "text": piece, "sheet": sheet})
+        return out
+
+
+def _is_number(s: str) -> bool:
+    try:
+        float(s)
+        return True
+    except ValueError:
+        return False
+
+
+def _section_num(heading: Optional[str]) -> Optional[str]:
+    m = CLAUSE_NUM_RE.search(heading or "")
+    return m.group(1) if m else None
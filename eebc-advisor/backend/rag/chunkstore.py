@@ -0,0 +1,152 @@
+import os
+import json
+import struct
+from typing import Dict, Any, List
+
+import numpy as np
+
+MAGIC = b"EEBCCHK1"
+_ALIGN = 64
+
+# Fields stored as dedicated columns; anything else goes to a per-row JSON "extra" blob
+_COLUMNS = ("page", "text", "chunk_id", "source")
+
+
+def store_path_for(chunks_path: str) -> str:
+    return os.path.splitext(chunks_path)[0] + ".bin"
+
+
+def _strings_column(values: List[str]):
+    blobs = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(blobs), dtype=np.uint8)
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped chunk metadata.
+
+    One file: magic, u64 header length, JSON header, then 64-byte aligned
+    arrays (text/chunk_id/extra as offsets + UTF-8 blob, page as int32,
+    source as int16 codes into header["sources"]). Because the file is
+    mmapped, every gunicorn worker shares the same page-cache copy.
+
+    Behaves like a list of chunk dicts (len, indexing, iteration); each
+    access decodes a fresh dict, so callers can mutate the result freely.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a chunk store")
+            (hlen,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(hlen).decode("utf-8"))
+        self.n = header["n"]
+        self.sources = header["sources"]
+        self.fingerprint = header.get("fingerprint", "")
+        self._cols = {
+            name: np.memmap(path, dtype=spec["dtype"], mode="r", offset=spec["offset"], shape=tuple(spec["shape"]))
+            if spec["shape"][0] else np.zeros(spec["shape"], dtype=spec["dtype"])
+            for name, spec in header["columns"].items()
+        }
+
+    # ---- writing ----
+    @staticmethod
+    def write(chunks, path: str, fingerprint: str = ""):
+        sources: List[str] = []
+        source_ix: Dict[str, int] = {}
+        codes = np.full(len(chunks), -1, dtype=np.int16)
+        extras = []
+        for i, c in enumerate(chunks):
+            src = c.get("source")
+            if src is not None:
+                if src not in source_ix:
+                    source_ix[src] = len(sources)
+                    sources.append(src)
+                codes[i] = source_ix[src]
+            extra = {k: v for k, v in c.items() if k not in _COLUMNS}
+            extras.append(json.dumps(extra, ensure_ascii=False) if extra else "")
+
+        text_off, text = _strings_column([c["text"] for c in chunks])
+        id_off, ids = _strings_column([c.get("chunk_id", "") for c in chunks])
+        extra_off, extra = _strings_column(extras)
+        arrays = {
+            "page": np.array([int(c["page"]) for c in chunks], dtype=np.int32),
+            "source": codes,
+            "text_off": text_off, "text": text,
+            "id_off": id_off, "id": ids,
+            "extra_off": extra_off, "extra": extra,
+        }
+
+        # Header size depends on the offsets it contains; fix it with a generous pad
+        def header_bytes(base):
+            cols, off = {}, base
+            for name, a in arrays.items():
+                off = (off + _ALIGN - 1) // _ALIGN * _ALIGN
+                cols[name] = {"dtype": a.dtype.str, "offset": off, "shape": list(a.shape)}
+                off += a.nbytes
+            return json.dumps({"n": len(chunks), "sources": sources, "fingerprint": fingerprint,
+                               "columns": cols}).encode("utf-8")
+
+        hlen = len(header_bytes(0)) + 256
+        base = len(MAGIC) + 8 + hlen
+        header = header_bytes(base).ljust(hlen, b" ")
+
+        tmp = f"{path}.tmp.{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", hlen))
+            f.write(header)
+            for name, a in arrays.items():
+                f.write(b"\0" * (-f.tell() % _ALIGN))
+                f.write(a.tobytes())
+        os.replace(tmp, path)
+
+    # ---- columns ----
+    @property
+    def pages(self) -> np.ndarray:
+        return self._cols["page"]
+
+    @property
+    def source_codes(self) -> np.ndarray:
+        return self._cols["source"]
+
+    def _string(self, name: str, i: int) -> str:
+        off = self._cols[name + "_off"]
+        return bytes(self._cols[name][off[i]:off[i + 1]]).decode("utf-8")
+
+    def text(self, i: int) -> str:
+        return self._string("text", i)
+
+    def chunk_id(self, i: int) -> str:
+        return self._string("id", i)
+
+    # ---- list-like access ----
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        c = {"page": int(self.pages[i]), "text": self.text(i)}
+        cid = self.chunk_id(i)
+        if cid:
+            c["chunk_id"] = cid
+        code = int(self.source_codes[i])
+        if code >= 0:
+            c["source"] = self.sources[code]
+        extra = self._string("extra", i)
+        if extra:
+            c.update(json.loads(extra))
+        return c
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return list(self)
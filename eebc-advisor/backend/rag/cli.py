@@ -0,0 +1,176 @@
+"""
+Offline index maintenance.
+
+    python -m rag.cli check-index      # validate index vs embedder, no network
+    python -m rag.cli rebuild-index    # re-embed chunks.json with the current model
+    python -m rag.cli rebuild-index --from-sources   # re-extract and re-chunk sources too
+    python -m rag.cli ann-report --synthetic 200000  # ANN recall@k vs latency vs Flat
+    python -m rag.cli screen-portfolio buildings.xlsx -o results.ndjson  # bulk applicability
+
+Run from the backend directory; paths and sources come from rag/paths.py (and
+the same env vars the server reads). Nothing here loads or syncs the index
+as a side effect: check-index only reads.
+"""
+import os
+import sys
+import json
+import argparse
+
+
+def _config():
+    from rag import paths
+    return paths
+
+
+def _load_store(cfg):
+    """The saved index, read-only (no ingest, no save); None when there is none."""
+    from rag.index import VectorStore
+
+    if not (os.path.exists(cfg.FAISS_PATH) and os.path.exists(cfg.CHUNKS_PATH)):
+        return None
+    store = VectorStore()
+    store.load(cfg.FAISS_PATH, cfg.CHUNKS_PATH)
+    return store
+
+
+def cmd_check_index(args) -> int:
+    cfg = _config()
+    from rag.index import IndexMismatchError
+
+    try:
+        store = _load_store(cfg)
+    except IndexMismatchError as e:
+        print(f"MISMATCH: {e}")
+        return 1
+    if store is None:
+        print(f"No index at {cfg.FAISS_PATH}")
+        return 1
+    return 0 if store.index is not None else 1
+
+
+def cmd_rebuild_index(args) -> int:
+    cfg = _config()
+    from rag.index import VectorStore
+    from rag.manifest import IngestManifest, sync_sources
+    from rag.utils import file_lock
+
+    store = VectorStore()
+    with file_lock(cfg.LOCK_PATH):
+        if args.from_sources:
+            # Empty manifest + empty store => every source is ingested from scratch
+            if os.path.exists(cfg.MANIFEST_PATH):
+                os.remove(cfg.MANIFEST_PATH)
+            sync_sources(store, cfg.SOURCES, cfg.FAISS_PATH, cfg.CHUNKS_PATH, cfg.MANIFEST_PATH)
+            return 0
+
+        if not os.path.exists(cfg.CHUNKS_PATH):
+            print(f"No chunks at {cfg.CHUNKS_PATH}; run `rebuild-index --from-sources` to ingest the sources.")
+            return 1
+        with open(cfg.CHUNKS_PATH, "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        store.build(chunks, batch_size=args.batch_size)
+        store.save(cfg.FAISS_PATH, cfg.CHUNKS_PATH)
+
+        # Chunks are unchanged, only their vectors: move the manifest to the new model
+        manifest = IngestManifest(cfg.MANIFEST_PATH)
+        for entry in manifest.sources.values():
+            entry["model"] = store.model
+        manifest.save()
+    return 0
+
+
+def cmd_ann_report(args) -> int:
+    import numpy as np
+    from rag.ann import INDEX_TYPES, recall_latency_report, reconstruct_all
+
+    rng = np.random.default_rng(args.seed)
+    if args.synthetic:
+        # Clustered synthetic corpus: closer to real embeddings than uniform noise
+        centers = rng.standard_normal((max(1, args.synthetic // 200), args.dim)).astype("float32")
+        corpus = centers[rng.integers(0, len(centers), args.synthetic)]
+        corpus += 0.35 * rng.standard_normal(corpus.shape).astype("float32")
+    else:
+        import faiss
+        cfg = _config()
+        corpus = reconstruct_all(faiss.read_index(cfg.FAISS_PATH)).astype("float32")
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True) + 1e-12
+
+    # Queries: perturbed corpus vectors (paraphrases land near, not on, their chunk)
+    picks = rng.integers(0, len(corpus), args.queries)
+    queries = corpus[picks] + 0.05 * rng.standard_normal((args.queries, corpus.shape[1])).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12
+
+    variants = [{"type": "flat"}]
+    for t in args.types.split(","):
+        if t == "hnsw":
+            variants += [{"type": "hnsw", "ef_search": ef} for ef in (16, 64, 256)]
+        elif t in ("ivf_flat", "ivf_pq"):
+            variants += [{"type": t, "nprobe": p} for p in (1, 8, 32)]
+        elif t != "flat" and t not in INDEX_TYPES:
+            print(f"Unknown index type: {t}")
+            return 2
+
+    print(f"corpus={len(corpus)} dim={corpus.shape[1]} queries={len(queries)} k={args.k}")
+    print(f"{'variant':<28}{'type':<10}{'recall@k':>9}{'p50 ms':>9}{'p95 ms':>9}{'build s':>9}{'MB':>9}")
+    for r in recall_latency_report(corpus, queries, k=args.k, variants=variants):
+        print(f"{r['variant']:<28}{r['actual_type']:<10}{r['recall_at_k']:>9.3f}{r['p50_ms']:>9.3f}"
+              f"{r['p95_ms']:>9.3f}{r['build_s']:>9.2f}{r['mbytes']:>9.1f}")
+    return 0
+
+
+def cmd_screen_portfolio(args) -> int:
+    from rag.portfolio import read_portfolio, normalize_portfolio, screen, to_ndjson
+
+    try:
+        df = normalize_portfolio(read_portfolio(args.path))
+    except (OSError, ValueError) as e:
+        print(f"Cannot read portfolio: {e}")
+        return 2
+    try:
+        store = _load_store(_config())  # only for the scope clause citations (BM25, no network)
+    except Exception as e:
+        print(f"WARNING: no index ({e}); citing clause 2.3 without a chunk lookup.")
+        store = None
+    output = args.output or os.path.splitext(args.path)[0] + ".screened.ndjson"
+    with open(output, "w", encoding="utf-8") as out:
+        for line in to_ndjson(screen(df, store, llm=args.llm, concurrency=args.concurrency, budget_s=args.budget)):
+            out.write(line)
+    print(f"{output}: {line.strip()}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m rag.cli", description="EEBC index maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("check-index", help="validate index model/dimension offline")
+    p.set_defaults(func=cmd_check_index)
+
+    p = sub.add_parser("rebuild-index", help="re-embed the corpus with the current embedding model")
+    p.add_argument("--from-sources", action="store_true", help="re-extract and re-chunk all sources first")
+    p.add_argument("--batch-size", type=int, default=None)
+    p.set_defaults(func=cmd_rebuild_index)
+
+    p = sub.add_parser("ann-report", help="recall@k vs latency of ANN index types against exact Flat")
+    p.add_argument("--types", default="hnsw,ivf_flat,ivf_pq", help="comma-separated index types")
+    p.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of the index")
+    p.add_argument("--dim", type=int, default=1024, help="dimension of synthetic vectors")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("-k", type=int, default=10)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=cmd_ann_report)
+
+    p = sub.add_parser("screen-portfolio", help="EEBC applicability for every building in a CSV/XLSX (NDJSON out)")
+    p.add_argument("path", help="CSV or XLSX export, one building per row")
+    p.add_argument("-o", "--output", help="NDJSON file (default: <path>.screened.ndjson)")
+    p.add_argument("--llm", choices=("auto", "off"), default=None, help="intake LLM for undecided rows with notes")
+    p.add_argument("--concurrency", type=int, default=None, help="rows in the LLM at once")
+    p.add_argument("--budget", type=float, default=None, help="seconds of LLM time for the whole portfolio")
+    p.set_defaults(func=cmd_screen_portfolio)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import math
+from typing import List, Dict, Any, Optional
+
+from .lexical import tokenize
+
+# ----------------------------
+# Prompt budget for the answer model (env-tunable)
+# ----------------------------
+PROMPT_CONFIG = {
+    "source_tokens": int(os.getenv("PROMPT_SOURCE_TOKENS", "450")),   # all source excerpts together
+    "max_sources": int(os.getenv("PROMPT_MAX_SOURCES", "5")),        # after reranking
+    "rank_decay": float(os.getenv("PROMPT_RANK_DECAY", "0.15")),      # later sources need more relevant sentences
+}
+
+# Optional exact counts: PROMPT_TOKENIZER=/path/to/tokenizer.json (HF `tokenizers` format)
+_tokenizer = None
+_tokenizer_loaded = False
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _load_tokenizer():
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        path = os.getenv("PROMPT_TOKENIZER")
+        if path:
+            try:
+                from tokenizers import Tokenizer
+                _tokenizer = Tokenizer.from_file(path)
+            except Exception as e:
+                print(f"WARNING: could not load tokenizer {path} ({e}); estimating token counts.")
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """
+    Tokens in `text` for the answer model. Without PROMPT_TOKENIZER this is
+    a local estimate tuned to Llama-3-style BPE: one token per ~4 characters
+    of each word, one per punctuation mark.
+    """
+    if not text:
+        return 0
+    tok = _load_tokenizer()
+    if tok is not None:
+        return len(tok.encode(text, add_special_tokens=False).ids)
+    return sum(max(1, math.ceil(len(p) / 4)) if p[0].isalnum() or p[0] == "_" else 1
+               for p in _PIECE_RE.findall(text))
+
+
+def compact_context(ctx) -> str:
+    """The building context without null fields, as compact JSON."""
+    fields = ctx.model_dump(exclude_none=True) if ctx is not None else {}
+    return json.dumps(fields, ensure_ascii=False, separators=(", ", ": ")) if fields else "(none provided)"
+
+
+# PDF lines are hard-wrapped: re-join a line with the next when the next one
+# continues the sentence (starts lower-case).
+_WRAP_RE = re.compile(r"(?<![.:;])\n(?=[a-z(])")
+_SENT_RE = re.compile(r"(?<=[.;:])\s+(?=[A-Z(])|\n+")
+_RULE_RE = re.compile(r"\b(?:shall|must|minimum|maximum|not exceed|at least|greater|less)\b|\d", re.I)
+
+
+def split_units(text: str) -> List[str]:
+    """Sentences, list items and table rows of a chunk, in order."""
+    return [u.strip() for u in _SENT_RE.split(_WRAP_RE.sub(" ", text or "")) if u.strip()]
+
+
+def _norm(unit: str) -> str:
+    return " ".join(unit.lower().split())
+
+
+def pack_sources(query: str, retrieved: List[Dict[str, Any]], budget: Optional[int] = None,
+                 max_sources: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Fill a token budget with the most query-relevant sentences of the top
+    retrieved chunks.
+
+    Each chunk is split into sentences/rows and scored by IDF-weighted
+    overlap with the query (requirement-like sentences get a small boost,
+    lower-ranked chunks a decay). Every source first gets its best sentence
+    (plus the heading line it starts with), then the budget is filled by
+    score, no source taking more than twice its even share. Sentences
+    already taken from a higher-ranked chunk (overlapping chunk tails,
+    repeated headings) are skipped. Returns sources with the packed
+    "excerpt".
+    """
+    budget = budget or PROMPT_CONFIG["source_tokens"]
+    max_sources = max_sources or PROMPT_CONFIG["max_sources"]
+    top = retrieved[:max_sources]
+    q = set(tokenize(query))
+
+    units = []  # (source ix, unit ix, text)
+    seen = set()
+    for si, r in enumerate(top):
+        for ui, u in enumerate(split_units(r.get("text", ""))):
+            key = _norm(u)
+            if key in seen:
+                continue
+            seen.add(key)
+            units.append((si, ui, u))
+
+    toks = [set(tokenize(u)) for _, _, u in units]
+    n = max(1, len(units))
+    df: Dict[str, int] = {}
+    for ts in toks:
+        for t in ts & q:
+            df[t] = df.get(t, 0) + 1
+
+    cands = []
+    for (si, ui, u), ts in zip(units, toks):
+        score = sum(math.log(1.0 + n / df[t]) for t in ts & q)
+        if _RULE_RE.search(u):
+            score += 0.5
+        if ui == 0:
+            score += 0.25  # headings / "(continued)" labels say what the chunk is
+        cands.append({"si": si, "ui": ui, "text": u, "tokens": count_tokens(u) + 1,
+                      "score": score / (1.0 + PROMPT_CONFIG["rank_decay"] * si)})
+
+    chosen, used = set(), 0
+    per_source = [0] * len(top)
+    share = 2 * budget // max(1, len(top))
+
+    def take(c):
+        nonlocal used
+        if (c["si"], c["ui"]) in chosen or used + c["tokens"] > budget:
+            return False
+        chosen.add((c["si"], c["ui"]))
+        used += c["tokens"]
+        per_source[c["si"]] += c["tokens"]
+        return True
+
+    by_source: Dict[int, List[Dict[str, Any]]] = {}
+    for c in cands:
+        by_source.setdefault(c["si"], []).append(c)
+    # 1) one best sentence per source (with its leading heading), so every citation has substance
+    for si in sorted(by_source):
+        units_si = by_source[si]
+        head = units_si[0] if units_si[0]["ui"] == 0 else None
+        body = [c for c in units_si if c is not head] or units_si
+        best = max(body, key=lambda c: c["score"])
+        if head is not None and head is not best and head["tokens"] <= 24:
+            take(head)
+        take(best)
+    # 2) fill the rest of the budget by score
+    for c in sorted(cands, key=lambda c: c["score"], reverse=True):
+        if per_source[c["si"]] + c["tokens"] <= share:
+            take(c)
+
+    out = []
+    for si, r in enumerate(top):
+        picked = [c for c in by_source.get(si, []) if (c["si"], c["ui"]) in chosen]
+        if not picked:
+            continue
+        parts, prev = [], None
+        for c in picked:  # document order
+            if prev is not None and c["ui"] != prev + 1:
+                parts.append("…")
+            parts.append(c["text"])
+            prev = c["ui"]
+        src = {
+            "page": r["page"],
+            "chunk_id": r["chunk_id"],
+            "score": r.get("score", 0.0),
+            "excerpt": " ".join(parts),
+        }
+        if r.get("sheet"):
+            src["sheet"] = r["sheet"]
+        out.append(src)
+    return out
+
+
+def source_label(s: Dict[str, Any]) -> str:
+    """How a source is cited: PDF page, or Excel form sheet (whose "page" is only a sheet number)."""
+    return f"Form '{s['sheet']}'" if s.get("sheet") else f"p.{s['page']}"
@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from .utils import file_lock
+from .metrics import register_collector, cache_families
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "embed_cache")
+
+
+def text_key(text: str) -> str:
+    """Content address of a text. Whitespace is collapsed so trivially different
+    variants of the same question share one entry."""
+    norm = re.sub(r"\s+", " ", text or "").strip()
+    return hashlib.sha256(norm.encode("utf-8")).hexdigest()
+
+
+TAG_BYTES = 16
+
+
+def key_tag(key: str) -> np.ndarray:
+    """Row tag of a text key: the first 16 bytes of its sha256."""
+    return np.frombuffer(bytes.fromhex(key[:2 * TAG_BYTES]), dtype=np.uint8)
+
+
+class _ModelShelf:
+    """
+    On-disk store for one embedding model.
+
+    Files (per model):
+      <model>.f32   float32 rows, memory-mapped, grown in place up to `capacity`
+      <model>.tags  16-byte key prefix of each row, memory-mapped alongside
+      <model>.keys  append-only log of "<row> <sha256>" lines
+      <model>.json  {"dim": ..., "capacity": ...}
+
+    Rows are used as a ring buffer: once `capacity` is reached the oldest rows
+    are overwritten, so the file never grows past capacity * dim * 4 bytes.
+    Writers take a file lock and replay the log tail first, which keeps several
+    gunicorn workers consistent with each other. Readers only replay the log
+    on a miss, so a row another worker has reused since is caught by its tag:
+    get() checks it on every read and treats a mismatch as a miss.
+    """
+
+    def __init__(self, cache_dir: str, model: str, capacity: int):
+        safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+        self.vec_path = os.path.join(cache_dir, safe + ".f32")
+        self.tag_path = os.path.join(cache_dir, safe + ".tags")
+        self.log_path = os.path.join(cache_dir, safe + ".keys")
+        self.meta_path = os.path.join(cache_dir, safe + ".json")
+        self.lock_path = os.path.join(cache_dir, safe + ".lock")
+        self.capacity = capacity
+        self.dim = None
+        self.rows = {}        # sha256 -> row
+        self.owner = {}       # row -> sha256
+        self.cursor = 0       # next row to write
+        self._log_offset = 0
+        self._log_id = None   # (st_dev, st_ino) of the log read up to _log_offset
+        self._mm = None
+        self._tags = None
+
+        self.refresh()
+
+    def _read_meta(self):
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim = int(meta["dim"])
+            self.capacity = int(meta.get("capacity", self.capacity))
+
+    # ---- log replay ----
+    def refresh(self):
+        self._read_meta()  # another worker may have created the shelf since we opened it
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if (st.st_dev, st.st_ino) != self._log_id or st.st_size < self._log_offset:
+            # Another process compacted (replaced) the log: our offset points into
+            # a different file, so forget what we knew and replay it from the start
+            self.rows, self.owner, self.cursor = {}, {}, 0
+            self._log_offset = 0
+            self._log_id = (st.st_dev, st.st_ino)
+        if st.st_size == self._log_offset:
+            return
+        with open(self.log_path, "r", encoding="ascii", errors="replace") as f:
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # partial line from a concurrent writer; re-read next time
+                self._log_offset += len(line)
+                parts = line.split()
+                if len(parts) != 2 or not parts[0].isdigit() or int(parts[0]) >= self.capacity:
+                    print(f"WARNING: skipping malformed embedding cache log line in {self.log_path}")
+                    continue
+                self._assign(int(parts[0]), parts[1])
+
+    def _assign(self, row: int, key: str):
+        prev = self.owner.get(row)
+        if prev is not None and self.rows.get(prev) == row:
+            del self.rows[prev]
+        self.rows[key] = row
+        self.owner[row] = key
+        self.cursor = (row + 1) % self.capacity
+
+    # ---- vector and tag files ----
+    def _mapped_rows(self) -> int:
+        return 0 if self._mm is None else self._mm.shape[0]
+
+    def _map(self, min_rows: int, grow: bool):
+        vec_size = os.path.getsize(self.vec_path) if os.path.exists(self.vec_path) else 0
+        tag_size = os.path.getsize(self.tag_path) if os.path.exists(self.tag_path) else 0
+        vec_rows, tag_rows = vec_size // (self.dim * 4), tag_size // TAG_BYTES
+        if grow and min(vec_rows, tag_rows) < min_rows:
+            # a cache written before tags existed has no .tags file: zero tags never match
+            new_rows = max(vec_rows, min(self.capacity, max(min_rows, 2 * vec_rows, 1024)))
+            for path, row_bytes, rows in ((self.vec_path, self.dim * 4, vec_rows), (self.tag_path, TAG_BYTES, tag_rows)):
+                if rows < new_rows:
+                    with open(path, "ab") as f:
+                        f.truncate(new_rows * row_bytes)
+            vec_rows = tag_rows = new_rows
+        rows_on_disk = min(vec_rows, tag_rows)
+        if rows_on_disk == 0:
+            self._mm = self._tags = None
+            return
+        self._mm = np.memmap(self.vec_path, dtype=np.float32, mode="r+", shape=(rows_on_disk, self.dim))
+        self._tags = np.memmap(self.tag_path, dtype=np.uint8, mode="r+", shape=(rows_on_disk, TAG_BYTES))
+
+    def _stale(self, key: str, row: int):
+        """`row` was reused for another key by another process: forget it and catch up on the log."""
+        if self.rows.get(key) == row:
+            del self.rows[key]
+        if self.owner.get(row) == key:
+            del self.owner[row]
+        self.refresh()
+
+    def get(self, key: str):
+        row = self.rows.get(key)
+        if row is None or self.dim is None:
+            return None
+        if row >= self._mapped_rows():
+            self._map(row + 1, grow=False)
+            if row >= self._mapped_rows():
+                self._stale(key, row)
+                return None
+        tag = key_tag(key)
+        if not np.array_equal(self._tags[row], tag):
+            self._stale(key, row)
+            return None
+        vec = np.array(self._mm[row])
+        if not np.array_equal(self._tags[row], tag):  # overwritten while we copied
+            self._stale(key, row)
+            return None
+        return vec
+
+    def put_many(self, keys, vecs: np.ndarray):
+        with file_lock(self.lock_path):
+            self.refresh()
+            if self.dim is None:
+                self.dim = int(vecs.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim, "capacity": self.capacity}, f)
+            if vecs.shape[1] != self.dim:
+                return
+
+            written = []
+            for key, vec in zip(keys, vecs):
+                if key in self.rows:
+                    continue
+                row = self.cursor
+                if row >= self._mapped_rows():
+                    self._map(row + 1, grow=True)
+                self._tags[row] = 0   # invalid while the vector is half-written
+                self._mm[row] = vec
+                self._tags[row] = key_tag(key)
+                written.append((row, key))
+                self._assign(row, key)
+            if not written:
+                return
+            self._mm.flush()
+            self._tags.flush()
+
+            with open(self.log_path, "a", encoding="ascii") as f:
+                f.write("".join(f"{row} {key}\n" for row, key in written))
+            st = os.stat(self.log_path)
+            self._log_id, self._log_offset = (st.st_dev, st.st_ino), st.st_size
+
+            # Keep the log from growing without bound once the ring wraps
+            if self._log_offset > 64 * 4 * max(self.capacity, 1024):
+                self._compact()
+
+    def _compact(self):
+        tmp = self.log_path + ".tmp"
+        with open(tmp, "w", encoding="ascii") as f:
+            for row in sorted(self.owner, key=lambda r: (r - self.cursor) % self.capacity):
+                f.write(f"{row} {self.owner[row]}\n")
+        os.replace(tmp, self.log_path)
+        st = os.stat(self.log_path)
+        self._log_id, self._log_offset = (st.st_dev, st.st_ino), st.st_size
+
+
+_caches = weakref.WeakSet()
+
+
+@register_collector
+def _cache_metrics():
+    caches = list(_caches)
+    return cache_families("embedding", sum(c.hits for c in caches), sum(c.misses for c in caches))
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (model, sha256(text)).
+
+    A small in-memory LRU sits in front of a memory-mapped float32 store per
+    model, so repeated texts never reach the embedding API twice.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: int = 50000, memory_items: int = 2048):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory_items = memory_items
+        self._lru = OrderedDict()
+        self._shelves = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        _caches.add(self)
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from EMBED_CACHE* env vars; returns None when disabled."""
+        if os.getenv("EMBED_CACHE", "true").lower() in ("0", "false", "no", "off"):
+            return None
+        return cls(
+            cache_dir=os.getenv("EMBED_CACHE_DIR", DEFAULT_CACHE_DIR),
+            max_entries=int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "50000")),
+            memory_items=int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "2048")),
+        )
+
+    def _shelf(self, model: str) -> _ModelShelf:
+        shelf = self._shelves.get(model)
+        if shelf is None:
+            shelf = _ModelShelf(self.cache_dir, model, self.max_entries)
+            self._shelves[model] = shelf
+        return shelf
+
+    def _remember(self, mkey, vec):
+        self._lru[mkey] = vec
+        self._lru.move_to_end(mkey)
+        while len(self._lru) > self.memory_items:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model: str, keys):
+        """Return a list aligned with `keys`: cached vector or None."""
+        out = []
+        with self._lock:
+            shelf = self._shelf(model)
+            refreshed = False
+            for key in keys:
+                mkey = (model, key)
+                vec = self._lru.get(mkey)
+                if vec is not None:
+                    self._lru.move_to_end(mkey)
+                else:
+                    if key not in shelf.rows and not refreshed:
+                        # another worker may have written it since we last looked
+                        shelf.refresh()
+                        refreshed = True
+                    vec = shelf.get(key)
+                    if vec is not None:
+                        self._remember(mkey, vec)
+                if vec is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                out.append(vec)
+        return out
+
+    def put_many(self, model: str, keys, vecs: np.ndarray):
+        vecs = np.asarray(vecs, dtype=np.float32)
+        with self._lock:
+            for key, vec in zip(keys, vecs):
+                self._remember((model, key), vec.copy())
+            try:
+                self._shelf(model).put_many(keys, vecs)
+            except OSError as e:
+                # Cache is an optimisation only: a read-only disk must not break embedding
+                print(f"WARNING: embedding cache write failed: {e}")
@@ -1,23 +1,101 @@
+import os
+import re
+import copy
+import asyncio
+import zlib
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
+from .embed_cache import text_key
+from .lexical import tokenize
+from .net import SingleFlight, policy, shared_aiohttp_session, shared_requests_session, submit
+from .utils import reset_after_fork
+from .metrics import traced, EMBED_BATCH
 
-class VoyageEmbedder:
-    """Wrapper for Voyage AI embeddings API"""
+# Output dimension per embedding model, so index compatibility can be checked
+# without a network round trip.
+MODEL_DIMS = {
+    "voyage-3": 1024,
+    "voyage-3-large": 1024,
+    "voyage-3-lite": 512,
+    "voyage-3.5": 1024,
+    "voyage-3.5-lite": 1024,
+    "voyage-code-3": 1024,
+    "voyage-finance-2": 1024,
+    "voyage-law-2": 1024,
+    "voyage-multilingual-2": 1024,
+    "voyage-large-2": 1536,
+    "voyage-2": 1024,
+    # local sentence-transformers models
+    "all-MiniLM-L6-v2": 384,
+    "all-MiniLM-L12-v2": 384,
+    "paraphrase-MiniLM-L3-v2": 384,
+    "BAAI/bge-small-en-v1.5": 384,
+    "all-mpnet-base-v2": 768,
+}
 
-    def __init__(self, client, model="voyage-3"):
-        """
-        Initialize Voyage AI embedder with a pre-initialized client
+# EMBEDDER backend -> default model
+DEFAULT_MODELS = {
+    "voyage": "voyage-3",
+    "local": "all-MiniLM-L6-v2",
+    "hashing": "hashing-384",
+}
 
-        Args:
-            client: voyageai.Client instance
-            model: Voyage model name (default: voyage-3)
-        """
-        self.client = client
+
+def model_dim(model: str):
+    """Known output dimension of `model`, or None if it isn't in MODEL_DIMS."""
+    m = re.fullmatch(r"hashing-(\d+)", model or "")
+    if m:
+        return int(m.group(1))
+    return MODEL_DIMS.get(model)
+
+
+def _l2_normalize(embeddings: np.ndarray) -> np.ndarray:
+    # normalize for cosine similarity with IndexFlatIP
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+    return embeddings / norms
+
+
+class BaseEmbedder:
+    """
+    Embedder interface: encode(texts) -> normalized float32 array (n, dim),
+    and aencode(texts) for the same on an event loop.
+
+    Subclasses implement _embed(batch), and _aembed(batch) if they have a
+    native async client. The base class handles the embedding
+    cache, splitting into batches, (optionally) encoding batches on a
+    thread pool, and coalescing identical batches that are in flight at the
+    same time (e.g. the same question arriving on several threads).
+    """
+
+    def __init__(self, model: str, cache=None, batch_size: int = 64, workers: int = 1):
         self.model = model
+        self.cache = cache
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self._pool = None
+        self._inflight = SingleFlight()
+        reset_after_fork(self, lambda e: e._after_fork())
+
+    def _after_fork(self):
+        # Threads don't survive fork: a pool created in a --preload master is dead in the workers
+        self._pool = None
+        self._inflight = SingleFlight()
 
+    @property
+    def dim(self):
+        return model_dim(self.model)
+
+    def warmup(self):
+        """One uncached call: loads a local model, or opens the pooled connection to the API."""
+        self._embed(["warmup"])
+
+    @traced("embed")
     def encode(self, texts):
         """
-        Encode texts to embeddings using Voyage API
+        Encode texts to embeddings, only computing cache misses
 
         Args:
             texts: List of text strings to embed
@@ -25,9 +103,148 @@ class VoyageEmbedder:
         Returns:
             numpy array of normalized embeddings with shape (len(texts), embedding_dim)
         """
-        # texts is a list[str]
-        result = self.client.embed(texts, model=self.model)
+        if self.cache is None or not texts:
+            return self._embed_batched(texts)
+
+        keys = [text_key(t) for t in texts]
+        found = self.cache.get_many(self.model, keys)
+        miss_pos = _misses(keys, found)
+        if miss_pos:
+            miss_keys = list(miss_pos)
+            fresh = self._embed_batched([texts[miss_pos[k]] for k in miss_keys])
+            self.cache.put_many(self.model, miss_keys, fresh)
+            found = _fill(keys, found, miss_keys, fresh)
+
+        return np.vstack(found).astype(np.float32)
+
+    @traced("embed")
+    async def aencode(self, texts):
+        """
+        encode() for the event loop: API calls are awaited rather than
+        holding a worker thread; cache I/O and local models run in threads.
+        """
+        texts = list(texts)
+        if self.cache is None or not texts:
+            return await self._aembed_batched(texts)
+
+        keys = [text_key(t) for t in texts]
+        found = await asyncio.to_thread(self.cache.get_many, self.model, keys)
+        miss_pos = _misses(keys, found)
+        if miss_pos:
+            miss_keys = list(miss_pos)
+            fresh = await self._aembed_batched([texts[miss_pos[k]] for k in miss_keys])
+            await asyncio.to_thread(self.cache.put_many, self.model, miss_keys, fresh)
+            found = _fill(keys, found, miss_keys, fresh)
+
+        return np.vstack(found).astype(np.float32)
+
+    def _embed_batched(self, texts):
+        texts = list(texts)
+        if len(texts) <= self.batch_size:
+            return self._embed_once(texts)
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        print(f"  Encoding {len(texts)} texts in {len(batches)} batches ({self.workers} worker(s))...")
+        if self.workers == 1:
+            parts = [self._embed_once(b) for b in batches]
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embed")
+            parts = [f.result() for f in [submit(self._pool, self._embed_once, b) for b in batches]]
+        return np.vstack(parts).astype(np.float32)
+
+    def _embed_once(self, texts):
+        key = hashlib.sha1("\0".join([self.model] + [text_key(t) for t in texts]).encode("utf-8")).digest()
+        EMBED_BATCH.observe(len(texts), model=self.model)
+        return self._inflight.do(key, lambda: self._embed(texts))
+
+    def _embed(self, texts):
+        raise NotImplementedError
+
+    async def _aembed_batched(self, texts):
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)] or [[]]
+        for b in batches:
+            EMBED_BATCH.observe(len(b), model=self.model)
+        parts = await asyncio.gather(*(self._aembed(b) for b in batches))
+        return np.vstack(parts).astype(np.float32)
+
+    async def _aembed(self, texts):
+        # Local models are CPU work: a worker thread is the right place for them
+        return await asyncio.to_thread(self._embed, texts)
+
+
+def _misses(keys, found):
+    # Unique misses only, in first-seen order: key -> first position
+    miss_pos = {}
+    for i, (k, v) in enumerate(zip(keys, found)):
+        if v is None and k not in miss_pos:
+            miss_pos[k] = i
+    return miss_pos
+
+
+def _fill(keys, found, miss_keys, fresh):
+    by_key = dict(zip(miss_keys, fresh))
+    return [v if v is not None else by_key[k] for k, v in zip(keys, found)]
+
+
+class VoyageEmbedder(BaseEmbedder):
+    """Wrapper for Voyage AI embeddings API"""
+
+    def __init__(self, client, model="voyage-3", cache=None, batch_size: int = 64, workers: int = 1,
+                 aclient=None):
+        """
+        Initialize Voyage AI embedder with a pre-initialized client
+
+        Args:
+            client: voyageai.Client instance
+            model: Voyage model name (default: voyage-3)
+            cache: optional EmbeddingCache checked before calling the API
+            aclient: optional voyageai.AsyncClient for aencode(); without it
+                aencode() runs the sync client in a worker thread
+        """
+        super().__init__(model, cache=cache, batch_size=batch_size, workers=workers)
+        self.client = client
+        self.aclient = aclient
+
+    def _after_fork(self):
+        super()._after_fork()
+        import voyageai
+        voyageai.requestssession = shared_requests_session()
 
+    @staticmethod
+    def _with_timeout(client, timeout):
+        # voyageai fixes the timeout per client; a shallow copy with another timeout costs no I/O
+        params = getattr(client, "_params", None)
+        if params is None or params.get("request_timeout") == timeout:
+            return client
+        client = copy.copy(client)
+        client._params = dict(params, request_timeout=timeout)
+        return client
+
+    def _client_for(self, timeout):
+        return self._with_timeout(self.client, timeout)
+
+    def _embed(self, texts):
+        # texts is a list[str]; limits, retries and deadline come from the "voyage" policy
+        result = policy("voyage").call(lambda timeout: self._client_for(timeout).embed(texts, model=self.model))
+        return self._vectors(result)
+
+    async def _aembed(self, texts):
+        if self.aclient is None:
+            return await super()._aembed(texts)
+        import voyageai
+
+        # The SDK reads its aiohttp session from a contextvar; scope ours to this call
+        token = voyageai.aiosession.set(shared_aiohttp_session())
+        try:
+            result = await policy("voyage").acall(
+                lambda timeout: self._with_timeout(self.aclient, timeout).embed(texts, model=self.model))
+        finally:
+            voyageai.aiosession.reset(token)
+        return self._vectors(result)
+
+    @staticmethod
+    def _vectors(result):
         # Extract embeddings from result
         # Voyage SDK returns result.embeddings as a list of embeddings
         if hasattr(result, 'embeddings'):
@@ -39,12 +256,93 @@ class VoyageEmbedder:
         if vecs and hasattr(vecs[0], 'embedding'):
             vecs = [item.embedding for item in vecs]
 
-        embeddings = np.array(vecs, dtype=np.float32)
+        return _l2_normalize(np.array(vecs, dtype=np.float32))
+
+
+class SentenceTransformerEmbedder(BaseEmbedder):
+    """Local CPU embeddings via sentence-transformers (optional dependency)."""
+
+    def __init__(self, model="all-MiniLM-L6-v2", cache=None, batch_size: int = 64, workers: int = 1):
+        super().__init__(model, cache=cache, batch_size=batch_size, workers=workers)
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDER=local needs the sentence-transformers package "
+                "(pip install sentence-transformers)."
+            ) from e
+        self._model = SentenceTransformer(model, device="cpu")
+
+    def _embed(self, texts):
+        vecs = self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                  normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vecs, dtype=np.float32)
+
+
+class HashingEmbedder(BaseEmbedder):
+    """
+    Dependency-free, deterministic local embedder: signed feature hashing of
+    word unigrams and bigrams with sublinear term frequency. Model name is
+    "hashing-<dim>". Much weaker than a neural model, but needs no network,
+    no model download and no fitting, which makes it suitable for offline
+    tests and benchmarks.
+    """
+
+    def __init__(self, model="hashing-384", cache=None, batch_size: int = 256, workers: int = 1):
+        super().__init__(model, cache=cache, batch_size=batch_size, workers=workers)
+        if model_dim(model) is None:
+            raise ValueError(f"Hashing embedder model must look like 'hashing-<dim>', got '{model}'")
+
+    def _vector(self, text: str) -> np.ndarray:
+        dim = self.dim
+        toks = tokenize(text)
+        feats = toks + [a + " " + b for a, b in zip(toks, toks[1:])]
+        if not feats:
+            return np.zeros(dim, dtype=np.float32)
+        h = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feats), dtype=np.uint64, count=len(feats))
+        idx = (h % dim).astype(np.int64)
+        sign = np.where((h >> np.uint64(31)) & np.uint64(1), -1.0, 1.0)
+        v = np.bincount(idx, weights=sign, minlength=dim)
+        return (np.sign(v) * np.log1p(np.abs(v))).astype(np.float32)
+
+    def _embed(self, texts):
+        return _l2_normalize(np.vstack([self._vector(t) for t in texts]))
+
+
+def resolve_backend(backend: str = None, model: str = None):
+    """(backend, model) from arguments, falling back to EMBEDDER / EMBED_MODEL env vars."""
+    backend = (backend or os.getenv("EMBEDDER", "voyage")).lower()
+    if backend not in DEFAULT_MODELS:
+        raise ValueError(f"Unknown EMBEDDER '{backend}' (expected one of {sorted(DEFAULT_MODELS)})")
+    return backend, model or os.getenv("EMBED_MODEL") or DEFAULT_MODELS[backend]
 
-        # normalize for cosine similarity with IndexFlatIP
-        norms = np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
-        embeddings = embeddings / norms
 
-        return embeddings
+def make_embedder(backend: str = None, model: str = None, cache=None):
+    """
+    Build the embedder selected by EMBEDDER (voyage | local | hashing) and
+    EMBED_MODEL. EMBED_WORKERS > 1 encodes batches on a thread pool.
+    """
+    backend, model = resolve_backend(backend, model)
+    workers = int(os.getenv("EMBED_WORKERS", "1"))
 
+    if backend == "voyage":
+        import voyageai
 
+        api_key = os.getenv("VOYAGE_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "VOYAGE_API_KEY environment variable not set. "
+                "Please set it (or choose EMBEDDER=local / EMBEDDER=hashing)."
+            )
+        # One pooled keep-alive session for all threads; retries are handled by rag.net
+        voyageai.requestssession = shared_requests_session()
+        # VOYAGE_BASE_URL points the SDK elsewhere (e.g. the offline fake in bench.fakes)
+        client_args = dict(api_key=api_key, max_retries=0, timeout=policy("voyage").timeout,
+                           base_url=os.getenv("VOYAGE_BASE_URL") or None)
+        # The async client serves query embeddings on the ASGI event loop
+        return VoyageEmbedder(client=voyageai.Client(**client_args), model=model, cache=cache,
+                              workers=workers, aclient=voyageai.AsyncClient(**client_args))
+    if backend == "local":
+        return SentenceTransformerEmbedder(model=model, cache=cache, workers=workers)
+    # Hashing is cheaper than a cache lookup; no point persisting its vectors
+    return HashingEmbedder(model=model, workers=workers)
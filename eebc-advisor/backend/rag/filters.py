@@ -0,0 +1,124 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+
+import numpy as np
+import faiss
+
+from .chunker import section_tags
+
+# ----------------------------
+# Metadata filters for search
+#   where = {"source":  "excel_forms" | ["eebc_pdf", ...],
+#            "pages":   (first, last),              # inclusive
+#            "section": "6" | ["5", "9.3"]}         # clause prefixes: "6" matches 6, 6.3, 6.3.2.1
+# Keys are ANDed, list values ORed. Dense search passes the allowed ids to
+# FAISS as an ID selector (the flat index skips the rest); BM25 masks them.
+# ----------------------------
+WHERE_KEYS = ("source", "pages", "section")
+
+FILTER_CONFIG = {
+    # HNSW/IVF lose recall under a tight filter: below this many allowed
+    # chunks, score them exactly from their stored vectors instead
+    "exact_max": int(os.getenv("FILTER_EXACT_MAX", "4096")),
+    "cache_size": int(os.getenv("FILTER_CACHE_SIZE", "64")),
+}
+
+
+def _as_list(v) -> List[str]:
+    return [str(x) for x in (v if isinstance(v, (list, tuple, set)) else [v])]
+
+
+def where_key(where: Optional[Dict[str, Any]]) -> Optional[Tuple]:
+    """Normalized, hashable form of a filter; None when it filters nothing."""
+    if not where:
+        return None
+    unknown = set(where) - set(WHERE_KEYS)
+    if unknown:
+        raise ValueError(f"unknown search filter(s): {sorted(unknown)}")
+    key = []
+    if where.get("source"):
+        key.append(("source", tuple(sorted(_as_list(where["source"])))))
+    if where.get("pages"):
+        first, last = where["pages"]
+        key.append(("pages", (int(first), int(last))))
+    if where.get("section"):
+        key.append(("section", tuple(sorted(s.strip().rstrip(".") for s in _as_list(where["section"])))))
+    return tuple(key) or None
+
+
+class ChunkMeta:
+    """Source, page and section tags of every chunk, as columns (built once per chunk set)."""
+
+    def __init__(self, chunks, default_source: str):
+        n = len(chunks)
+        if hasattr(chunks, "source_codes"):
+            # ChunkStore: page and source are mmapped columns already
+            names = np.array([*chunks.sources, default_source])  # code -1 -> default_source
+            self.source = names[chunks.source_codes]
+            self.page = np.asarray(chunks.pages)
+        else:
+            self.source = np.array([c.get("source") or default_source for c in chunks], dtype=object)
+            self.page = np.array([int(c["page"]) for c in chunks], dtype=np.int32)
+        self.sections = [tuple(section_tags(chunks[i])) for i in range(n)]
+
+    def mask(self, key: Tuple) -> np.ndarray:
+        m = np.ones(len(self.sections), dtype=bool)
+        for name, value in key:
+            if name == "source":
+                m &= np.isin(self.source, list(value))
+            elif name == "pages":
+                m &= (self.page >= value[0]) & (self.page <= value[1])
+            elif name == "section":
+                prefixes = tuple(p + "." for p in value)
+                m &= np.array([any(t in value or t.startswith(prefixes) for t in tags) for tags in self.sections],
+                              dtype=bool)
+        return m
+
+
+class Selection:
+    """The chunks a filter allows: positions, a mask (BM25) and a FAISS ID selector (dense)."""
+
+    def __init__(self, mask: np.ndarray):
+        self.mask = mask
+        self.ids = np.flatnonzero(mask).astype("int64")
+        self._bits = np.packbits(mask, bitorder="little")  # must outlive the selector
+        self.selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(self._bits)) if len(self.ids) else None
+        self._vecs = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def vectors(self, index) -> np.ndarray:
+        """Stored vectors of the allowed chunks (exact scoring of small selections)."""
+        if self._vecs is None:
+            from .ann import reconstruct_ids
+            with self._lock:
+                if self._vecs is None:
+                    self._vecs = reconstruct_ids(index, self.ids)
+        return self._vecs
+
+
+class FilterCache:
+    """ChunkMeta plus the last few Selections, for one chunk set (keyed by its fingerprint)."""
+
+    def __init__(self, fingerprint: str, meta: ChunkMeta):
+        self.fingerprint = fingerprint
+        self.meta = meta
+        self._selections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def selection(self, key: Tuple) -> Selection:
+        with self._lock:
+            sel = self._selections.get(key)
+            if sel is not None:
+                self._selections.move_to_end(key)
+                return sel
+        sel = Selection(self.meta.mask(key))
+        with self._lock:
+            self._selections[key] = sel
+            while len(self._selections) > FILTER_CONFIG["cache_size"]:
+                self._selections.popitem(last=False)
+        return sel
@@ -1,135 +1,416 @@
 import json
 import os
+import threading
 import numpy as np
 import faiss
-import voyageai
-from .embedder import VoyageEmbedder
+from typing import Dict, Any
+from .embedder import make_embedder, resolve_backend, model_dim
+from .embed_cache import EmbeddingCache
+from .ann import build_index, index_type_of, apply_search_params, reconstruct_all, reconstruct_ids, filtered_search_params
+from .filters import ChunkMeta, FilterCache, where_key, FILTER_CONFIG
+from .lexical import BM25Index, is_clause_lookup, rrf, chunks_fingerprint
+from .chunkstore import ChunkStore, store_path_for
+from .metrics import traced, stage
+
+# dense | hybrid (dense + BM25 fused with RRF) | lexical
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+
+# Map index vectors read-only instead of copying them into each worker's heap
+INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() in ("1", "true", "yes")
+
+# Chunks indexed before sources were tagged all came from the EEBC PDF
+DEFAULT_SOURCE = "eebc_pdf"
+
+def chunk_source(c) -> str:
+    return c.get("source") or DEFAULT_SOURCE
+
+class IndexMismatchError(RuntimeError):
+    """The index on disk was built with a different embedding model/dimension."""
+
+def meta_path_for(faiss_path: str) -> str:
+    return os.path.splitext(faiss_path)[0] + ".meta.json"
+
+def bm25_path_for(faiss_path: str) -> str:
+    return os.path.splitext(faiss_path)[0] + ".bm25.npz"
 
 def _normalize(v: np.ndarray) -> np.ndarray:
     n = np.linalg.norm(v, axis=1, keepdims=True) + 1e-12
     return v / n
 
 class VectorStore:
-    def __init__(self, model: str = "voyage-3"):
-        self.model = model
+    def __init__(self, model: str = None, backend: str = None, retrieval_mode: str = RETRIEVAL_MODE):
+        # Embedding backend/model: EMBEDDER=voyage|local|hashing, EMBED_MODEL=<name>
+        self.backend, self.model = resolve_backend(backend, model)
+        self.retrieval_mode = retrieval_mode
         self._embedder = None
         self.index = None
+        # list of dicts while building/mutating; a read-only mmapped ChunkStore after load()
         self.chunks = []
-        self.embs = None
+        self._faiss_path = None
+        self._mmapped = False
+        self._lexical = None
+        self._lexical_lock = threading.Lock()
+        self._positions = None  # (chunks fingerprint, {chunk_id: position}), built on first use
+        self._filters = None    # FilterCache of the current chunks, built on the first filtered search
+        self._fingerprint = None  # chunks_fingerprint of the current chunks, computed on first use
+        # Content-addressed cache shared by build/append/search (None when EMBED_CACHE=off)
+        self.embed_cache = EmbeddingCache.from_env()
 
-        # Initialize Voyage client once
-        api_key = os.getenv("VOYAGE_API_KEY")
-        if not api_key:
+        # Fail fast on a missing key rather than on the first query
+        if self.backend == "voyage" and not os.getenv("VOYAGE_API_KEY"):
             raise ValueError(
                 "VOYAGE_API_KEY environment variable not set. "
-                "Please set it before initializing VectorStore."
+                "Please set it before initializing VectorStore (or use EMBEDDER=local / EMBEDDER=hashing)."
             )
-        self.client = voyageai.Client(api_key=api_key)
-        print(f"Initialized Voyage client with model: {self.model}")
+        print(f"Vector store using {self.backend} embeddings with model: {self.model}")
 
     @property
     def embedder(self):
-        """Lazy-load Voyage embedder on first access"""
+        """Lazy-load the embedder on first access"""
         if self._embedder is None:
-            print(f"Loading Voyage embedder: {self.model}")
-            self._embedder = VoyageEmbedder(client=self.client, model=self.model)
+            print(f"Loading {self.backend} embedder: {self.model}")
+            self._embedder = make_embedder(self.backend, self.model, cache=self.embed_cache)
         return self._embedder
 
-    def build(self, chunks, batch_size=64):
+    def build(self, chunks, batch_size=None):
         self.chunks = chunks
+        self._lexical = None
+        self._filters = None
+        self._fingerprint = None
         texts = [c["text"] for c in chunks]
         print(f"Building embeddings for {len(texts)} chunks...")
 
-        # Voyage API handles large batches efficiently, but we can chunk if needed
-        embs = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i+batch_size]
-            print(f"  Encoding batch {i//batch_size + 1}/{(len(texts) + batch_size - 1)//batch_size}...")
-            batch_embs = self.embedder.encode(batch)
-            embs.append(batch_embs)
-
-        embs = np.vstack(embs).astype("float32")
-        # Already normalized by VoyageEmbedder, but normalize again to be safe
+        # The embedder splits into batches (thread-pooled with EMBED_WORKERS > 1)
+        if batch_size:
+            self.embedder.batch_size = batch_size
+        embs = self.embedder.encode(texts).astype("float32")
+        # Already normalized by the embedder, but normalize again to be safe
         embs = _normalize(embs)
 
         dim = embs.shape[1]
-        self.index = faiss.IndexFlatIP(dim)
-        self.index.add(embs)
-        self.embs = embs
-        print(f"Built FAISS index with {len(embs)} embeddings of dimension {dim}")
+        # INDEX_TYPE=flat|hnsw|ivf_flat|ivf_pq (see rag/ann.py)
+        self.index = build_index(embs)
+        self._mmapped = False
+        print(f"Built FAISS {index_type_of(self.index)} index with {len(embs)} embeddings of dimension {dim}")
 
     def save(self, faiss_path: str, chunks_path: str):
-        faiss.write_index(self.index, faiss_path)
-        with open(chunks_path, "w", encoding="utf-8") as f:
-            json.dump(self.chunks, f, ensure_ascii=False)
+        # Write to temp files and rename so concurrent readers never see a partial file
+        tmp_faiss = f"{faiss_path}.tmp.{os.getpid()}"
+        tmp_chunks = f"{chunks_path}.tmp.{os.getpid()}"
+        meta_path = meta_path_for(faiss_path)
+        tmp_meta = f"{meta_path}.tmp.{os.getpid()}"
+        faiss.write_index(self.index, tmp_faiss)
+        with open(tmp_chunks, "w", encoding="utf-8") as f:
+            json.dump(list(self.chunks), f, ensure_ascii=False)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({
+                "embedder": self.backend,
+                "model": self.model,
+                "dim": int(self.index.d),
+                "ntotal": int(self.index.ntotal),
+                "index_type": index_type_of(self.index),
+            }, f, indent=2)
+        os.replace(tmp_faiss, faiss_path)
+        os.replace(tmp_chunks, chunks_path)
+        os.replace(tmp_meta, meta_path)
+        # Binary, mmappable copy of chunks.json that load() prefers
+        ChunkStore.write(self.chunks, store_path_for(chunks_path), fingerprint=self.fingerprint)
+        self.lexical.save(bm25_path_for(faiss_path))
         print(f"Saved FAISS index to {faiss_path} and chunks to {chunks_path}")
 
+    def _read_index(self, faiss_path: str):
+        self._faiss_path = faiss_path
+        self._mmapped = False
+        # IO_FLAG_MMAP_IFC is missing from older faiss builds (faiss-cpu is not pinned)
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+        if INDEX_MMAP and mmap_flag is None:
+            print("WARNING: this faiss build cannot mmap indexes; reading into memory.")
+        elif INDEX_MMAP:
+            try:
+                index = faiss.read_index(faiss_path, mmap_flag)
+                self._mmapped = True
+                return index
+            except RuntimeError as e:
+                print(f"WARNING: mmap load of {faiss_path} failed ({e}); reading into memory.")
+        return faiss.read_index(faiss_path)
+
+    def _ensure_writable(self):
+        """Mmapped indexes and ChunkStores are read-only: copy them into memory before mutating."""
+        if self._mmapped:
+            self.index = faiss.read_index(self._faiss_path)
+            apply_search_params(self.index)
+            self._mmapped = False
+        if not isinstance(self.chunks, list):
+            self.chunks = self.chunks.to_list()
+
+    def check_compatible(self, faiss_path: str):
+        """
+        Validate the loaded index against index metadata and the static
+        model-dimension table. No network I/O; raises IndexMismatchError.
+        """
+        meta = {}
+        meta_path = meta_path_for(faiss_path)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+
+        problems = []
+        if meta.get("model") and meta["model"] != self.model:
+            problems.append(f"index was built with model '{meta['model']}', embedder is '{self.model}'")
+        expected = model_dim(self.model)
+        if expected is not None and expected != self.index.d:
+            problems.append(f"index dimension {self.index.d} != {expected} for model '{self.model}'")
+        elif expected is None and not meta:
+            print(f"WARNING: dimension of model '{self.model}' unknown and no index metadata; assuming index matches.")
+        if self.index.ntotal != len(self.chunks):
+            problems.append(f"index has {self.index.ntotal} vectors but chunks file has {len(self.chunks)} entries")
+
+        if problems:
+            raise IndexMismatchError(
+                "; ".join(problems) + ". Rebuild explicitly with: python -m rag.cli rebuild-index"
+            )
+
     def load(self, faiss_path: str, chunks_path: str):
-        """Load FAISS index and chunks from disk. Auto-rebuild if dimensions don't match."""
+        """
+        Load FAISS index and chunks from disk.
+
+        A model/dimension mismatch is reported (IndexMismatchError) rather than
+        repaired here: rebuilding means re-embedding the whole corpus, which
+        belongs in `python -m rag.cli rebuild-index`, not in every cold start.
+        """
         try:
-            self.index = faiss.read_index(faiss_path)
-            with open(chunks_path, "r", encoding="utf-8") as f:
-                self.chunks = json.load(f)
-
-            # Verify index dimension by checking with a test embedding
-            test_embedding = self.embedder.encode(["test"]).astype("float32")
-            test_embedding = _normalize(test_embedding)
-
-            if test_embedding.shape[1] != self.index.d:
-                print(f"WARNING: Index dimension mismatch!")
-                print(f"  Loaded index dimension: {self.index.d}")
-                print(f"  Current embedder dimension: {test_embedding.shape[1]}")
-                print(f"  Rebuilding index with current embedder...")
-                self.build(self.chunks)
-                self.save(faiss_path, chunks_path)
+            self.index = self._read_index(faiss_path)
+            store_path = store_path_for(chunks_path)
+            if os.path.exists(store_path) and os.path.getmtime(store_path) >= os.path.getmtime(chunks_path):
+                self.chunks = ChunkStore(store_path)
             else:
-                print(f"Loaded FAISS index from {faiss_path} with {len(self.chunks)} chunks (dimension: {self.index.d})")
-
+                with open(chunks_path, "r", encoding="utf-8") as f:
+                    self.chunks = json.load(f)
         except Exception as e:
             print(f"Error loading index: {e}")
             print(f"Will rebuild index on next build() call")
             self.index = None
             self.chunks = []
+            return
+
+        try:
+            self.check_compatible(faiss_path)
+        except IndexMismatchError:
+            self.index = None
+            self.chunks = []
+            raise
+
+        # nprobe / efSearch are query-time settings, not stored in the file
+        apply_search_params(self.index)
+
+        # Prebuilt BM25 index; if it is missing or stale it is rebuilt from chunks on first use
+        self._lexical = None
+        self._filters = None
+        self._fingerprint = None
+        bm25_path = bm25_path_for(faiss_path)
+        if os.path.exists(bm25_path):
+            try:
+                lex = BM25Index.load(bm25_path)
+                if lex.fingerprint == self.fingerprint:
+                    self._lexical = lex
+            except Exception as e:
+                print(f"WARNING: could not load BM25 index ({e}); rebuilding from chunks.")
+        print(f"Loaded FAISS {index_type_of(self.index)} index from {faiss_path} with {len(self.chunks)} chunks (dimension: {self.index.d})")
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Normalized embedding of a single query (served from the embedding cache when possible)."""
+        q = self.embedder.encode([query]).astype("float32")
+        return _normalize(q)[0]
+
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """embed_query() awaited via embedder.aencode() (no worker thread held on the API call)."""
+        q = (await self.embedder.aencode([query])).astype("float32")
+        return _normalize(q)[0]
+
+    async def aembed_queries(self, queries, mode=None) -> Dict[str, np.ndarray]:
+        """
+        Normalized embeddings, awaited via embedder.aencode(), of the queries
+        a dense search will need (none for lexical mode or clause lookups).
+        Pass the result as `qvecs` to search_many().
+        """
+        mode = mode or self.retrieval_mode
+        if self.index is None or mode == "lexical":
+            return {}
+        need = list(dict.fromkeys(
+            q for q in queries
+            if isinstance(q, str) and q.strip() and not (mode == "hybrid" and self.lexical_fast_path(q))))
+        if not need:
+            return {}
+        q = _normalize((await self.embedder.aencode(need)).astype("float32"))
+        return dict(zip(need, q))
+
+    @property
+    def lexical(self) -> BM25Index:
+        """BM25 index over the current chunks (built on first use, no network)."""
+        if self._lexical is None:
+            with self._lexical_lock:
+                if self._lexical is None:
+                    self._lexical = BM25Index.build(self.chunks)
+        return self._lexical
+
+    @property
+    def fingerprint(self) -> str:
+        """Identity of the current chunks; keys the position, filter and session caches (no BM25 build)."""
+        if self._fingerprint is None:
+            self._fingerprint = chunks_fingerprint(self.chunks)
+        return self._fingerprint
+
+    def _chunk_ids(self):
+        if isinstance(self.chunks, ChunkStore):
+            return [self.chunks.chunk_id(i) for i in range(len(self.chunks))]
+        return [c.get("chunk_id") for c in self.chunks]
 
-    def search(self, query: str, top_k=8):
-        """Search for similar chunks using the query."""
+    def chunk_ids(self, skip=()):
+        """chunk_ids in use, except those of the chunks at positions `skip`."""
+        skip = set(skip)
+        return {cid for i, cid in enumerate(self._chunk_ids()) if cid and i not in skip}
+
+    def positions(self, chunk_ids):
+        """Current index positions of chunks by chunk_id (None for ids no longer indexed)."""
+        key = self.fingerprint
+        cached = self._positions
+        if cached is None or cached[0] != key:
+            cached = self._positions = (key, {cid: i for i, cid in enumerate(self._chunk_ids())})
+        return [cached[1].get(cid) for cid in chunk_ids]
+
+    def vectors(self, positions) -> np.ndarray:
+        """Stored (normalized) embeddings of the chunks at `positions`; no embedding call."""
+        return reconstruct_ids(self.index, positions)
+
+    def hits(self, ranked):
+        """Chunk dicts (with "score") for (position, score) pairs."""
+        return [self._hit(i, s) for i, s in ranked]
+
+    def lexical_fast_path(self, query: str) -> bool:
+        """True when `query` will be answered from BM25 alone (no embedding call)."""
+        return self.retrieval_mode != "dense" and len(self.chunks) > 0 and is_clause_lookup(query)
+
+    def _dense_hits(self, queries, top_k, sel=None, qvecs=None):
+        """Embed `queries` in one call (unless all are in `qvecs`) and run one FAISS search over the (n × d) matrix."""
         if self.index is None or len(self.chunks) == 0:
             print("WARNING: No index loaded. Returning empty results.")
-            return []
+            return [[] for _ in queries]
+        if sel is not None and not len(sel):
+            return [[] for _ in queries]
 
-        q = self.embedder.encode([query]).astype("float32")
-        q = _normalize(q)
+        if qvecs and all(t in qvecs for t in queries):
+            q = np.vstack([qvecs[t] for t in queries]).astype("float32")
+        else:
+            q = _normalize(self.embedder.encode(list(queries)).astype("float32"))
 
         # Validate dimensions match
         if q.shape[1] != self.index.d:
             print(f"ERROR: Query dimension ({q.shape[1]}) doesn't match index dimension ({self.index.d})")
             print(f"Index needs to be rebuilt with current embedder.")
+            return [[] for _ in queries]
+
+        with stage("faiss"):
+            if sel is None:
+                scores, ids = self.index.search(q, top_k)
+            elif index_type_of(self.index) != "flat" and len(sel) <= FILTER_CONFIG["exact_max"]:
+                # Tight filter on an approximate index: score the allowed vectors exactly
+                sims = q @ sel.vectors(self.index).T
+                k = min(top_k, sims.shape[1])
+                top = np.argsort(-sims, axis=1)[:, :k]
+                scores, ids = np.take_along_axis(sims, top, axis=1), sel.ids[top]
+            else:
+                scores, ids = self.index.search(q, top_k, params=filtered_search_params(self.index, sel.selector))
+        return [[(int(i), float(s)) for s, i in zip(row_s, row_i) if i != -1]
+                for row_s, row_i in zip(scores, ids)]
+
+    def selection(self, where):
+        """The chunks matching a metadata filter (see rag/filters.py); None when `where` filters nothing."""
+        key = where_key(where)
+        if key is None or len(self.chunks) == 0:
+            return None
+        fingerprint = self.fingerprint
+        filters = self._filters
+        if filters is None or filters.fingerprint != fingerprint:
+            filters = self._filters = FilterCache(fingerprint, ChunkMeta(self.chunks, DEFAULT_SOURCE))
+        return filters.selection(key)
+
+    def _query_hits(self, queries, top_k, mode=None, sel=None, qvecs=None):
+        """Ranked (chunk index, score) lists, one per query, for the given retrieval mode."""
+        mode = mode or self.retrieval_mode
+        mask = sel.mask if sel is not None else None
+        results = [None] * len(queries)
+        dense_ix = []
+        for i, q in enumerate(queries):
+            if mode == "lexical" or (mode == "hybrid" and self.lexical_fast_path(q)):
+                hits = self.lexical.search(q, top_k, mask)
+                if hits or mode == "lexical":
+                    # RRF-scaled so fast-path hits rank alongside fused ones
+                    results[i] = rrf([hits])
+                    continue
+            dense_ix.append(i)
+
+        if dense_ix:
+            fetch_k = top_k if mode == "dense" else max(2 * top_k, 20)
+            dense = self._dense_hits([queries[i] for i in dense_ix], fetch_k, sel, qvecs)
+            for i, hits in zip(dense_ix, dense):
+                if mode == "hybrid":
+                    hits = rrf([hits, self.lexical.search(queries[i], fetch_k, mask)])
+                results[i] = hits[:top_k]
+        return results
+
+    def _hit(self, idx: int, score: float):
+        c = self.chunks[idx]
+        if isinstance(self.chunks, list):
+            c = dict(c)  # ChunkStore already returns a fresh dict
+        c["score"] = float(score)
+        return c
+
+    @traced("search")
+    def search(self, query: str, top_k=8, mode=None, where=None):
+        """
+        Search for similar chunks using the query.
+
+        mode: "dense", "hybrid" (RRF of dense + BM25; clause lookups such as
+        "Table 4.2" skip the embedding call) or "lexical". Defaults to
+        RETRIEVAL_MODE. where: metadata filter, e.g. {"source": "excel_forms"},
+        {"pages": (40, 52)}, {"section": ["6", "9.3"]} (see rag/filters.py).
+        """
+        return [self._hit(i, s) for i, s in self._query_hits([query], top_k, mode, self.selection(where))[0]]
+
+    @traced("search")
+    def search_many(self, queries, top_k=8, mode=None, where=None, qvecs=None):
+        """
+        Search several queries with a single embedding call and a single batched
+        FAISS search. Hits are merged across queries keeping each chunk's best
+        score, and returned sorted by score (desc). `where` as for search();
+        `qvecs` are query embeddings from aembed_queries(), used instead of
+        encoding when they cover every query.
+        """
+        queries = [q for q in queries if isinstance(q, str) and q.strip()]
+        if not queries:
             return []
 
-        scores, ids = self.index.search(q, top_k)
+        merged = {}
+        for hits in self._query_hits(queries, top_k, mode, self.selection(where), qvecs):
+            for idx, s in hits:
+                c = self.chunks[idx]
+                cid = c.get("chunk_id") or idx
+                if cid not in merged or s > merged[cid]["score"]:
+                    merged[cid] = self._hit(idx, s)
 
-        out = []
-        for s, idx in zip(scores[0], ids[0]):
-            if idx == -1:
-                continue
-            c = dict(self.chunks[idx])
-            c["score"] = float(s)
-            out.append(c)
+        out = list(merged.values())
+        out.sort(key=lambda x: x["score"], reverse=True)
         return out
 
-    def append(self, new_chunks, batch_size=64):
+    def append(self, new_chunks, batch_size=None):
         if self.index is None:
             raise RuntimeError("Index not initialized. Load or build first.")
+        self._ensure_writable()
 
         texts = [c["text"] for c in new_chunks]
-
-        embs = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embs = self.embedder.encode(batch)
-            embs.append(batch_embs)
-
-        embs = np.vstack(embs).astype("float32")
+        if batch_size:
+            self.embedder.batch_size = batch_size
+        embs = self.embedder.encode(texts).astype("float32")
         embs = _normalize(embs)
 
         # Add vectors to FAISS
@@ -140,13 +421,133 @@ class VectorStore:
         for i, c in enumerate(new_chunks):
             c["id"] = start_id + i
             self.chunks.append(c)
+        self._lexical = None
+        self._filters = None
+        self._fingerprint = None
+
+        print(f"Appended {len(new_chunks)} new chunks to FAISS index")
+
+    def describe(self) -> Dict[str, Any]:
+        """What is loaded: embedding model, index type/size/dimension, chunk counts (for /ready)."""
+        return {
+            "embedder": {"backend": self.backend, "model": self.model},
+            "index": None if self.index is None else {
+                "type": index_type_of(self.index),
+                "ntotal": int(self.index.ntotal),
+                "dim": int(self.index.d),
+                "mmapped": self._mmapped,
+            },
+            "chunks": len(self.chunks),
+            "chunk_store": isinstance(self.chunks, ChunkStore),
+            "sources": self.source_counts(),
+        }
+
+    def source_counts(self):
+        """Number of indexed chunks per source name."""
+        if isinstance(self.chunks, ChunkStore):
+            counts = {}
+            for code, k in zip(*np.unique(self.chunks.source_codes, return_counts=True)):
+                name = self.chunks.sources[code] if code >= 0 else DEFAULT_SOURCE
+                counts[name] = counts.get(name, 0) + int(k)
+            return counts
+        counts = {}
+        for c in self.chunks:
+            name = chunk_source(c)
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def ingest(self, chunk_iter, batch_size=None):
+        """
+        Embed chunks batch by batch as `chunk_iter` yields them (e.g. while later
+        PDF pages are still being extracted) and add them to the index, creating
+        it when there is none yet. Returns the number of chunks added.
+        """
+        if batch_size:
+            self.embedder.batch_size = batch_size
+        # One encode() call per round keeps every EMBED_WORKERS thread busy
+        flush_at = self.embedder.batch_size * self.embedder.workers
 
-        # Optional but useful
-        if self.embs is None:
-            self.embs = embs
+        new_chunks, parts, batch = [], [], []
+
+        def flush():
+            embs = self.embedder.encode([c["text"] for c in batch]).astype("float32")
+            parts.append(_normalize(embs))
+            new_chunks.extend(batch)
+            batch.clear()
+
+        for c in chunk_iter:
+            batch.append(c)
+            if len(batch) >= flush_at:
+                flush()
+        if batch:
+            flush()
+        if not new_chunks:
+            return 0
+
+        embs = np.vstack(parts)
+        if self.index is None:
+            self.chunks = new_chunks
+            self.index = build_index(embs)
+            self._mmapped = False
         else:
-            self.embs = np.vstack([self.embs, embs])
+            self._ensure_writable()
+            self.index.add(embs)
+            start_id = len(self.chunks)
+            for i, c in enumerate(new_chunks):
+                c["id"] = start_id + i
+                self.chunks.append(c)
+        self._lexical = None
+        self._filters = None
+        self._fingerprint = None
+        print(f"Ingested {len(new_chunks)} chunks into FAISS {index_type_of(self.index)} index")
+        return len(new_chunks)
 
-        print(f"Appended {len(new_chunks)} new chunks to FAISS index")
+    def remove_chunks(self, drop):
+        """Drop the chunks at positions `drop` together with their vectors."""
+        if not len(drop) or self.index is None:
+            return 0
+        self._ensure_writable()
+
+        if index_type_of(self.index) == "flat":
+            self.index.remove_ids(np.array(drop, dtype="int64"))
+        else:
+            # HNSW can't remove and IVF would leave gaps in the id space, so
+            # rebuild from the stored vectors (approximate for IVF-PQ; use
+            # `rag.cli rebuild-index` for exact vectors)
+            keep = np.ones(self.index.ntotal, dtype=bool)
+            keep[drop] = False
+            self.index = build_index(reconstruct_all(self.index)[keep], index_type_of(self.index))
+        drop_set = set(drop)
+        self.chunks = [c for i, c in enumerate(self.chunks) if i not in drop_set]
+        self._lexical = None
+        self._filters = None
+        self._fingerprint = None
+        # FAISS renumbers the remaining vectors sequentially; keep "id" in step
+        for i, c in enumerate(self.chunks):
+            if "id" in c:
+                c["id"] = i
+        return len(drop)
 
+    def source_pages(self, source: str, pages, stop: int = None):
+        """Positions of the chunks of `source` on any of `pages` (only among the first `stop` chunks)."""
+        pages = set(pages)
+        stop = len(self.chunks) if stop is None else stop
+        if isinstance(self.chunks, ChunkStore):
+            codes = self.chunks.source_codes[:stop]
+            names = np.array([*self.chunks.sources, DEFAULT_SOURCE])  # code -1 -> DEFAULT_SOURCE
+            mask = (names[codes] == source) & np.isin(self.chunks.pages[:stop], list(pages))
+            return np.flatnonzero(mask).tolist()
+        return [i for i in range(stop)
+                if chunk_source(self.chunks[i]) == source and self.chunks[i]["page"] in pages]
 
+    def remove_source(self, source: str):
+        """Drop every chunk (and its vector) that belongs to `source`."""
+        if isinstance(self.chunks, ChunkStore):
+            names = np.array([*self.chunks.sources, DEFAULT_SOURCE])
+            drop = np.flatnonzero(names[self.chunks.source_codes] == source).tolist()
+        else:
+            drop = [i for i, c in enumerate(self.chunks) if chunk_source(c) == source]
+        n = self.remove_chunks(drop)
+        if n:
+            print(f"Removed {n} chunks of source '{source}' from FAISS index")
+        return n
@@ -1,5 +1,9 @@
-import re, json, hashlib
+import os, re, json, hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import pdfplumber
+from pdfminer.pdftypes import resolve1
 import pandas as pd
 
 def clean_text(t: str) -> str:
@@ -10,38 +14,70 @@ def clean_text(t: str) -> str:
     t = re.sub(r"\n{3,}", "\n\n", t)
     return t.strip()
 
-def extract_pages(pdf_path: str):
-    pages = []
+def page_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+def pdf_page_hashes(pdf_path: str):
+    """
+    One hash per page over the raw PDF content streams. Needs no text
+    extraction (a fraction of a second for the whole code), so a re-ingest
+    can find the changed pages before extracting anything.
+    """
+    hashes = []
     with pdfplumber.open(pdf_path) as pdf:
-        for i, p in enumerate(pdf.pages):
-            txt = clean_text(p.extract_text() or "")
-            pages.append({"page": i + 1, "text": txt})
-    return pages
+        for p in pdf.pages:
+            h = hashlib.sha1()
+            for stream in p.page_obj.contents:
+                h.update(resolve1(stream).get_data())
+            hashes.append(h.hexdigest()[:16])
+    return hashes
+
+def _extract_page_batch(pdf_path: str, page_nums):
+    # Runs in a worker process: each task opens the PDF itself and returns plain dicts
+    out = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for n in page_nums:
+            out.append({"page": n, "text": clean_text(pdf.pages[n - 1].extract_text() or "")})
+    return out
+
+def iter_pages(pdf_path: str, pages=None, workers: int = None, pages_per_task: int = None):
+    """
+    Yield {"page", "text"} in page order (all pages, or only the 1-based
+    `pages`) while later pages are still being extracted. Pages are spread
+    over a process pool (INGEST_WORKERS, default: all cores); at most two
+    tasks per worker are in flight, so memory stays bounded however long
+    the PDF is.
+    """
+    workers = workers or int(os.getenv("INGEST_WORKERS", "0")) or os.cpu_count() or 1
+    pages_per_task = pages_per_task or int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+    if pages is None:
+        with pdfplumber.open(pdf_path) as pdf:
+            pages = range(1, len(pdf.pages) + 1)
+    pages = sorted(pages)
+    batches = [pages[i:i + pages_per_task] for i in range(0, len(pages), pages_per_task)]
+    workers = min(workers, len(batches))
 
-def split_into_chunks(pages, chunk_chars=1800, overlap_chars=250):
-    chunks = []
-    for pg in pages:
-        page_num = pg["page"]
-        text = pg["text"]
-        if not text:
-            continue
-        paras = [p.strip() for p in text.split("\n\n") if p.strip()]
-        buff = ""
-        for para in paras:
-            if len(buff) + len(para) + 2 <= chunk_chars:
-                buff = buff + ("\n\n" if buff else "") + para
-            else:
-                if buff:
-                    chunks.append({"page": page_num, "text": buff})
-                tail = buff[-overlap_chars:] if overlap_chars and buff else ""
-                buff = (tail + "\n\n" + para).strip()
-        if buff:
-            chunks.append({"page": page_num, "text": buff})
-
-    for idx, c in enumerate(chunks):
-        h = hashlib.md5((str(c["page"]) + "|" + c["text"][:200]).encode()).hexdigest()[:10]
-        c["chunk_id"] = f"p{c['page']}_c{idx}_{h}"
-    return chunks
+    if workers <= 1:
+        for batch in batches:
+            yield from _extract_page_batch(pdf_path, batch)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        todo = iter(batches)
+        pending = deque(pool.submit(_extract_page_batch, pdf_path, b) for b in islice(todo, 2 * workers))
+        while pending:
+            done = pending.popleft().result()
+            nxt = next(todo, None)
+            if nxt:
+                pending.append(pool.submit(_extract_page_batch, pdf_path, nxt))
+            yield from done
+
+def extract_pages(pdf_path: str):
+    return list(iter_pages(pdf_path))
+
+def split_into_chunks(pages, max_chars=1800, min_chars=300):
+    from .chunker import StructureChunker
+    return list(StructureChunker(max_chars=max_chars, min_chars=min_chars).chunk_pages(pages))
 
 def save_chunks(chunks, out_json_path: str):
     with open(out_json_path, "w", encoding="utf-8") as f:
@@ -49,14 +85,26 @@ def save_chunks(chunks, out_json_path: str):
 
 
 
+def _cell(v) -> str:
+    if pd.isna(v):
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return " ".join(str(v).split())
 
 def extract_excel(path: str):
-    df = pd.read_excel(path)
-    text = "\n".join(
-        df.astype(str)
-          .fillna("")
-          .values
-          .flatten()
-    )
-    return [{"page": 1, "text": clean_text(text)}]
-
+    """
+    One "page" per sheet (page = sheet number): its non-empty rows as
+    [(excel_row, [cell, ...])], plus a flattened "text" used for hashing.
+    """
+    pages = []
+    sheets = pd.read_excel(path, sheet_name=None, header=None)
+    for i, (name, df) in enumerate(sheets.items()):
+        rows = []
+        for n, values in enumerate(df.itertuples(index=False, name=None), start=1):
+            cells = [_cell(v) for v in values]
+            if any(cells):
+                rows.append((n, cells))
+        text = "\n".join(" | ".join(c for c in cells if c) for _, cells in rows)
+        pages.append({"page": i + 1, "sheet": name.strip(), "rows": rows, "text": text})
+    return pages
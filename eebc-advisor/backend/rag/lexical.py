@@ -0,0 +1,157 @@
+import os
+import re
+import hashlib
+from typing import List, Tuple, Dict
+
+import numpy as np
+from rapidfuzz import process, fuzz
+
+from .metrics import traced
+
+# Keeps clause numbers ("4.2.1") and units ("kwth", "m2") as single tokens
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*", re.I)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "shall", "should",
+    "that", "the", "this", "to", "was", "what", "when", "which", "with", "show", "tell",
+}
+
+# "Table 4.2", "clause 5.3.1", "section 6", "Fig. 3.1", "Annex B" ...
+CLAUSE_REF_RE = re.compile(
+    r"\b(?:clause|section|sec\.?|table|figure|fig\.?|appendix|annex|schedule|form)\s*[A-Z]?\d*(?:\.\d+)*(?:-\d+)?\b",
+    re.I,
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def is_clause_lookup(query: str, max_tokens: int = 6) -> bool:
+    """Short queries that name a clause/table/section: exact terms beat embeddings here."""
+    m = CLAUSE_REF_RE.search(query or "")
+    if not m or not re.search(r"\d|\b[A-Z]\b", m.group(0)):
+        return False
+    return len(tokenize(query)) <= max_tokens
+
+
+def chunks_fingerprint(chunks) -> str:
+    if getattr(chunks, "fingerprint", None):
+        return chunks.fingerprint  # ChunkStore: computed when it was written
+    h = hashlib.sha1()
+    for c in chunks:
+        h.update((c.get("chunk_id") or "").encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def rrf(rankings: List[List[Tuple[int, float]]], k: int = 60,
+        weights: List[float] = None) -> List[Tuple[int, float]]:
+    """Reciprocal rank fusion of several (doc, score) rankings, optionally weighted per ranking."""
+    fused: Dict[int, float] = {}
+    for n, ranking in enumerate(rankings):
+        w = weights[n] if weights else 1.0
+        for rank, (doc, _) in enumerate(ranking):
+            fused[doc] = fused.get(doc, 0.0) + w / (k + rank + 1)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts, stored as a CSR-style inverted index:
+    terms[i] owns postings doc_ids/tfs[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, terms, offsets, doc_ids, tfs, doc_len, fingerprint: str = "", k1: float = 1.5, b: float = 0.75):
+        self.terms = list(terms)
+        self.term_ix = {t: i for i, t in enumerate(self.terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.fingerprint = fingerprint
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(doc_len)
+        self.avgdl = float(doc_len.mean()) if self.n_docs else 0.0
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    @classmethod
+    def build(cls, chunks, **kwargs) -> "BM25Index":
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_len = np.zeros(len(chunks), dtype=np.float32)
+        for doc, c in enumerate(chunks):
+            toks = tokenize(c.get("text", ""))
+            doc_len[doc] = len(toks)
+            for t in toks:
+                p = postings.setdefault(t, {})
+                p[doc] = p.get(doc, 0) + 1
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids, tfs = [], []
+        for i, t in enumerate(terms):
+            p = postings[t]
+            doc_ids.extend(p.keys())
+            tfs.extend(p.values())
+            offsets[i + 1] = offsets[i] + len(p)
+        return cls(terms, offsets, np.array(doc_ids, dtype=np.int32), np.array(tfs, dtype=np.float32),
+                   doc_len, fingerprint=chunks_fingerprint(chunks), **kwargs)
+
+    def save(self, path: str):
+        tmp = path + ".tmp.npz"
+        # Vocabulary as one newline-joined UTF-8 blob (tokens never contain "\n")
+        terms = np.frombuffer("\n".join(self.terms).encode("utf-8"), dtype=np.uint8)
+        np.savez(tmp, terms=terms, offsets=self.offsets, doc_ids=self.doc_ids,
+                 tfs=self.tfs, doc_len=self.doc_len, fingerprint=np.array(self.fingerprint),
+                 params=np.array([self.k1, self.b], dtype=np.float32))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as z:
+            k1, b = (float(x) for x in z["params"])
+            if z["terms"].dtype.kind == "U":
+                terms = z["terms"].tolist()
+            else:
+                blob = z["terms"].tobytes().decode("utf-8")
+                terms = blob.split("\n") if blob else []
+            return cls(terms, z["offsets"], z["doc_ids"], z["tfs"], z["doc_len"],
+                       fingerprint=str(z["fingerprint"]), k1=k1, b=b)
+
+    def _expand(self, tokens: List[str]) -> List[int]:
+        """Vocabulary ids for query tokens; unknown words are fuzzily matched (typos, plurals)."""
+        ids = []
+        for t in tokens:
+            ix = self.term_ix.get(t)
+            if ix is None and len(t) >= 4 and t.isalpha() and self.terms:
+                m = process.extractOne(t, self.terms, scorer=fuzz.ratio, score_cutoff=85)
+                if m:
+                    ix = m[2]
+            if ix is not None:
+                ids.append(ix)
+        return ids
+
+    @traced("bm25")
+    def search(self, query: str, top_k: int = 8, mask: np.ndarray = None) -> List[Tuple[int, float]]:
+        """Top (doc, score) pairs; with `mask` (bool per doc) only the allowed docs."""
+        if not self.n_docs:
+            return []
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for ix in set(self._expand(tokenize(query))):
+            lo, hi = self.offsets[ix], self.offsets[ix + 1]
+            docs, tf = self.doc_ids[lo:hi], self.tfs[lo:hi]
+            norm = tf + self.k1 * (1.0 - self.b + self.b * self.doc_len[docs] / (self.avgdl or 1.0))
+            scores[docs] += self.idf[ix] * tf * (self.k1 + 1.0) / norm
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        nz = np.flatnonzero(scores)
+        if nz.size == 0:
+            return []
+        k = min(top_k, nz.size)
+        top = nz[np.argpartition(-scores[nz], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(d), float(scores[d])) for d in top]
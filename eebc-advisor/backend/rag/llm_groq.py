@@ -1,26 +1,108 @@
 import os
-from groq import Groq
+from typing import Iterator, AsyncIterator
+from groq import Groq, AsyncGroq
+
+from .net import policy, shared_httpx_client, shared_async_httpx_client
+from .utils import reset_after_fork
+from .metrics import traced, stage, record_llm_usage
+
+def _stream_usage(model: str, chunk):
+    # Groq reports usage once, on the final chunk of a stream (x_groq.usage)
+    usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+    if usage is not None:
+        record_llm_usage(model, usage)
 
 class GroqLLM:
     def __init__(self, model: str, temperature: float = 0.0, max_tokens: int = 800, top_p: float = 1.0):
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise RuntimeError("Missing GROQ_API_KEY environment variable.")
-        self.client = Groq(api_key=api_key)
+        self._api_key = api_key
+        self._connect()
+        reset_after_fork(self, GroqLLM._connect)
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.top_p = top_p
 
-    def chat(self, system: str, user: str, **kwargs) -> str:
-        resp = self.client.chat.completions.create(
+    def _connect(self):
+        # Pooled keep-alive connections; retries/backoff are done by the "groq" policy, not the SDK
+        self.client = Groq(api_key=self._api_key, http_client=shared_httpx_client(), max_retries=0)
+        self._aclient = None  # AsyncGroq, created on first async call (ASGI server only)
+
+    def warmup(self, timeout: float = 5.0):
+        """Open the pooled connection (TLS handshake included) with a free models.list call."""
+        self.client.models.list(timeout=timeout)
+
+    async def awarmup(self, timeout: float = 5.0):
+        await self.aclient.models.list(timeout=timeout)
+
+    def _messages(self, system: str, user: str):
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+
+    def _params(self, system: str, user: str, **kwargs):
+        return dict(
             model=kwargs.get("model", self.model),
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
+            messages=self._messages(system, user),
             temperature=kwargs.get("temperature", self.temperature),
             max_tokens=kwargs.get("max_tokens", self.max_tokens),
             top_p=kwargs.get("top_p", self.top_p),
+            stream=kwargs.get("stream", False),
         )
+
+    def _create(self, system: str, user: str, **kwargs):
+        # Concurrency/rate limits, retries honoring Retry-After, timeout capped by the request deadline
+        params = self._params(system, user, **kwargs)
+        return policy("groq").call(lambda timeout: self.client.chat.completions.create(**params, timeout=timeout))
+
+    @property
+    def aclient(self) -> AsyncGroq:
+        if self._aclient is None:
+            self._aclient = AsyncGroq(api_key=self._api_key, http_client=shared_async_httpx_client(), max_retries=0)
+        return self._aclient
+
+    async def _acreate(self, system: str, user: str, **kwargs):
+        params = self._params(system, user, **kwargs)
+        return await policy("groq").acall(lambda timeout: self.aclient.chat.completions.create(**params, timeout=timeout))
+
+    def chat(self, system: str, user: str, **kwargs) -> str:
+        with stage("llm"):
+            resp = self._create(system, user, **kwargs)
+        record_llm_usage(kwargs.get("model", self.model), getattr(resp, "usage", None))
         return (resp.choices[0].message.content or "").strip()
+
+    @traced("llm")
+    def stream(self, system: str, user: str, **kwargs) -> Iterator[str]:
+        """
+        Yield the completion as text deltas while the model generates it.
+        Only opening the stream is retried; a stream that breaks midway raises.
+        """
+        stream = self._create(system, user, **dict(kwargs, stream=True))
+        for chunk in stream:
+            _stream_usage(kwargs.get("model", self.model), chunk)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def achat(self, system: str, user: str, **kwargs) -> str:
+        with stage("llm"):
+            resp = await self._acreate(system, user, **kwargs)
+        record_llm_usage(kwargs.get("model", self.model), getattr(resp, "usage", None))
+        return (resp.choices[0].message.content or "").strip()
+
+    @traced("llm")
+    async def astream(self, system: str, user: str, **kwargs) -> AsyncIterator[str]:
+        """Async variant of stream()."""
+        stream = await self._acreate(system, user, **dict(kwargs, stream=True))
+        async for chunk in stream:
+            _stream_usage(kwargs.get("model", self.model), chunk)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
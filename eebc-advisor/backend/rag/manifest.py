@@ -0,0 +1,186 @@
+import os
+import json
+import hashlib
+
+from .index import DEFAULT_SOURCE
+
+# Parameters passed to StructureChunker; part of every manifest entry so a
+# chunking change re-ingests the affected sources.
+CHUNKER_PARAMS = {"max_chars": 1800, "min_chars": 300}
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def atomic_write_json(obj, path: str, **kwargs):
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, **kwargs)
+    os.replace(tmp, path)
+
+
+class IngestManifest:
+    """
+    Record of what is in the index, stored next to it as JSON:
+
+    {"version": 1, "sources": {"<name>": {"path", "sha256", "chunker", "model", "n_chunks", "pages"}}}
+
+    "pages" holds one content hash per page, so a revised PDF only
+    re-ingests the pages that changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sources = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.sources = data.get("sources", {})
+
+    def fingerprint(self, source: dict, model: str) -> dict:
+        return {
+            "path": os.path.basename(source["path"]),
+            "sha256": file_sha256(source["path"]),
+            "chunker": dict(CHUNKER_PARAMS),
+            "model": model,
+        }
+
+    def is_current(self, name: str, fp: dict) -> bool:
+        old = self.sources.get(name)
+        if not old:
+            return False
+        return all(old.get(k) == v for k, v in fp.items())
+
+    def can_patch(self, name: str, fp: dict, n_present: int) -> bool:
+        """Same chunker and model, per-page hashes on record and the index still matches them."""
+        old = self.sources.get(name)
+        return bool(old and old.get("pages") and n_present == old.get("n_chunks")
+                    and old.get("chunker") == fp["chunker"] and old.get("model") == fp["model"])
+
+    def record(self, name: str, fp: dict, n_chunks: int, pages=None):
+        self.sources[name] = dict(fp, n_chunks=n_chunks)
+        if pages is not None:
+            self.sources[name]["pages"] = pages
+
+    def save(self):
+        atomic_write_json({"version": MANIFEST_VERSION, "sources": self.sources}, self.path, indent=2)
+
+
+def _changed_pages(source: dict, old_pages):
+    """(hash per page, pages to re-chunk, iterator over those pages' content)."""
+    from .ingest import iter_pages, pdf_page_hashes, extract_excel, page_hash
+
+    if source["kind"] == "excel":
+        pages = extract_excel(source["path"])
+        hashes = [page_hash(pg["text"]) for pg in pages]
+    else:
+        hashes = pdf_page_hashes(source["path"])
+
+    todo = {i + 1 for i, h in enumerate(hashes) if i >= len(old_pages) or old_pages[i] != h}
+    if source["kind"] == "excel":
+        return hashes, todo, (pg for pg in pages if pg["page"] in todo)
+    # The page after a changed one may continue a clause whose heading changed
+    todo |= {p + 1 for p in todo if p < len(hashes)}
+    return hashes, todo, iter_pages(source["path"], pages=todo)
+
+
+def _section_before(store, name: str):
+    """Clause in effect at the end of page p-1, read back from the indexed chunks."""
+    from .chunker import last_section
+
+    def lookup(page):
+        ix = store.source_pages(name, [page - 1])
+        return last_section(store.chunks[ix[-1]]["text"]) if ix else None
+    return lookup
+
+
+def _ingest_source(store, source: dict, old_pages=None):
+    """
+    Stream `source` into the store: pages are extracted in parallel, chunked
+    and embedded in batches as they arrive. With `old_pages` (the page hashes
+    on record) unchanged pages are never extracted and keep their chunks and
+    vectors; chunks of changed or deleted pages are removed afterwards.
+    Returns (chunks added + removed, page hashes).
+    """
+    from .chunker import StructureChunker
+
+    name = source["name"]
+    old_pages = old_pages or []
+    hashes, todo, pages = _changed_pages(source, old_pages)
+    stale = sorted(p for p in todo | set(range(len(hashes) + 1, len(old_pages) + 1)) if p <= len(old_pages))
+    dropped = store.source_pages(name, stale) if stale else []
+    # New chunk_ids must not collide with those of the chunks that stay (other pages, other sources)
+    chunker = StructureChunker(section_before=_section_before(store, name) if old_pages else None,
+                               seen=store.chunk_ids(skip=dropped), **CHUNKER_PARAMS)
+
+    def chunks():
+        for c in chunker.chunk_pages(pages):
+            c["source"] = name
+            yield c
+
+    added = store.ingest(chunks())
+    removed = store.remove_chunks(dropped) if dropped else 0
+    if old_pages:
+        print(f">>> '{name}': re-chunked {len(todo)} of {len(hashes)} pages "
+              f"(+{added} / -{removed} chunks).")
+    return added + removed, hashes
+
+
+def sync_sources(store, sources, faiss_path: str, chunks_path: str, manifest_path: str) -> bool:
+    """
+    Bring the index in line with `sources` ([{"name", "path", "kind"}]).
+
+    Only sources whose file hash, chunker parameters or embedding model differ
+    from the manifest are (re-)ingested; unchanged sources cost nothing, and a
+    changed source with page hashes on record only re-embeds its changed pages.
+    The caller must hold the index lock. Returns True if the index was rewritten.
+    """
+    manifest = IngestManifest(manifest_path)
+    present = store.source_counts()
+    changed = False
+    manifest_dirty = False
+
+    for source in sources:
+        name = source["name"]
+        if not os.path.exists(source["path"]):
+            print(f">>> Source '{name}' not found at {source['path']}; skipping.")
+            continue
+
+        fp = manifest.fingerprint(source, store.model)
+        if manifest.is_current(name, fp) and present.get(name, 0) == manifest.sources[name].get("n_chunks"):
+            continue
+
+        if name == DEFAULT_SOURCE and name not in manifest.sources and present.get(name):
+            # Index built before manifests existed: its untagged chunks came from this source
+            print(f">>> Adopting {present[name]} existing chunks for '{name}' into manifest.")
+            manifest.record(name, fp, present[name])
+            manifest.save()
+            continue
+
+        if manifest.can_patch(name, fp, present.get(name, 0)):
+            print(f">>> Updating changed pages of source '{name}' ({source['path']})...")
+            n_changed, pages = _ingest_source(store, source, manifest.sources[name]["pages"])
+        else:
+            print(f">>> Ingesting source '{name}' ({source['path']})...")
+            if present.get(name):
+                store.remove_source(name)
+            n_changed, pages = _ingest_source(store, source)
+            n_changed = n_changed or present.get(name, 0)
+        present = store.source_counts()
+        manifest.record(name, fp, present.get(name, 0), pages=pages)
+        manifest_dirty = True
+        changed = changed or bool(n_changed)
+
+    if changed:
+        store.save(faiss_path, chunks_path)
+    if manifest_dirty:
+        manifest.save()
+    return changed
@@ -0,0 +1,268 @@
+import os
+import time
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List, Iterable, Tuple
+
+# ----------------------------
+# Metrics: per-stage latency, LLM tokens, embed batch sizes, cache hit
+# ratios and errors, rendered in the Prometheus text format at /metrics.
+# Dependency-free; values are per process (each gunicorn worker has its own,
+# labelled by the eebc_process_info pid).
+# ----------------------------
+METRICS_CONFIG = {
+    # Per-request stage breakdown in a Server-Timing response header (and the SSE "done" event)
+    "timing_header": os.getenv("TIMING_HEADER", "true").lower() in ("1", "true", "yes"),
+}
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _labels(names: Tuple[str, ...], values: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(values.get(n, "")) for n in names)
+
+
+def _fmt_labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    pairs = [(k, str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _labels(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, list(zip(self.labelnames, k)), v) for k, v in sorted(self._values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DURATION_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., sum, count
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _labels(self.labelnames, labels)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for k, v in items:
+            labels = list(zip(self.labelnames, k))
+            for b, n in zip(self.buckets, v):
+                out.append((self.name + "_bucket", labels + [("le", _fmt_value(b))], n))
+            out.append((self.name + "_bucket", labels + [("le", "+Inf")], v[-1]))
+            out.append((self.name + "_sum", labels, v[-2]))
+            out.append((self.name + "_count", labels, v[-1]))
+        return out
+
+
+_metrics: List[Any] = []
+_collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]] = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(fn):
+    """
+    fn() -> [(name, "counter"|"gauge", help, [(labels, value), ...]), ...],
+    called at scrape time (cache and provider stats that live elsewhere).
+    """
+    _collectors.append(fn)
+    return fn
+
+
+STAGE_SECONDS = _register(Histogram("eebc_stage_duration_seconds", "Duration of one pipeline stage.", ("stage",)))
+STAGE_ERRORS = _register(Counter("eebc_stage_errors_total", "Exceptions raised out of a pipeline stage.", ("stage", "error")))
+LLM_TOKENS = _register(Counter("eebc_llm_tokens_total", "Groq tokens by model and kind (prompt/completion).", ("model", "kind")))
+EMBED_BATCH = _register(Histogram("eebc_embed_batch_size", "Texts per embedding model call (cache misses only).",
+                                  ("model",), BATCH_BUCKETS))
+ANSWER_CASCADE = _register(Counter("eebc_answer_cascade_total",
+                                   "Cascade answers: drafts served, or escalated to the reason model by failed check.",
+                                   ("outcome", "check")))
+PORTFOLIO_ROWS = _register(Counter("eebc_portfolio_rows_total", "Screened portfolio rows by outcome and path (rules/llm).",
+                                   ("applies", "path")))
+REQUESTS = _register(Counter("eebc_http_requests_total", "HTTP requests by endpoint and status.", ("endpoint", "status")))
+REQUEST_SECONDS = _register(Histogram("eebc_http_request_duration_seconds", "HTTP request duration.", ("endpoint",)))
+
+
+def observe_request(endpoint: str, status: int, seconds: float):
+    REQUESTS.inc(endpoint=endpoint, status=status)
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+
+
+def record_llm_usage(model: str, usage):
+    """Prompt/completion token counters from a Groq `usage` object (if the response carried one)."""
+    if usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        n = getattr(usage, kind + "_tokens", None)
+        if n:
+            LLM_TOKENS.inc(n, model=model, kind=kind)
+
+
+def cache_families(cache: str, hits: int, misses: int):
+    """Collector families for one cache: lookups by result, and the hit ratio."""
+    total = hits + misses
+    return [
+        ("eebc_cache_lookups_total", "counter", "Cache lookups by cache and result.",
+         [({"cache": cache, "result": "hit"}, hits), ({"cache": cache, "result": "miss"}, misses)]),
+        ("eebc_cache_hit_ratio", "gauge", "Cache hits / lookups since the process started.",
+         [({"cache": cache}, hits / total if total else 0.0)]),
+    ]
+
+
+# ----------------------------
+# Per-request trace (Server-Timing)
+# ----------------------------
+class Trace:
+    """Total time and call count per stage within one request (shared by its threads/tasks)."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            s = self._stages.setdefault(name, [0.0, 0])
+            s[0] += seconds
+            s[1] += 1
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage -> milliseconds, plus "total" since the trace started."""
+        with self._lock:
+            out = {k: round(v[0] * 1000.0, 1) for k, v in self._stages.items()}
+        out["total"] = round((time.perf_counter() - self.start) * 1000.0, 1)
+        return out
+
+    def server_timing(self) -> str:
+        with self._lock:
+            stages = [(k, v[0], v[1]) for k, v in self._stages.items()]
+        parts = [f'{k};dur={s * 1000.0:.1f}' + (f';desc="x{n}"' if n > 1 else "") for k, s, n in stages]
+        parts.append(f"total;dur={(time.perf_counter() - self.start) * 1000.0:.1f}")
+        return ", ".join(parts)
+
+
+_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def request_trace():
+    trace = Trace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as pipeline stage `name` (histogram, error counter and the request trace)."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=name, error=type(e).__name__)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.add(name, seconds)
+
+
+def traced(name: str):
+    """Decorator form of stage(); generators (streams) are timed until exhausted."""
+    def wrap(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen(*args, **kwargs):
+                with stage(name):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+            return agen
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def coro(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return coro
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen(*args, **kwargs):
+                with stage(name):
+                    yield from fn(*args, **kwargs)
+            return gen
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return call
+    return wrap
+
+
+# ----------------------------
+# Exposition
+# ----------------------------
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = ["# HELP eebc_process_info Serving process.", "# TYPE eebc_process_info gauge",
+             f"eebc_process_info{_fmt_labels([('pid', os.getpid())])} 1"]
+    for m in _metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}" for name, labels, v in m.samples())
+    # Collectors may report samples of the same family (e.g. several caches): merge by name
+    families: Dict[str, Tuple[str, str, list]] = {}
+    for fn in _collectors:
+        try:
+            for name, kind, help, samples in fn():
+                families.setdefault(name, (kind, help, []))[2].extend(samples)
+        except Exception as e:
+            print(f"WARNING: metrics collector {getattr(fn, '__name__', fn)} failed: {e}")
+    for name, (kind, help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{_fmt_labels(sorted(labels.items()))} {_fmt_value(v)}" for labels, v in samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,405 @@
+import os
+import time
+import asyncio
+import random
+import threading
+import contextvars
+from concurrent.futures import Future
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Any, Optional
+
+from .metrics import register_collector
+from .utils import after_fork
+
+# ----------------------------
+# Per-request deadline
+# Set once per HTTP request (request_deadline); every provider call and
+# backoff sleep is capped by the time left. Thread-pool work must be
+# submitted with submit() so it sees the same deadline.
+# ----------------------------
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request budget ran out before a provider call could finish."""
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    token = _deadline.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def stage_deadline(seconds: float):
+    """Tighten the deadline to `seconds` from now for one pipeline stage (never extends the request's)."""
+    cutoff = time.monotonic() + max(0.0, seconds)
+    outer = _deadline.get()
+    token = _deadline.set(cutoff if outer is None else min(outer, cutoff))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request budget, or None when there is none."""
+    d = _deadline.get()
+    return None if d is None else d - time.monotonic()
+
+
+def submit(pool, fn, *args, **kwargs) -> Future:
+    """pool.submit() that carries the caller's context (and so its deadline) into the worker."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# ----------------------------
+# Rate limiting
+# ----------------------------
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            wait = (1 - self._tokens) / self.rate
+        left = remaining()
+        if left is not None and wait > left:
+            raise DeadlineExceeded("rate limit wait exceeds request deadline")
+        return wait
+
+    def acquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self):
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+# Exceptions worth retrying when they carry no HTTP status (SDK class names,
+# so neither SDK has to be imported here)
+_RETRYABLE_NAMES = {
+    "APITimeoutError", "APIConnectionError",                          # groq
+    "Timeout", "TryAgain", "ServiceUnavailableError", "ServerError",  # voyageai
+}
+
+
+def _retry_after(headers) -> Optional[float]:
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms is not None:
+            return float(ms) / 1000.0
+        ra = headers.get("retry-after")
+        if ra is None:
+            return None
+        try:
+            return max(0.0, float(ra))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(ra).timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def classify(exc: BaseException):
+    """(retryable, retry_after_seconds) for an exception raised by a provider SDK."""
+    status = getattr(exc, "status_code", None) or getattr(exc, "http_status", None)
+    headers = getattr(getattr(exc, "response", None), "headers", None) or getattr(exc, "headers", None)
+    if status is not None:
+        return status == 429 or status >= 500, _retry_after(headers)
+    if isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in _RETRYABLE_NAMES:
+        return True, _retry_after(headers)
+    return False, None
+
+
+class ProviderPolicy:
+    """
+    How calls to one provider are made: at most `max_concurrency` in flight
+    per process, `rps` per second (token bucket; 0 = unlimited), a per-call
+    timeout capped by the request deadline, and up to `max_retries` retries
+    of 429/5xx/timeouts with full-jitter exponential backoff. A Retry-After
+    header from the provider overrides the computed delay.
+
+    acall() is the asyncio variant used by the ASGI server. It has its own
+    `async_concurrency` limit: coroutines waiting on a provider hold no
+    thread, so far more of them can be in flight than threads.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 8, rps: float = 0.0, burst: int = 0,
+                 timeout: float = 30.0, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 async_concurrency: int = 64):
+        self.name = name
+        self.async_concurrency = max(1, async_concurrency)
+        self._async_slots = None  # asyncio.Semaphore, created inside the running loop
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._bucket = TokenBucket(rps, burst or max(1, int(rps))) if rps > 0 else None
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "errors": 0, "deadline_exceeded": 0}
+
+    @classmethod
+    def from_env(cls, name: str, **defaults):
+        prefix = name.upper()
+        env = {
+            "max_concurrency": ("MAX_CONCURRENCY", int),
+            "rps": ("RPS", float),
+            "burst": ("BURST", int),
+            "timeout": ("TIMEOUT", float),
+            "max_retries": ("MAX_RETRIES", int),
+            "async_concurrency": ("ASYNC_CONCURRENCY", int),
+        }
+        kwargs = dict(defaults)
+        for key, (suffix, cast) in env.items():
+            raw = os.getenv(f"{prefix}_{suffix}")
+            if raw:
+                kwargs[key] = cast(raw)
+        return cls(name, **kwargs)
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def call_timeout(self) -> float:
+        left = remaining()
+        if left is None:
+            return self.timeout
+        if left <= 0:
+            raise DeadlineExceeded(f"{self.name}: request deadline exceeded")
+        return min(self.timeout, left)
+
+    def _backoff(self, e: Exception, attempt: int) -> float:
+        """Delay before the next attempt, or re-raise `e` when it must not be retried."""
+        retryable, retry_after = classify(e)
+        if not retryable or attempt >= self.max_retries:
+            self._count("errors")
+            raise e
+        delay = retry_after if retry_after is not None else \
+            random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        left = remaining()
+        if left is not None and delay >= left:
+            self._count("deadline_exceeded")
+            raise e
+        self._count("retries")
+        print(f"WARNING: {self.name} call failed ({type(e).__name__}); retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    def call(self, fn: Callable[[float], Any]):
+        """Run fn(timeout_seconds) under this policy and return its result."""
+        attempt = 0
+        while True:
+            try:
+                timeout = self.call_timeout()
+                if self._bucket is not None:
+                    self._bucket.acquire()
+                if not self._slots.acquire(timeout=self.call_timeout()):
+                    raise DeadlineExceeded(f"{self.name}: no free slot before the request deadline")
+                try:
+                    self._count("calls")
+                    return fn(timeout)
+                finally:
+                    self._slots.release()
+            except DeadlineExceeded:
+                self._count("deadline_exceeded")
+                raise
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                attempt += 1
+                time.sleep(delay)
+
+    async def acall(self, fn: Callable[[float], Awaitable[Any]]):
+        """Await fn(timeout_seconds) under this policy and return its result."""
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.async_concurrency)
+        attempt = 0
+        while True:
+            try:
+                timeout = self.call_timeout()
+                if self._bucket is not None:
+                    await self._bucket.aacquire()
+                try:
+                    await asyncio.wait_for(self._async_slots.acquire(), timeout=self.call_timeout())
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"{self.name}: no free slot before the request deadline") from None
+                try:
+                    self._count("calls")
+                    return await fn(timeout)
+                finally:
+                    self._async_slots.release()
+            except DeadlineExceeded:
+                self._count("deadline_exceeded")
+                raise
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+
+POLICIES = {
+    "groq": ProviderPolicy.from_env("groq", max_concurrency=8, timeout=30.0),
+    "voyage": ProviderPolicy.from_env("voyage", max_concurrency=4, timeout=15.0),
+}
+
+
+def policy(name: str) -> ProviderPolicy:
+    return POLICIES[name]
+
+
+def provider_stats() -> Dict[str, Dict[str, int]]:
+    return {name: dict(p.stats) for name, p in POLICIES.items()}
+
+
+@register_collector
+def _provider_metrics():
+    stats = provider_stats()
+    yield ("eebc_provider_events_total", "counter",
+           "Provider calls, retries, errors and deadline expiries (rag.net policies).",
+           [({"provider": name, "event": event}, n) for name, s in stats.items() for event, n in s.items()])
+
+
+# ----------------------------
+# Pooled keep-alive HTTP clients, shared by every thread in the process
+# ----------------------------
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+@after_fork
+def _drop_clients_after_fork():
+    # Pooled connections opened by a --preload master belong to it; children open their own
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+
+
+def shared_httpx_client():
+    """httpx.Client for the Groq SDK."""
+    with _clients_lock:
+        if "httpx" not in _clients:
+            import httpx
+            _clients["httpx"] = httpx.Client(
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                    max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS),
+                timeout=httpx.Timeout(60.0, connect=5.0),
+            )
+        return _clients["httpx"]
+
+
+def shared_async_httpx_client():
+    """httpx.AsyncClient for the async Groq SDK (ASGI server); sized for the async concurrency limit."""
+    with _clients_lock:
+        if "httpx_async" not in _clients:
+            import httpx
+            size = max(HTTP_MAX_CONNECTIONS, POLICIES["groq"].async_concurrency)
+            _clients["httpx_async"] = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=size, max_keepalive_connections=size,
+                                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS),
+                timeout=httpx.Timeout(60.0, connect=5.0),
+            )
+        return _clients["httpx_async"]
+
+
+def shared_aiohttp_session():
+    """
+    aiohttp.ClientSession for the async voyageai SDK (which otherwise opens
+    one per call), sized for the async concurrency limit. Call it from the
+    running loop; a session belongs to the loop it was created on.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        cached = _clients.get("aiohttp")
+        if cached is None or cached[0] is not loop or cached[1].closed:
+            import aiohttp
+            size = max(HTTP_MAX_CONNECTIONS, POLICIES["voyage"].async_concurrency)
+            connector = aiohttp.TCPConnector(limit=size, keepalive_timeout=HTTP_KEEPALIVE_SECONDS)
+            cached = _clients["aiohttp"] = (loop, aiohttp.ClientSession(connector=connector))
+        return cached[1]
+
+
+async def aclose_shared_clients():
+    """Close the async clients on ASGI shutdown (their connections belong to the closing loop)."""
+    with _clients_lock:
+        client = _clients.pop("httpx_async", None)
+        session = _clients.pop("aiohttp", None)
+    if client is not None:
+        await client.aclose()
+    if session is not None and session[0] is asyncio.get_running_loop():
+        await session[1].close()
+
+
+def shared_requests_session():
+    """requests.Session for the voyageai SDK (which otherwise opens one per thread)."""
+    with _clients_lock:
+        if "requests" not in _clients:
+            import requests
+            from requests.adapters import HTTPAdapter
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_MAX_CONNECTIONS)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)  # VOYAGE_BASE_URL may be a local stand-in
+            _clients["requests"] = s
+        return _clients["requests"]
+
+
+# ----------------------------
+# Request coalescing
+# ----------------------------
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result."""
+
+    def __init__(self):
+        self._calls: Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn: Callable[[], Any]):
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result(timeout=remaining())
+        try:
+            result = fn()
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
@@ -0,0 +1,22 @@
+import os
+
+# ----------------------------
+# Index files and ingest sources, shared by app.py and rag/cli.py.
+# Importing this module has no side effects (no index load, no ingest).
+# ----------------------------
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BACKEND_DIR, "data")
+PDF_PATH = os.path.join(DATA_DIR, "EEBC 2021.pdf")
+XLSX_PATH = os.path.join(DATA_DIR, "application-and-compliance-forms-for-energy-efficiency-building-code.xlsx")
+
+# Allow overriding paths via environment variables
+FAISS_PATH = os.getenv("FAISS_PATH", os.path.join(DATA_DIR, "index.faiss"))
+CHUNKS_PATH = os.getenv("CHUNKS_PATH", os.path.join(DATA_DIR, "chunks.json"))
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", os.path.join(os.path.dirname(FAISS_PATH), "manifest.json"))
+LOCK_PATH = FAISS_PATH + ".lock"
+APPEND_EXCEL = os.getenv("APPEND_EXCEL", "true").lower() in ("1", "true", "yes")
+
+# Documents that make up the index; ingestion is driven by the manifest diff
+SOURCES = [{"name": "eebc_pdf", "path": PDF_PATH, "kind": "pdf"}]
+if APPEND_EXCEL:
+    SOURCES.append({"name": "excel_forms", "path": XLSX_PATH, "kind": "excel"})
@@ -0,0 +1,348 @@
+import io
+import os
+import re
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .schemas import BuildingContext
+from .agents import THRESHOLDS, APPLICABILITY_REASONS, applicability, applicability_answer, _scope_sources_for, intake, _regex_fill
+from .net import request_deadline
+from .metrics import traced, PORTFOLIO_ROWS
+
+# ----------------------------
+# Bulk applicability screening of building portfolios (CSV/XLSX/JSON rows).
+# The threshold checks of applicability() run column-wise over the whole
+# table; the LLM is only used for undecided rows that carry free text
+# (notes/description) it can extract the missing values from.
+# ----------------------------
+PORTFOLIO_CONFIG = {
+    "llm": os.getenv("PORTFOLIO_LLM", "auto").lower(),                    # auto | off
+    "llm_concurrency": int(os.getenv("PORTFOLIO_LLM_CONCURRENCY", "4")),  # rows in the intake LLM at once
+    "max_rows": int(os.getenv("PORTFOLIO_MAX_ROWS", "50000")),
+    "budget_s": float(os.getenv("PORTFOLIO_BUDGET_S", "100")),             # LLM time for one portfolio
+}
+
+THRESHOLD_FIELDS = [t[0] for t in THRESHOLDS]
+NUMERIC_FIELDS = THRESHOLD_FIELDS + ["wwr_percent", "skylight_percent", "glazing_vlt"]
+TEXT_FIELDS = ["district", "building_type", "hvac_type", "operating_hours"]
+
+# Normalised column header -> (field, factor); factor converts other units on read
+_ALIASES = {
+    "id": ["id", "building id", "property id", "name", "building", "building name", "property", "site"],
+    "notes": ["notes", "description", "remarks", "comments", "details"],
+    "floor_area_m2": ["floor area", "floor area m2", "floor area sqm", "gross floor area", "gross floor area m2",
+                      "gfa", "gfa m2", "area", "area m2", "built up area", "built up area m2"],
+    "electrical_demand_kva": ["electrical demand", "electrical demand kva", "demand kva", "kva",
+                              "contract demand", "contract demand kva", "max demand kva", "maximum demand kva"],
+    "cooling_capacity_kwth": ["cooling capacity", "cooling capacity kwth", "cooling capacity kw", "cooling kwth",
+                              "cooling kw", "cooling"],
+    "heating_capacity_kwth": ["heating capacity", "heating capacity kwth", "heating capacity kw", "heating kwth",
+                              "heating kw", "heating"],
+    "wwr_percent": ["wwr", "wwr percent", "window to wall ratio", "window wall ratio"],
+    "skylight_percent": ["skylight", "skylight percent", "skylight ratio"],
+    "glazing_vlt": ["vlt", "glazing vlt", "visible light transmittance"],
+    "district": ["district", "location", "city"],
+    "building_type": ["building type", "type", "use", "occupancy", "building use"],
+    "is_new_building": ["is new building", "new building", "new", "new or existing", "status"],
+    "hvac_type": ["hvac", "hvac type", "hvac system", "cooling system"],
+    "operating_hours": ["operating hours", "hours", "opening hours"],
+}
+_CONVERTED = {
+    "floor area sqft": ("floor_area_m2", 0.09290304), "floor area ft2": ("floor_area_m2", 0.09290304),
+    "gfa sqft": ("floor_area_m2", 0.09290304), "gfa ft2": ("floor_area_m2", 0.09290304),
+    "area sqft": ("floor_area_m2", 0.09290304), "area ft2": ("floor_area_m2", 0.09290304),
+    "cooling capacity tr": ("cooling_capacity_kwth", 3.51685), "cooling tr": ("cooling_capacity_kwth", 3.51685),
+    "cooling tons": ("cooling_capacity_kwth", 3.51685),
+}
+COLUMN_MAP = {h: (field, 1.0) for field, names in _ALIASES.items() for h in names + [field.replace("_", " ")]}
+COLUMN_MAP.update(_CONVERTED)
+
+_TRUE = {"yes", "y", "true", "1", "new", "new building", "proposed"}
+_FALSE = {"no", "n", "false", "0", "existing", "retrofit", "renovation", "refurbishment"}
+
+
+def _norm_header(h) -> str:
+    h = str(h).lower().replace("²", "2").replace("m^2", "m2").replace("sq. ft", "sqft").replace("sq ft", "sqft")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", h).split())
+
+
+def _numeric(col: pd.Series) -> np.ndarray:
+    """Column as float64 with NaN for blanks; "2,400 m²"-style strings keep their first number."""
+    if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+        return col.to_numpy(dtype=float, na_value=np.nan)
+    s = col.astype("string").str.replace(r"(?<=\d),(?=\d{3}\b)", "", regex=True)
+    return pd.to_numeric(s.str.extract(r"(-?\d+(?:\.\d+)?)", expand=False), errors="coerce") \
+        .to_numpy(dtype=float, na_value=np.nan)
+
+
+def _flag(col: pd.Series) -> pd.Series:
+    s = col.astype("string").str.strip().str.lower()
+    return pd.Series(np.where(s.isin(_TRUE), True, np.where(s.isin(_FALSE), False, None)), index=col.index, dtype=object)
+
+
+def _text(col: pd.Series) -> np.ndarray:
+    s = col.astype("string").str.strip()
+    return np.array([None if pd.isna(v) or v == "" else v for v in s], dtype=object)
+
+
+def read_portfolio(source, filename: Optional[str] = None) -> pd.DataFrame:
+    """
+    Raw table from a path, bytes/file object (CSV or XLSX, first sheet) or a
+    list of row dicts. Use normalize_portfolio() on the result.
+    """
+    if isinstance(source, list):
+        return pd.DataFrame(source)
+    name = (filename or (source if isinstance(source, str) else getattr(source, "name", "")) or "").lower()
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            head = f.readline()
+    else:
+        head = source.readline()
+        source.seek(0)
+    if name.endswith((".xlsx", ".xlsm", ".xls")) or head.startswith(b"PK"):
+        return pd.read_excel(source, sheet_name=0)
+    # Regional Excel exports use ';' as the separator
+    sep = ";" if head.count(b";") > head.count(b",") else ","
+    return pd.read_csv(source, sep=sep, skipinitialspace=True, encoding="utf-8-sig")
+
+
+def normalize_portfolio(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per building with the BuildingContext columns (NaN/None when
+    unknown), plus "id" and "notes". Headers are matched loosely
+    ("Floor area (m²)", "GFA sqft", "Cooling TR", ...); unknown columns are
+    ignored. Raises ValueError when no threshold column is recognised.
+    """
+    if len(raw) > PORTFOLIO_CONFIG["max_rows"]:
+        raise ValueError(f"Portfolio has {len(raw)} rows; the limit is {PORTFOLIO_CONFIG['max_rows']}.")
+    n = len(raw)
+    out = pd.DataFrame(index=pd.RangeIndex(n))
+    seen = set()
+    for col in raw.columns:
+        field, factor = COLUMN_MAP.get(_norm_header(col), (None, 1.0))
+        if field is None or field in seen:
+            continue
+        seen.add(field)
+        if field in NUMERIC_FIELDS:
+            out[field] = _numeric(raw[col]) * factor
+        elif field == "is_new_building":
+            out[field] = _flag(raw[col]).to_numpy()
+        else:
+            out[field] = _text(raw[col])
+    if not seen & set(THRESHOLD_FIELDS):
+        raise ValueError("No floor area, electrical demand, cooling or heating capacity column found. "
+                         "Expected headers like 'floor_area_m2', 'Floor area (m²)', 'kVA', 'Cooling kWth'.")
+    for f in NUMERIC_FIELDS:
+        if f not in out:
+            out[f] = np.nan
+    for f in TEXT_FIELDS + ["is_new_building", "notes"]:
+        if f not in out:
+            out[f] = None
+    if "id" not in out:
+        out["id"] = None
+    return out
+
+
+def columns(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """The normalised frame as plain arrays (row access on a DataFrame is slow)."""
+    return {c: df[c].to_numpy() for c in df.columns}
+
+
+def row_context(cols: Dict[str, np.ndarray], i: int) -> BuildingContext:
+    """BuildingContext of row i (known values only)."""
+    fields = {}
+    for f in BuildingContext.model_fields:
+        v = cols[f][i]
+        if _missing(v):
+            continue
+        fields[f] = _plain(v)
+    return BuildingContext(**fields)
+
+
+def _missing(v) -> bool:
+    return v is None or v is pd.NA or (isinstance(v, float) and v != v)
+
+
+def _plain(v):
+    if _missing(v):
+        return None
+    return v.item() if isinstance(v, np.generic) else v
+
+
+# ----------------------------
+# Vectorized applicability
+# ----------------------------
+_LIMITS = np.array([t[3] for t in THRESHOLDS], dtype=float)
+_INCLUSIVE = np.array([t[4] for t in THRESHOLDS], dtype=bool)
+
+
+@traced("portfolio_classify")
+def classify(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    applicability() over every row at once: (applies, met, known) where
+    applies is "yes"/"no"/"unknown" per row and met/known are (rows x 4)
+    masks over THRESHOLDS.
+    """
+    met, known = _masks(df[THRESHOLD_FIELDS].to_numpy(dtype=float))
+    applies = np.where(met.any(axis=1), "yes", np.where(known.any(axis=1), "no", "unknown"))
+    return applies, met, known
+
+
+def _masks(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    known = ~np.isnan(values)
+    with np.errstate(invalid="ignore"):
+        met = np.where(_INCLUSIVE, values >= _LIMITS, values > _LIMITS) & known
+    return met, known
+
+
+class _Classes:
+    """Per outcome class (applies + which thresholds are met/known): the shared part of a result row."""
+
+    def __init__(self, store):
+        self.sources = _scope_sources_for(store)
+        self._cache: Dict[Tuple, Dict[str, Any]] = {}
+
+    def get(self, applies: str, met_row: np.ndarray, known_row: np.ndarray) -> Dict[str, Any]:
+        key = (applies, met_row.tobytes(), known_row.tobytes())
+        cls = self._cache.get(key)
+        if cls is None:
+            cls = self._cache[key] = {
+                "applies": applies,
+                "reason": APPLICABILITY_REASONS[applies],
+                "met": [f for f, m in zip(THRESHOLD_FIELDS, met_row) if m],
+                "below": [f for f, m, k in zip(THRESHOLD_FIELDS, met_row, known_row) if k and not m],
+                "missing": [f for f, k in zip(THRESHOLD_FIELDS, known_row) if not k],
+                "sources": self.sources,
+            }
+        return cls
+
+
+def _narrative(ctx: BuildingContext, applies: str, sources: List[Dict[str, Any]]) -> str:
+    if applies == "unknown":
+        return "- " + APPLICABILITY_REASONS["unknown"]
+    return applicability_answer(ctx, applies, sources)
+
+
+def _needs_llm(applies: str, missing: List[str], notes) -> bool:
+    """Undecided rows ("unknown", or "no" resting on missing values) with text the intake LLM can read."""
+    return (applies == "unknown" or (applies == "no" and bool(missing))) and isinstance(notes, str) and bool(notes.strip())
+
+
+def _result(cols, i: int, cls: Dict[str, Any], ctx: BuildingContext = None, **extra) -> Dict[str, Any]:
+    ctx = ctx or row_context(cols, i)
+    out = {"row": i, "id": _plain(cols["id"][i])}
+    out.update(cls)
+    out["values"] = {f: getattr(ctx, f) for f in THRESHOLD_FIELDS if getattr(ctx, f) is not None}
+    out["narrative"] = _narrative(ctx, cls["applies"], cls["sources"])
+    out.update(extra)
+    return out
+
+
+def _llm_row(cols, i: int, classes: _Classes, memo: Dict[str, BuildingContext]) -> Dict[str, Any]:
+    """Fill the row's missing fields from its notes (intake: regex, then LLM) and re-classify."""
+    ctx = row_context(cols, i)
+    notes = cols["notes"][i].strip()
+    found = memo.get(notes)  # exports repeat the same descriptions
+    extra = {"llm": True}
+    if found is None:
+        try:
+            found = memo[notes] = intake(notes, None, strict=True)
+        except Exception as e:
+            # Flag the row: its values come from regex alone, it is not an LLM-read result
+            print(f"WARNING: portfolio intake failed for row {i}: {e}")
+            found = _regex_fill(BuildingContext(), notes)
+            extra = {"llm": False, "error": f"intake failed: {e}"}
+    merged = ctx.model_dump()
+    for k, v in found.model_dump().items():
+        if merged.get(k) is None and v is not None:
+            merged[k] = v
+    ctx = BuildingContext(**merged)
+    applies, _ = applicability(ctx)
+    met, known = _masks(np.array([[np.nan if getattr(ctx, f) is None else getattr(ctx, f)
+                                    for f in THRESHOLD_FIELDS]], dtype=float))
+    return _result(cols, i, classes.get(applies, met[0], known[0]), ctx, **extra)
+
+
+def _until(deadline: float, fn, *args):
+    # The budget covers the whole portfolio, not each call: intake falls back to regex once it is spent
+    with request_deadline(max(0.001, deadline - time.monotonic())):
+        return fn(*args)
+
+
+def screen(df: pd.DataFrame, store=None, llm: str = None, concurrency: int = None,
+           budget_s: float = None) -> Iterator[Dict[str, Any]]:
+    """
+    Result dicts for a normalised portfolio, then one {"summary": ...}.
+    Rows decided by the thresholds stream out first, in input order;
+    undecided rows with notes (llm="auto") follow as their intake LLM calls
+    complete, at most `concurrency` at a time, within `budget_s` seconds
+    overall. Citations are shared per outcome class. Rows whose intake call
+    failed come back with llm=False and an "error".
+    """
+    start = time.perf_counter()
+    deadline = time.monotonic() + (budget_s or PORTFOLIO_CONFIG["budget_s"])
+    llm = (llm or PORTFOLIO_CONFIG["llm"]).lower()
+    concurrency = max(1, concurrency or PORTFOLIO_CONFIG["llm_concurrency"])
+    applies, met, known = classify(df)
+    classes = _Classes(store)
+    cols = columns(df)
+    notes = cols["notes"]
+    counts = {"yes": 0, "no": 0, "unknown": 0}
+    errors = 0
+
+    llm_rows = []
+    for i in range(len(df)):
+        cls = classes.get(applies[i], met[i], known[i])
+        if llm != "off" and _needs_llm(cls["applies"], cls["missing"], notes[i]):
+            llm_rows.append(i)
+            continue
+        counts[cls["applies"]] += 1
+        PORTFOLIO_ROWS.inc(applies=cls["applies"], path="rules")
+        yield _result(cols, i, cls)
+
+    if llm_rows:
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="portfolio")
+        todo = iter(llm_rows)
+        pending, memo = {}, {}
+        try:
+            # Bounded window: a client that disconnects leaves at most 2x concurrency calls behind
+            for i in todo:
+                pending[pool.submit(_until, deadline, _llm_row, cols, i, classes, memo)] = i
+                if len(pending) >= 2 * concurrency:
+                    break
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    i = pending.pop(fut)
+                    try:
+                        r = fut.result()
+                    except Exception as e:
+                        print(f"WARNING: portfolio row {i} failed: {e}")
+                        r = _result(cols, i, classes.get(applies[i], met[i], known[i]), llm=False,
+                                    error=f"row failed: {e}")
+                    counts[r["applies"]] += 1
+                    errors += "error" in r
+                    PORTFOLIO_ROWS.inc(applies=r["applies"], path="llm")
+                    yield r
+                    nxt = next(todo, None)
+                    if nxt is not None:
+                        pending[pool.submit(_until, deadline, _llm_row, cols, nxt, classes, memo)] = nxt
+        finally:
+            for fut in pending:
+                fut.cancel()
+            pool.shutdown(wait=False)
+
+    yield {"summary": dict(rows=len(df), llm_rows=len(llm_rows), errors=errors,
+                           seconds=round(time.perf_counter() - start, 3), **counts)}
+
+
+def to_ndjson(results: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    for r in results:
+        yield json.dumps(r, ensure_ascii=False, default=_plain) + "\n"
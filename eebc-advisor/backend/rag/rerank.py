@@ -0,0 +1,259 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from .lexical import tokenize
+from .chunker import CLAUSE_NUM_RE
+from .net import remaining, submit
+from .metrics import traced, register_collector, cache_families
+
+# ----------------------------
+# Rerank stage between retrieval and the answer prompt (env-tunable)
+# ----------------------------
+RERANK_CONFIG = {
+    "backend": os.getenv("RERANKER", "lexical").lower(),          # lexical | cross-encoder | none
+    "model": os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+    "budget_ms": float(os.getenv("RERANK_BUDGET_MS", "250")),     # cross-encoder only; lexical is ~1 ms
+    "cache_size": int(os.getenv("RERANK_CACHE_SIZE", "4096")),    # (query, chunk_id) pair scores
+    "prior_weight": float(os.getenv("RERANK_PRIOR_WEIGHT", "0.3")),  # keep some of the retrieval order
+    "proximity_weight": float(os.getenv("RERANK_PROXIMITY_WEIGHT", "0.2")),
+}
+
+
+def _query_key(query: str) -> str:
+    return " ".join(tokenize(query))
+
+
+class BaseReranker:
+    """
+    Reranker interface: rerank(query, candidates) -> the same candidate dicts,
+    best first, each with a "rerank_score".
+
+    Subclasses implement score_pairs(query, texts), one relevance score per
+    text, in one batched pass. Pair scores are cached by (query, chunk_id).
+    The final score mixes the min-max normalised pair score with the
+    retrieval rank and page proximity: a chunk next to other relevant
+    chunks of the same document is more likely the clause being asked
+    about.
+    """
+
+    name = "base"
+
+    def __init__(self, cache_size: int = 4096):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "pairs_scored": 0, "cache_hits": 0, "fallbacks": 0}
+
+    def score_pairs(self, query: str, texts: List[str]) -> List[float]:
+        raise NotImplementedError
+
+    # ---- pair-score cache ----
+    def _cached(self, qkey: str, ids: List[str]) -> Dict[str, float]:
+        found = {}
+        with self._lock:
+            for cid in ids:
+                v = self._cache.get((qkey, cid))
+                if v is not None:
+                    self._cache.move_to_end((qkey, cid))
+                    found[cid] = v
+            self.stats["cache_hits"] += len(found)
+        return found
+
+    def _remember(self, qkey: str, scores: Dict[str, float]):
+        with self._lock:
+            for cid, v in scores.items():
+                self._cache[(qkey, cid)] = v
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self.stats["pairs_scored"] += len(scores)
+
+    def _score_missing(self, query: str, qkey: str, todo: List[Dict[str, Any]]) -> Dict[str, float]:
+        scores = dict(zip((c["chunk_id"] for c in todo), self.score_pairs(query, [c["text"] for c in todo])))
+        self._remember(qkey, scores)
+        return scores
+
+    def pair_scores(self, query: str, candidates: List[Dict[str, Any]]) -> Optional[Dict[str, float]]:
+        qkey = _query_key(query)
+        scores = self._cached(qkey, [c["chunk_id"] for c in candidates])
+        todo = [c for c in candidates if c["chunk_id"] not in scores]
+        if todo:
+            scores.update(self._score_missing(query, qkey, todo))
+        return scores
+
+    # ---- combination ----
+    def rerank(self, query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if len(candidates) < 2:
+            return candidates
+        with self._lock:
+            self.stats["calls"] += 1
+        scores = self.pair_scores(query, candidates)
+        if scores is None:
+            return candidates
+        return _combine(candidates, np.array([scores[c["chunk_id"]] for c in candidates], dtype=np.float32))
+
+
+def _combine(candidates: List[Dict[str, Any]], rel: np.ndarray) -> List[Dict[str, Any]]:
+    n = len(candidates)
+    span = float(rel.max() - rel.min())
+    rel = (rel - rel.min()) / span if span > 1e-9 else np.zeros(n, dtype=np.float32)
+    prior = 1.0 / (1.0 + np.arange(n, dtype=np.float32))  # candidates arrive in retrieval order
+
+    # Page proximity: relevance of the other candidates on nearby pages of the same source
+    pages = np.array([c.get("page", 0) for c in candidates], dtype=np.float32)
+    same = np.array([[c.get("source") == d.get("source") and not c.get("sheet") and not d.get("sheet")
+                      for d in candidates] for c in candidates])
+    near = np.exp(-np.abs(pages[:, None] - pages[None, :]) / 2.0) * same
+    np.fill_diagonal(near, 0.0)
+    proximity = (near @ rel) / max(1.0, n - 1.0)
+
+    final = rel + RERANK_CONFIG["prior_weight"] * prior + RERANK_CONFIG["proximity_weight"] * proximity
+    order = np.argsort(-final, kind="stable")
+    out = []
+    for i in order:
+        c = candidates[i]
+        c["rerank_score"] = float(final[i])
+        out.append(c)
+    return out
+
+
+class LexicalReranker(BaseReranker):
+    """
+    Cheap, dependency-free scorer: weighted coverage of the query terms
+    (numbers and clause references count double), query bigrams found in
+    order, and an exact clause-number match.
+    """
+
+    name = "lexical"
+
+    def score_pairs(self, query: str, texts: List[str]) -> List[float]:
+        q = tokenize(query)
+        qset = set(q)
+        weights = {t: 2.0 if any(ch.isdigit() for ch in t) else 1.0 for t in qset}
+        total = sum(weights.values()) or 1.0
+        bigrams = set(zip(q, q[1:]))
+        clauses = {m.group(1) for m in CLAUSE_NUM_RE.finditer(query)}
+        out = []
+        for text in texts:
+            toks = tokenize(text)
+            tset = set(toks)
+            score = sum(w for t, w in weights.items() if t in tset) / total
+            if bigrams:
+                score += 0.5 * len(bigrams & set(zip(toks, toks[1:]))) / len(bigrams)
+            if clauses and any(re.search(r"(?<![\d.])" + re.escape(c) + r"(?![\d])", text) for c in clauses):
+                score += 1.0
+            out.append(score)
+        return out
+
+
+class CrossEncoderReranker(BaseReranker):
+    """
+    Local cross-encoder (sentence-transformers, optional dependency). Scoring
+    runs on a worker thread and is abandoned after the time budget, in which
+    case this request falls back to the lexical scorer; the late result still
+    lands in the cache for the next identical question.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model: str, budget_ms: float = 250.0, cache_size: int = 4096):
+        super().__init__(cache_size=cache_size)
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise RuntimeError(
+                "RERANKER=cross-encoder needs the sentence-transformers package "
+                "(pip install sentence-transformers)."
+            ) from e
+        self.model = model
+        self.budget_ms = budget_ms
+        self._model = CrossEncoder(model, device="cpu", max_length=512)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._fallback = LexicalReranker(cache_size=cache_size)
+
+    def score_pairs(self, query: str, texts: List[str]) -> List[float]:
+        return [float(s) for s in self._model.predict([(query, t) for t in texts], show_progress_bar=False)]
+
+    def pair_scores(self, query: str, candidates: List[Dict[str, Any]]) -> Optional[Dict[str, float]]:
+        qkey = _query_key(query)
+        scores = self._cached(qkey, [c["chunk_id"] for c in candidates])
+        todo = [c for c in candidates if c["chunk_id"] not in scores]
+        if not todo:
+            return scores
+        budget = self.budget_ms / 1000.0
+        left = remaining()
+        if left is not None:
+            budget = min(budget, max(0.0, left))
+        fut = submit(self._pool, self._score_missing, query, qkey, todo)
+        try:
+            scores.update(fut.result(timeout=budget))
+            return scores
+        except FutureTimeout:
+            print(f"WARNING: cross-encoder rerank over {self.budget_ms:.0f} ms budget; using lexical rerank.")
+        except Exception as e:
+            print(f"WARNING: cross-encoder rerank failed ({e}); using lexical rerank.")
+        with self._lock:
+            self.stats["fallbacks"] += 1
+        return self._fallback.pair_scores(query, candidates)
+
+
+def make_reranker(backend: str = None) -> Optional[BaseReranker]:
+    """Build the reranker selected by RERANKER (lexical | cross-encoder | none)."""
+    backend = (backend or RERANK_CONFIG["backend"]).lower()
+    if backend in ("none", "off", "false", "0"):
+        return None
+    if backend == "cross-encoder":
+        try:
+            return CrossEncoderReranker(RERANK_CONFIG["model"], budget_ms=RERANK_CONFIG["budget_ms"],
+                                        cache_size=RERANK_CONFIG["cache_size"])
+        except Exception as e:
+            print(f"WARNING: cross-encoder reranker unavailable ({e}); using lexical rerank.")
+    elif backend != "lexical":
+        raise ValueError(f"Unknown RERANKER '{backend}' (expected lexical, cross-encoder or none)")
+    return LexicalReranker(cache_size=RERANK_CONFIG["cache_size"])
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[BaseReranker]:
+    """Process-wide reranker, built on first use (model loads are slow)."""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = make_reranker() or False
+    return _reranker or None
+
+
+@traced("rerank")
+def rerank(query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    r = get_reranker()
+    if r is None:
+        return candidates
+    start = time.perf_counter()
+    out = r.rerank(query, candidates)
+    r.stats["last_ms"] = round((time.perf_counter() - start) * 1000.0, 2)
+    return out
+
+
+def rerank_stats() -> Optional[Dict[str, Any]]:
+    r = get_reranker()
+    return dict(r.stats, backend=r.name) if r is not None else None
+
+
+@register_collector
+def _rerank_metrics():
+    r = _reranker or None  # don't build a model just to be scraped
+    if r is None:
+        return []
+    fams = cache_families("rerank", r.stats["cache_hits"], r.stats["pairs_scored"])
+    fams.append(("eebc_rerank_fallbacks_total", "counter", "Cross-encoder reranks over budget (lexical used).",
+                 [({"backend": r.name}, r.stats["fallbacks"])]))
+    return fams
@@ -18,15 +18,18 @@ class BuildingContext(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     context: Optional[BuildingContext] = None
+    session_id: Optional[str] = None  # "new" to start a conversation, then the id from the previous response
 
 class Source(BaseModel):
     page: int
     chunk_id: str
     score: float
     excerpt: str
+    sheet: Optional[str] = None  # Excel form sources: "page" is the sheet number
 
 class ChatResponse(BaseModel):
     answer: str
     applies: str
     reason: str
     sources: List[Source]
+    session_id: Optional[str] = None  # send back with the next turn (None when sessions are off)
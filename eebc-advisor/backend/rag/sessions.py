@@ -0,0 +1,191 @@
+import os
+import re
+import json
+import time
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+from .utils import reset_after_fork
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "sessions.sqlite")
+
+# ----------------------------
+# Conversation sessions (SESSIONS=off|memory|sqlite, off by default); a
+# session exists only for clients that send a session_id
+#   memory  per process: with several gunicorn workers a follow-up that lands
+#           on another worker is answered as a first turn
+#   sqlite  one local file shared by the workers on the host
+# ----------------------------
+SESSION_CONFIG = {
+    "backend": os.getenv("SESSIONS", "off").lower(),
+    "path": os.getenv("SESSION_PATH", DEFAULT_SQLITE_PATH),
+    "ttl_s": float(os.getenv("SESSION_TTL", "3600")),            # idle seconds before a session expires
+    "max_entries": int(os.getenv("SESSION_MAX_ENTRIES", "1000")),
+    "history": int(os.getenv("SESSION_HISTORY", "4")),           # turns kept (and shown to the answer model)
+    "answer_chars": int(os.getenv("SESSION_ANSWER_CHARS", "400")),  # of each past answer
+    "pool": int(os.getenv("SESSION_POOL", "20")),                # candidate chunks carried to the next turn
+    "carry_weight": float(os.getenv("SESSION_CARRY_WEIGHT", "0.5")),  # RRF weight of carried vs fresh hits
+}
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{16,128}$")
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(18)
+
+
+def valid_session_id(session_id: Optional[str]) -> bool:
+    return bool(session_id) and bool(SESSION_ID_RE.match(session_id))
+
+
+# ----------------------------
+# Backends: same small interface. A session is
+#   {"ctx": {...}, "history": [{"q", "a"}], "turns": int,
+#    "fingerprint": str, "candidates": [{"chunk_id", "pos"}], "vecs": float16 (n × d) or None}
+# ----------------------------
+class MemoryBackend:
+    """In-process backend (one session table per gunicorn worker)."""
+
+    def __init__(self):
+        self._entries = OrderedDict()   # id -> (session, last_used), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, min_used: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[1] < min_used:
+                return None
+            self._entries.move_to_end(session_id)
+            return dict(entry[0])
+
+    def put(self, session_id: str, session: Dict[str, Any], now: float):
+        with self._lock:
+            self._entries[session_id] = (session, now)
+            self._entries.move_to_end(session_id)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def evict(self, max_entries: int, min_used: float):
+        with self._lock:
+            while self._entries:
+                sid, (_, last_used) = next(iter(self._entries.items()))
+                if last_used >= min_used and len(self._entries) <= max_entries:
+                    break
+                del self._entries[sid]
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """Local sqlite file, shared by all gunicorn workers on the host."""
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        reset_after_fork(self, lambda b: setattr(b, "_local", threading.local()))
+        conn = self._conn()
+        conn.execute("""CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            vecs BLOB,
+            dim INTEGER NOT NULL DEFAULT 0,
+            last_used REAL NOT NULL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_used ON sessions (last_used)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str, min_used: float) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT state, vecs, dim FROM sessions WHERE id = ? AND last_used >= ?", (session_id, min_used),
+        ).fetchone()
+        if row is None:
+            return None
+        session = json.loads(row[0])
+        session["vecs"] = np.frombuffer(row[1], dtype=np.float16).reshape(-1, row[2]) if row[1] else None
+        return session
+
+    def put(self, session_id: str, session: Dict[str, Any], now: float):
+        vecs = session.get("vecs")
+        state = {k: v for k, v in session.items() if k != "vecs"}
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, state, vecs, dim, last_used) VALUES (?, ?, ?, ?, ?)",
+            (session_id, json.dumps(state, ensure_ascii=False),
+             vecs.tobytes() if vecs is not None else None, vecs.shape[1] if vecs is not None else 0, now),
+        )
+        conn.commit()
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        conn.commit()
+
+    def evict(self, max_entries: int, min_used: float):
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE last_used < ?", (min_used,))
+        conn.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        )
+        conn.commit()
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+# ----------------------------
+# Store
+# ----------------------------
+class SessionStore:
+    """Bounded LRU of conversation sessions; a session expires `ttl_seconds` after its last turn."""
+
+    def __init__(self, backend, ttl_seconds: float = 3600, max_entries: int = 1000):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        """SESSIONS=memory|sqlite|off; returns None when off."""
+        kind = SESSION_CONFIG["backend"]
+        if kind in ("0", "off", "false", "no", "none"):
+            return None
+        backend = SqliteBackend(SESSION_CONFIG["path"]) if kind == "sqlite" else MemoryBackend()
+        return cls(backend, ttl_seconds=SESSION_CONFIG["ttl_s"], max_entries=SESSION_CONFIG["max_entries"])
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self.backend.get(session_id, time.time() - self.ttl_seconds)
+        if session is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return session
+
+    def save(self, session_id: str, session: Dict[str, Any]):
+        now = time.time()
+        self.backend.put(session_id, session, now)
+        self.backend.evict(self.max_entries, now - self.ttl_seconds)
+
+    def delete(self, session_id: str):
+        self.backend.delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "size": self.backend.size()}
@@ -0,0 +1,64 @@
+import os
+import weakref
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines
+    fcntl = None
+    import msvcrt
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Hold an exclusive inter-process lock on `path` (created if missing)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield f
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# One fork hook for the package: module-level resets (after_fork) first, so
+# e.g. pooled HTTP clients are dropped before objects reconnect, then
+# obj -> reset(obj) for every live object registered with reset_after_fork.
+# The objects are held weakly: registering neither leaks nor pins them.
+_fork_hooks = []
+_fork_resets = weakref.WeakKeyDictionary()
+
+
+def _reset_all_after_fork():
+    for fn in _fork_hooks:
+        fn()
+    for obj, reset in list(_fork_resets.items()):
+        reset(obj)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_all_after_fork)
+
+
+def after_fork(fn):
+    """Decorator: run fn() in every forked child, before the per-object resets."""
+    _fork_hooks.append(fn)
+    return fn
+
+
+def reset_after_fork(obj, reset):
+    """
+    Call reset(obj) in every forked child while obj is alive. Objects built
+    in a gunicorn --preload master must not share sockets, sqlite handles or
+    (dead) thread pools with the workers. `reset` must not hold a reference
+    to obj (it receives it as its argument).
+    """
+    _fork_resets[obj] = reset
@@ -0,0 +1,84 @@
+import re
+from typing import List, Dict, Any, Set
+
+from .lexical import CLAUSE_REF_RE
+
+# ----------------------------
+# Local answer checks (no model call)
+# The answer cascade serves the fast model's draft only when it passes all
+# of them; otherwise the reason model answers. Each check is cheap regex:
+#   empty      nothing (or next to nothing) was generated
+#   citations  sources were given but nothing is cited
+#   pages      a cited page / form is not one of the sources
+#   numbers    a threshold value (number with a unit, or after U-value/COP/...)
+#              appears nowhere in the prompt (sources, question, context)
+# ----------------------------
+NUM = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?|\.\d+"
+NUMBER_RE = re.compile(NUM)
+PAGE_CITE_RE = re.compile(r"\bpp?\.\s*(\d+)(?:\s*[-–]\s*(\d+))?", re.I)
+FORM_CITE_RE = re.compile(r"\bForm\s+['‘’\"]([^'‘’\"]+)['‘’\"]", re.I)
+# value then unit: 0.45 W/m²K, 500 kVA, 40 %, 300 lux, 10.5 lm/W, 24 °C, 350 kWth
+UNIT_AFTER_RE = re.compile(
+    r"(?P<val>" + NUM + r")\s*(?:%|percent\b|W\s*/\s*m|kW\s*th|kWth|kW\b|kVA|MVA|TR\b|RT\b|tons?\b|lux\b|lx\b"
+    r"|lm\s*/\s*W|°\s*[CF]|deg\s*[CF]|Pa\b|ACH\b|m²|m2\b|sq\.?\s*m|m3\s*/\s*h|l\s*/\s*s|L\s*/\s*s)", re.I)
+# metric name then value: U-value of 0.4, COP ≥ 3.2, SHGC 0.25, WWR below 40
+NAME_BEFORE_RE = re.compile(
+    r"\b(?:U[\s-]?value|R[\s-]?value|U|COP|EER|IPLV|SEER|SHGC|SC|VLT|WWR|SRI|LPD)\b[^0-9\n]{0,20}?(?P<val>" + NUM + r")",
+    re.I)
+MIN_ANSWER_CHARS = 40
+
+
+def _num(s: str) -> float:
+    return round(float(s.replace(",", "")), 4)
+
+
+def _grounded(text: str) -> Set[float]:
+    """Every number in `text`, also as a fraction/percentage (0.4 and 40 both ground "40%")."""
+    out = set()
+    for m in NUMBER_RE.finditer(text):
+        v = _num(m.group(0))
+        out.update((v, round(v * 100, 4), round(v / 100, 4)))
+    return out
+
+
+def cited_pages(answer: str) -> Set[int]:
+    pages = set()
+    for m in PAGE_CITE_RE.finditer(answer):
+        pages.add(int(m.group(1)))
+        if m.group(2):
+            pages.add(int(m.group(2)))
+    return pages
+
+
+def threshold_values(answer: str) -> List[str]:
+    """Threshold-like numbers in the answer (clause/table numbers and citations excluded)."""
+    skip = [m.span() for m in CLAUSE_REF_RE.finditer(answer)] + [m.span() for m in PAGE_CITE_RE.finditer(answer)]
+    vals = []
+    for rx in (UNIT_AFTER_RE, NAME_BEFORE_RE):
+        for m in rx.finditer(answer):
+            a, b = m.span("val")
+            if not any(x <= a and b <= y for x, y in skip):
+                vals.append(m.group("val"))
+    return vals
+
+
+def check_answer(answer: str, prompt: str, sources: List[Dict[str, Any]]) -> List[str]:
+    """Names of the failed checks for an answer to `prompt` drawn from `sources`; [] when it passes."""
+    text = (answer or "").strip()
+    if len(text) < MIN_ANSWER_CHARS:
+        return ["empty"]
+
+    failed = []
+    pages = cited_pages(text)
+    forms = {f.strip().lower() for f in FORM_CITE_RE.findall(text)}
+    if sources and not pages and not forms:
+        failed.append("citations")
+    src_pages = {int(s["page"]) for s in sources if not s.get("sheet")}
+    src_forms = {str(s["sheet"]).strip().lower() for s in sources if s.get("sheet")}
+    if (pages - src_pages) or (forms - src_forms):
+        failed.append("pages")
+
+    grounded = _grounded(prompt)
+    if any(_num(v) not in grounded for v in threshold_values(text)):
+        failed.append("numbers")
+    return failed
@@ -0,0 +1,86 @@
+"""
+Offline test setup: the hashing embedder instead of Voyage, no on-disk caches
+and a dummy Groq key (LLM calls go to bench.fakes where a test needs them).
+
+    cd eebc-advisor/backend && python -m pytest -q
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("EMBEDDER", "hashing")
+os.environ.setdefault("EMBED_MODEL", "hashing-384")
+os.environ.setdefault("EMBED_CACHE", "false")
+os.environ.setdefault("ANSWER_CACHE", "off")
+os.environ.setdefault("WARMUP", "false")
+os.environ.setdefault("PRELOAD_INDEX", "false")
+
+
+import pandas as pd  # noqa: E402
+import pytest  # noqa: E402
+
+FORM_SHEETS = {
+    "Lighting (P)": [
+        ["Lighting compliance form", None, None],
+        ["Space", "LPD (W/m2)", "Clause"],
+        ["Office", 9.5, "9.3.1"],
+        ["Corridor", 5, "9.3.1"],
+    ],
+    "HVAC(P)": [
+        ["HVAC compliance form", None, None],
+        ["Equipment", "COP", "Clause"],
+        ["Chiller", 5.8, "6.3.2"],
+        ["Split unit", 3.2, "6.3.2"],
+    ],
+}
+
+
+def write_workbook(path, sheets=None):
+    """Compliance-forms style workbook: a title row, a header row, data rows per sheet."""
+    with pd.ExcelWriter(path) as xw:
+        for name, rows in (sheets or FORM_SHEETS).items():
+            pd.DataFrame(rows).to_excel(xw, sheet_name=name, header=False, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def store():
+    """Empty VectorStore on the hashing embedder (no network)."""
+    from rag.index import VectorStore
+    return VectorStore(backend="hashing", model="hashing-64")
+
+
+@pytest.fixture(scope="session")
+def fake_providers():
+    """bench.fakes Groq/Voyage server with the agents' LLM clients pointed at it (fast, no jitter)."""
+    from bench.fakes import FakeProviders
+    from rag import agents
+
+    fake = FakeProviders(llm_latency_ms=5, token_ms=0, embed_latency_ms=1, jitter_ms=0).start()
+    saved = {k: os.environ.get(k) for k in fake.env()}
+    os.environ.update(fake.env())
+    llms = (agents._llm_extract, agents._llm_reason, agents._llm_draft)
+    for llm in llms:
+        llm._api_key = os.environ["GROQ_API_KEY"]
+        llm._connect()
+    yield fake
+    fake.stop()
+    for k, v in saved.items():
+        if v is None:
+            os.environ.pop(k, None)
+        else:
+            os.environ[k] = v
+    for llm in llms:
+        llm._connect()
+
+
+@pytest.fixture
+def fakes(fake_providers):
+    """The session's fake providers, with their latency settings restored after the test."""
+    config = dict(fake_providers.config)
+    yield fake_providers
+    fake_providers.config.update(config)
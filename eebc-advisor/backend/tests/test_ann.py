@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from rag.ann import build_index, index_type_of, reconstruct_ids, recall_latency_report, resolve_type, INDEX_CONFIG
+
+
+def _corpus(n=600, dim=32, seed=0):
+    v = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_small_corpora_fall_back():
+    assert resolve_type("ivf_pq", 1000, 64, INDEX_CONFIG) == "ivf_flat"
+    assert resolve_type("ivf_flat", 100, 64, INDEX_CONFIG) == "flat"
+    assert resolve_type("hnsw", 10, 64, INDEX_CONFIG) == "hnsw"
+    with pytest.raises(ValueError):
+        resolve_type("annoy", 1000, 64, INDEX_CONFIG)
+
+
+@pytest.mark.parametrize("kind", ["flat", "hnsw", "ivf_flat"])
+def test_index_types_find_exact_matches(kind):
+    corpus = _corpus()
+    index = build_index(corpus, kind)
+    assert index_type_of(index) == kind
+    _, ids = index.search(corpus[:20], 1)
+    assert (ids[:, 0] == np.arange(20)).mean() >= 0.95
+    assert np.allclose(reconstruct_ids(index, [3, 7]), corpus[[3, 7]], atol=1e-6)
+
+
+def test_recall_report_flat_is_exact():
+    corpus = _corpus(300)
+    rows = recall_latency_report(corpus, corpus[:10], k=5, variants=[{"type": "flat"}, {"type": "hnsw"}])
+    assert rows[0]["recall_at_k"] == 1.0
+    assert {r["actual_type"] for r in rows} == {"flat", "hnsw"}
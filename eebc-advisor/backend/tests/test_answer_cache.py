@@ -0,0 +1,80 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from rag.answer_cache import AnswerCache, MemoryBackend, SqliteBackend, context_key
+from rag.schemas import BuildingContext
+
+
+def _unit(*xs):
+    v = np.array(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_context_key_normalizes():
+    a = BuildingContext(district="Colombo ", floor_area_m2=1000.001)
+    b = BuildingContext(district="colombo", floor_area_m2=1000.0)
+    assert context_key(a) == context_key(b)
+    assert context_key(a) != context_key(BuildingContext(district="Kandy", floor_area_m2=1000.0))
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_lookup_needs_same_context_and_close_query(tmp_path, backend):
+    be = MemoryBackend() if backend == "memory" else SqliteBackend(str(tmp_path / "answers.sqlite"))
+    cache = AnswerCache(be, threshold=0.97)
+    ctx = BuildingContext(district="Colombo")
+    cache.store(ctx, _unit(1, 0, 0), {"answer": "cached"})
+
+    assert cache.lookup(ctx, _unit(1, 0.05, 0))["answer"] == "cached"
+    assert cache.lookup(ctx, _unit(1, 1, 0)) is None                      # cosine 0.71
+    assert cache.lookup(BuildingContext(district="Kandy"), _unit(1, 0, 0)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_eviction_keeps_recently_used():
+    cache = AnswerCache(MemoryBackend(), max_entries=2)
+    ctx = BuildingContext()
+    for i, v in enumerate([_unit(1, 0, 0), _unit(0, 1, 0)]):
+        cache.store(ctx, v, {"answer": str(i)})
+    cache.lookup(ctx, _unit(1, 0, 0))          # "0" is now the most recently used
+    cache.store(ctx, _unit(0, 0, 1), {"answer": "2"})
+    assert cache.lookup(ctx, _unit(0, 1, 0)) is None
+    assert cache.lookup(ctx, _unit(1, 0, 0))["answer"] == "0"
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_entries_of_another_embedding_model_never_match(tmp_path, backend):
+    be = MemoryBackend() if backend == "memory" else SqliteBackend(str(tmp_path / "answers.sqlite"))
+    cache = AnswerCache(be)
+    ctx = BuildingContext()
+    cache.store(ctx, _unit(1, 0, 0, 0), {"answer": "voyage"}, model="voyage:voyage-3")
+    assert cache.lookup(ctx, _unit(1, 0, 0), model="hashing:hashing-3") is None   # other dimension
+    assert cache.lookup(ctx, _unit(1, 0, 0, 0), model="hashing:hashing-4") is None  # same dimension
+    assert cache.lookup(ctx, _unit(1, 0, 0, 0), model="voyage:voyage-3")["answer"] == "voyage"
+
+
+def test_rows_written_without_a_model_are_skipped():
+    be = MemoryBackend()
+    cache = AnswerCache(be)
+    ctx = BuildingContext()
+    be.put(context_key(ctx, AnswerCache.space("m", 3)), _unit(1, 0, 0, 0), {"answer": "old"}, 1e12)
+    assert cache.lookup(ctx, _unit(1, 0, 0), model="m") is None
+
+
+def test_cache_failures_are_misses(tmp_path, monkeypatch):
+    from rag import agents
+    from rag.index import VectorStore
+
+    cache = AnswerCache(MemoryBackend())
+    monkeypatch.setattr(agents, "_answer_cache", cache)
+    store = VectorStore(backend="hashing", model="hashing-64")
+
+    def broken(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache.backend, "candidates", broken)
+    monkeypatch.setattr(cache.backend, "put", broken)
+    key_ctx, qvec, hit = agents._cache_probe("What COP do chillers need?", None, store)
+    assert hit is None and qvec is not None and cache.misses == 1
+    agents._cache_store(key_ctx, qvec, "- answer", "unknown", "r", [], store)  # logged, not raised
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+import app as flask_app
+from tests.test_index import _built
+
+
+@pytest.fixture
+def fresh_app(tmp_path, monkeypatch):
+    """app.py with no store loaded yet, reading its index from tmp_path."""
+    monkeypatch.setattr(flask_app, "FAISS_PATH", str(tmp_path / "index.faiss"))
+    monkeypatch.setattr(flask_app, "CHUNKS_PATH", str(tmp_path / "chunks.json"))
+    monkeypatch.setattr(flask_app, "LOCK_PATH", str(tmp_path / "index.faiss.lock"))
+    monkeypatch.setattr(flask_app, "_store", None)
+    monkeypatch.setattr(flask_app, "_status", dict(flask_app._status, state="cold", error=None, load_seconds=None))
+    return flask_app
+
+
+def test_ready_reports_model_mismatch(fresh_app, tmp_path):
+    _built(tmp_path, model="hashing-64")  # the app embeds with hashing-384
+    store = fresh_app.get_store()
+    assert store.index is None
+
+    resp = fresh_app.app.test_client().get("/ready")
+    assert resp.status_code == 503
+    body = resp.get_json()
+    assert body["ready"] is False and body["state"] == "error"
+    assert "hashing-64" in body["error"]
+
+
+def test_ready_without_index_when_build_skipped(fresh_app, monkeypatch):
+    monkeypatch.setattr(fresh_app, "SKIP_INDEX_BUILD", True)
+    monkeypatch.setattr(fresh_app, "WARMUP", False)
+    assert fresh_app.get_store().index is None
+
+    resp = fresh_app.app.test_client().get("/ready")
+    assert resp.status_code == 200 and "error" not in resp.get_json()
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _check_events(events):
+    names = [e for e, _ in events]
+    assert names[0] == "meta" and names[-1] == "done" and set(names[1:-1]) == {"token"}
+    meta, done = events[0][1], events[-1][1]
+    assert meta["sources"] and meta["session_id"] is None and "timings" in done
+    assert "".join(d["text"] for e, d in events if e == "token").strip() == done["answer"]
+
+
+@pytest.fixture
+def loaded(fakes, tmp_path, monkeypatch):
+    store, _ = _built(tmp_path)
+    monkeypatch.setattr(flask_app, "_store", store)
+    return store
+
+
+def test_flask_stream_events(loaded):
+    resp = flask_app.app.test_client().post("/api/chat/stream", json={"message": "What COP do chillers need?"})
+    assert resp.status_code == 200 and resp.mimetype == "text/event-stream"
+    _check_events(_parse_sse(resp.get_data(as_text=True)))
+
+
+def test_asgi_stream_events(loaded):
+    from starlette.testclient import TestClient
+    import asgi
+
+    resp = TestClient(asgi.app).post("/api/chat/stream", json={"message": "What COP do chillers need?"})
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/event-stream")
+    _check_events(_parse_sse(resp.text))
+
+
+@pytest.mark.parametrize("server", ["flask", "asgi"])
+def test_client_session_round_trip(loaded, monkeypatch, server):
+    """What frontend/src/App.jsx does: "new" on the first turn, then the id from the meta event."""
+    from rag import agents
+    from rag.sessions import SessionStore, MemoryBackend
+
+    sessions = SessionStore(MemoryBackend())
+    monkeypatch.setattr(agents, "_sessions", sessions)
+    if server == "flask":
+        client = flask_app.app.test_client()
+        post = lambda body: client.post("/api/chat/stream", json=body).get_data(as_text=True)
+    else:
+        from starlette.testclient import TestClient
+        import asgi
+        client = TestClient(asgi.app)
+        post = lambda body: client.post("/api/chat/stream", json=body).text
+
+    first = _parse_sse(post({"message": "We are building a 1,200 m2 office. What COP do chillers need?",
+                             "session_id": "new"}))
+    sid = first[0][1]["session_id"]
+    assert sid and sid != "new" and sessions.get(sid)["turns"] == 1
+
+    second = _parse_sse(post({"message": "And how must ducts be insulated?", "session_id": sid}))
+    assert second[0][1]["session_id"] == sid
+    sess = sessions.get(sid)
+    assert sess["turns"] == 2 and sess["ctx"]["floor_area_m2"] == 1200
+
+    # A client that sends no id gets no session, even with sessions on
+    assert _parse_sse(post({"message": "What COP do chillers need?"}))[0][1]["session_id"] is None
+    assert sessions.backend.size() == 1
@@ -0,0 +1,47 @@
+import pytest
+
+from rag import agents
+from rag.agents import applicability, applicability_fast_path, _regex_fill
+from rag.schemas import BuildingContext
+
+
+@pytest.mark.parametrize("field,below,at,above", [
+    ("floor_area_m2", 999.9, 1000, 1000.1),          # >= 1000 m²
+    ("electrical_demand_kva", 499, 500, 501),        # >= 500 kVA
+    ("cooling_capacity_kwth", 349, 350, 350.5),      # > 350 kWth
+    ("heating_capacity_kwth", 249, 250, 251),        # > 250 kWth
+])
+def test_threshold_edges(field, below, at, above):
+    inclusive = field in ("floor_area_m2", "electrical_demand_kva")
+    assert applicability(BuildingContext(**{field: below}))[0] == "no"
+    assert applicability(BuildingContext(**{field: at}))[0] == ("yes" if inclusive else "no")
+    assert applicability(BuildingContext(**{field: above}))[0] == "yes"
+
+
+def test_any_threshold_is_enough_and_unknown_without_values():
+    assert applicability(BuildingContext(floor_area_m2=200, electrical_demand_kva=600))[0] == "yes"
+    assert applicability(BuildingContext(district="Colombo"))[0] == "unknown"
+
+
+def test_thresholds_table_matches_rules():
+    for field, _, _, limit, inclusive in agents.THRESHOLDS:
+        assert applicability(BuildingContext(**{field: limit}))[0] == ("yes" if inclusive else "no")
+
+
+def test_regex_fill():
+    ctx = _regex_fill(BuildingContext(), "A 12,000 m2 office with a 900 kVA supply")
+    assert ctx.floor_area_m2 == 12000 and ctx.electrical_demand_kva == 900
+
+
+def test_fast_path_answers_pure_applicability_questions():
+    out = applicability_fast_path("Does EEBC apply to my 1,500 m2 office?", None, None)
+    assert out is not None
+    answer, applies, _, sources = out
+    assert applies == "yes" and "(p.16)" in answer and sources[0]["page"] == 16
+
+
+def test_fast_path_defers_to_the_pipeline():
+    assert applicability_fast_path("What are the lighting requirements for a 1,500 m2 office?", None, None) is None
+    assert applicability_fast_path("Does EEBC apply to my office?", None, None) is None     # nothing to decide on
+    # "no" must not rest on a number the regex could not place
+    assert applicability_fast_path("Does EEBC apply to my 600 m2 office with 40 rooms?", None, None) is None
@@ -0,0 +1,38 @@
+import json
+
+from bench import percentile, summarize, compare, load_questions
+from bench.fakes import canned_reply
+from bench.load import _server_timing
+
+
+def test_percentile_is_nearest_rank():
+    v = [float(i) for i in range(1, 101)]
+    assert percentile(v, 50) == 50.0 and percentile(v, 99) == 99.0 and percentile(v, 100) == 100.0
+    assert percentile([], 95) == 0.0
+    assert summarize([10.0, 30.0, 20.0], seconds=1.0)["ops_s"] == 3.0
+
+
+def test_compare_flags_regressions_only(tmp_path):
+    base = tmp_path / "base.json"
+    base.write_text(json.dumps({"search": {"p50_ms": 1.0}, "chunker": {"p50_ms": 2.0}}))
+    out = compare({"search": {"p50_ms": 1.5}, "chunker": {"p50_ms": 2.2}, "new": {"p50_ms": 9.0}}, str(base), 0.25)
+    assert len(out) == 1 and out[0].startswith("search:")
+
+
+def test_canned_answer_cites_prompt_sources():
+    prompt = "Sources:\n[S1] p.40 eebc_pdf: Chillers shall have a COP of at least 5.8.\n"
+    answer = canned_reply("You are an EEBC advisor.", prompt, answer_tokens=10)
+    assert answer.startswith("- Chillers") and "(p.40)" in answer
+    assert json.loads(canned_reply("Extract building context ...", "x", 10))["floor_area_m2"] is None
+
+
+def test_server_timing_parse():
+    assert _server_timing('retrieval;dur=12.5;desc="x2", total;dur=40.0') == {"retrieval": 12.5, "total": 40.0}
+    assert _server_timing(None) == {}
+
+
+def test_question_corpus_loads():
+    rows = load_questions()
+    assert rows and all({"id", "category", "message"} <= set(r) for r in rows)
+    cat = rows[0]["category"]
+    assert all(r["category"] == cat for r in load_questions(category=cat))
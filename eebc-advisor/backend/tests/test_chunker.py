@@ -0,0 +1,86 @@
+from rag import ingest
+from rag.chunker import StructureChunker, content_id, heading_of, section_tags, strip_furniture
+from rag.manifest import sync_sources
+
+PAGE_40 = """Energy Efficiency Building Code of Sri Lanka
+06
+6.3.2 Chillers
+Water-cooled chillers shall have a minimum COP of 5.8 at AHRI conditions.
+Table 6.3: Minimum chiller efficiency
+Centrifugal 5.8 6.1
+6.3.3 Controls
+Each system shall have an off-hour control with a manual override."""
+
+PAGE_41 = """Energy Efficiency Building Code of Sri Lanka
+Supply air temperature reset shall be provided for systems above 10 kWth of cooling."""
+
+
+def test_heading_of():
+    assert heading_of("6.3.3.2 Off-hour control") == ("6.3.3.2", "Off-hour control")
+    assert heading_of("6.3.2 Chillers (continued)") == ("6.3.2", "Chillers")
+    assert heading_of("0 to 3 R-1.41") is None
+    assert heading_of("3.90 ICOP") is None
+    assert heading_of("6.3 Controls ........ 45") is None
+
+
+def test_strip_furniture():
+    assert strip_furniture(["Energy Efficiency Building Code of Sri Lanka", "06", "CAVH", "6.1 General"]) == ["6.1 General"]
+
+
+def test_content_id_is_stable_and_salted():
+    assert content_id("abc") == content_id("abc")
+    assert content_id("abc") != content_id("abd")
+    assert content_id("abc", salt="4") != content_id("abc")
+    assert content_id("abc").startswith("c") and len(content_id("abc")) == 16
+
+
+def test_clause_chunks_and_continuation():
+    chunker = StructureChunker(max_chars=200, min_chars=20)
+    chunks = list(chunker.chunk_pages([{"page": 40, "text": PAGE_40}, {"page": 41, "text": PAGE_41}]))
+    assert [c["page"] for c in chunks].count(41) == 1
+    assert chunks[0]["text"].startswith("6.3.2 Chillers") and chunks[0]["section"] == "6.3.2"
+    cont = chunks[-1]
+    assert cont["text"].startswith("6.3.3 Controls (continued)") and cont["section"] == "6.3.3"
+    assert all(section_tags(c) for c in chunks)
+
+    again = list(StructureChunker(max_chars=200, min_chars=20).chunk_pages(
+        [{"page": 40, "text": PAGE_40}, {"page": 41, "text": PAGE_41}]))
+    assert [c["chunk_id"] for c in again] == [c["chunk_id"] for c in chunks]
+
+
+def test_merged_chunk_keeps_every_section():
+    c = StructureChunker(max_chars=1800, min_chars=20).chunk_page({"page": 40, "text": PAGE_40})[0]
+    assert c["section"] == "6.3.2" and c["sections"] == ["6.3.2", "6.3.3"]
+    assert section_tags(c) == ["6.3.2", "6.3.3"]
+    assert section_tags({"text": PAGE_40}) == ["6.3.2", "6.3.3"]  # indexed before sections were tagged
+
+
+def test_repeated_text_gets_distinct_ids():
+    page = {"page": 1, "text": "Notes: all values apply to new buildings and major retrofits only."}
+    chunker = StructureChunker(min_chars=10)
+    ids = [c["chunk_id"] for p in (1, 2, 2) for c in chunker.chunk_page(dict(page, page=p))]
+    assert len(set(ids)) == 3
+    seen = {ids[0]}
+    assert StructureChunker(min_chars=10, seen=seen).chunk_page(page)[0]["chunk_id"] != ids[0]
+
+
+def test_reingest_never_reuses_a_kept_chunk_id(tmp_path, store, monkeypatch):
+    notes = "Notes: all values apply to new buildings and major retrofits only."
+    texts = {1: notes, 2: "6.1 General\nThis chapter covers heating, ventilation and air conditioning."}
+    pdf = tmp_path / "code.pdf"
+    monkeypatch.setattr(ingest, "pdf_page_hashes", lambda path: [ingest.page_hash(texts[p]) for p in sorted(texts)])
+    monkeypatch.setattr(ingest, "iter_pages", lambda path, pages=None: [
+        {"page": p, "text": texts[p]} for p in sorted(pages or texts)])
+    paths = str(tmp_path / "index.faiss"), str(tmp_path / "chunks.json"), str(tmp_path / "manifest.json")
+    sources = [{"name": "eebc_pdf", "path": str(pdf), "kind": "pdf"}]
+
+    pdf.write_bytes(b"v1")
+    sync_sources(store, sources, *paths)
+    # Page 2 is revised to the same text as page 1: page 1 is unchanged and keeps its chunk
+    texts[2] = notes
+    pdf.write_bytes(b"v2")
+    assert sync_sources(store, sources, *paths)
+
+    ids = [c["chunk_id"] for c in store.chunks]
+    assert len(ids) == 2 and len(set(ids)) == 2
+    assert store.positions(ids) == [0, 1]
@@ -0,0 +1,37 @@
+import faiss
+
+from rag import index as index_mod
+from rag.chunkstore import ChunkStore, store_path_for
+from rag.index import VectorStore
+
+from tests.test_index import CHUNKS, _built
+
+
+def test_chunk_store_round_trip(tmp_path):
+    chunks = [dict(c, chunk_id=f"c{i}") for i, c in enumerate(CHUNKS)] + [{"page": 7, "text": "untagged", "chunk_id": "u"}]
+    path = str(tmp_path / "chunks.bin")
+    ChunkStore.write(chunks, path, fingerprint="fp")
+    store = ChunkStore(path)
+    assert len(store) == len(chunks) and store.fingerprint == "fp"
+    assert [store[i] for i in range(len(chunks))] == chunks
+    store[0]["text"] = "changed"                 # fresh dict per access
+    assert store[0]["text"] == chunks[0]["text"]
+
+
+def test_load_prefers_mmapped_store(tmp_path):
+    _, paths = _built(tmp_path)
+    loaded = VectorStore(backend="hashing", model="hashing-64")
+    loaded.load(*paths)
+    assert isinstance(loaded.chunks, ChunkStore) and loaded.chunks.path == store_path_for(paths[1])
+    assert loaded.describe()["index"]["mmapped"] == index_mod.INDEX_MMAP
+
+
+def test_load_without_faiss_mmap_support(tmp_path, monkeypatch):
+    _, paths = _built(tmp_path)
+    monkeypatch.setattr(index_mod, "INDEX_MMAP", True)
+    monkeypatch.delattr(faiss, "IO_FLAG_MMAP_IFC")
+    loaded = VectorStore(backend="hashing", model="hashing-64")
+    loaded.load(*paths)
+    assert loaded.index is not None and loaded.index.ntotal == len(CHUNKS)
+    assert not loaded.describe()["index"]["mmapped"]
+    assert loaded.search("chiller COP", top_k=1, mode="dense")[0]["chunk_id"] == "c0"
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from rag import cli, paths
+from tests.test_index import _built
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    for name, value in {"FAISS_PATH": tmp_path / "index.faiss", "CHUNKS_PATH": tmp_path / "chunks.json",
+                        "MANIFEST_PATH": tmp_path / "manifest.json", "LOCK_PATH": tmp_path / "index.faiss.lock"}.items():
+        monkeypatch.setattr(paths, name, str(value))
+    monkeypatch.setattr(paths, "SOURCES", [])
+    return tmp_path
+
+
+def _snapshot(d):
+    return {p: os.stat(os.path.join(d, p)).st_mtime_ns for p in os.listdir(d)}
+
+
+@pytest.mark.parametrize("model, code", [("hashing-384", 0), ("hashing-64", 1)])
+def test_check_index_only_reads(index_dir, capsys, model, code):
+    _built(index_dir, model=model)  # the CLI embeds with EMBED_MODEL=hashing-384
+    before = _snapshot(index_dir)
+    assert cli.main(["check-index"]) == code
+    assert _snapshot(index_dir) == before
+    assert ("MISMATCH" in capsys.readouterr().out) == bool(code)
+
+
+def test_check_index_without_an_index(index_dir, capsys):
+    assert cli.main(["check-index"]) == 1
+    assert "No index" in capsys.readouterr().out and os.listdir(index_dir) == []
+
+
+def test_rebuild_without_chunks_is_a_clear_error(index_dir, capsys):
+    assert cli.main(["rebuild-index"]) == 1
+    assert "rebuild-index --from-sources" in capsys.readouterr().out
+
+
+def test_rebuild_reembeds_saved_chunks(index_dir):
+    _built(index_dir, model="hashing-64")
+    assert cli.main(["rebuild-index"]) == 0
+    assert cli.main(["check-index"]) == 0
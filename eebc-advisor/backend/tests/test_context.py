@@ -0,0 +1,48 @@
+from rag.context import compact_context, count_tokens, pack_sources, source_label, split_units
+from rag.schemas import BuildingContext
+
+CHILLERS = {
+    "page": 44, "chunk_id": "a", "score": 0.9,
+    "text": "6.3.2 Chillers\nWater-cooled chillers shall have a COP of at least 5.8.\n"
+            "Air-cooled chillers shall have a COP of at least 3.1.\n"
+            "The manufacturer shall certify ratings.\nRatings are at AHRI\nstandard conditions.",
+}
+LIGHTING = {
+    "page": 88, "chunk_id": "b", "score": 0.5,
+    "text": "9.3.1 Interior lighting power\nOffice LPD shall not exceed 9.5 W/m2.\n"
+            "Water-cooled chillers shall have a COP of at least 5.8.",
+}
+
+
+def test_split_units_rejoins_wrapped_lines():
+    assert split_units(CHILLERS["text"])[-1] == "Ratings are at AHRI standard conditions."
+    assert split_units("First rule. Second rule; (a) item; b) item") == ["First rule.", "Second rule;", "(a) item; b) item"]
+
+
+def test_count_tokens_estimate():
+    assert count_tokens("") == 0
+    assert count_tokens("COP 5.8") == 4            # "COP", "5", ".", "8"
+    assert count_tokens("insulation") == 3
+
+
+def test_pack_sources_respects_budget_and_cites_every_source():
+    out = pack_sources("water-cooled chiller COP", [CHILLERS, LIGHTING], budget=80)
+    assert [s["chunk_id"] for s in out] == ["a", "b"]
+    assert sum(count_tokens(s["excerpt"]) for s in out) <= 80
+    assert "certify" not in out[0]["excerpt"]      # over budget
+    assert "5.8" in out[0]["excerpt"] and out[0]["excerpt"].startswith("6.3.2 Chillers")
+    # the repeated sentence is only taken from the higher-ranked chunk
+    assert "Water-cooled" not in out[1]["excerpt"]
+
+
+def test_pack_sources_marks_gaps_and_keeps_sheets():
+    form = {"page": 3, "chunk_id": "f", "sheet": "HVAC(P)", "text": "Form 'HVAC(P)'\nEquipment: Chiller; COP: 5.8"}
+    out = pack_sources("air-cooled chiller certification ratings", [CHILLERS, form], budget=60, max_sources=5)
+    assert "…" in out[0]["excerpt"]
+    assert out[1]["sheet"] == "HVAC(P)" and source_label(out[1]) == "Form 'HVAC(P)'"
+    assert source_label(out[0]) == "p.44"
+
+
+def test_compact_context():
+    assert compact_context(None) == "(none provided)"
+    assert compact_context(BuildingContext(floor_area_m2=1200)) == '{"floor_area_m2": 1200.0}'
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+
+from rag.embed_cache import EmbeddingCache, _ModelShelf, text_key
+
+
+def _vecs(n, dim=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_text_key_collapses_whitespace():
+    assert text_key("U-value  of\n roofs ") == text_key("U-value of roofs")
+    assert text_key("roof") != text_key("roofs")
+
+
+def test_round_trip_and_reload(tmp_path):
+    keys = [text_key(f"t{i}") for i in range(5)]
+    vecs = _vecs(5)
+    cache = EmbeddingCache(str(tmp_path), max_entries=16, memory_items=0)
+    assert cache.get_many("m", keys) == [None] * 5
+    cache.put_many("m", keys, vecs)
+
+    fresh = EmbeddingCache(str(tmp_path), max_entries=16, memory_items=0)
+    got = fresh.get_many("m", keys)
+    assert all(np.array_equal(g, v) for g, v in zip(got, vecs))
+    assert fresh.hits == 5 and fresh.misses == 0
+
+
+def test_ring_buffer_evicts_oldest(tmp_path):
+    shelf = _ModelShelf(str(tmp_path), "m", capacity=4)
+    keys = [text_key(f"t{i}") for i in range(6)]
+    shelf.put_many(keys, _vecs(6))
+    assert shelf.get(keys[0]) is None and shelf.get(keys[1]) is None
+    assert all(shelf.get(k) is not None for k in keys[2:])
+    assert os.path.getsize(shelf.vec_path) == 4 * 8 * 4
+
+
+def test_row_reused_by_another_worker_is_a_miss(tmp_path):
+    a = _ModelShelf(str(tmp_path), "m", capacity=2)
+    b = _ModelShelf(str(tmp_path), "m", capacity=2)
+    old = [text_key("a"), text_key("b")]
+    a.put_many(old, _vecs(2, seed=1))
+    b.refresh()
+    assert b.rows[old[0]] == 0
+
+    # a wraps the ring: row 0 now holds another text, b's log view is stale
+    new, new_vec = [text_key("c")], _vecs(1, seed=2)
+    a.put_many(new, new_vec)
+    assert b.rows.get(old[0]) == 0
+    assert b.get(old[0]) is None
+    assert old[0] not in b.rows
+    assert np.array_equal(b.get(new[0]), new_vec[0])  # caught up on the log
+
+
+def test_cache_without_tags_is_rewritten(tmp_path):
+    keys = [text_key("a")]
+    shelf = _ModelShelf(str(tmp_path), "m", capacity=4)
+    shelf.put_many(keys, _vecs(1))
+    os.remove(shelf.tag_path)  # as written before rows were tagged
+
+    shelf = _ModelShelf(str(tmp_path), "m", capacity=4)
+    assert shelf.get(keys[0]) is None
+    vec = _vecs(1, seed=3)
+    shelf.put_many(keys, vec)
+    assert np.array_equal(shelf.get(keys[0]), vec[0])
+
+
+def test_log_replay_waits_for_complete_lines(tmp_path):
+    a = _ModelShelf(str(tmp_path), "m", capacity=8)
+    keys = [text_key("a"), text_key("b")]
+    a.put_many(keys[:1], _vecs(1))
+    b = _ModelShelf(str(tmp_path), "m", capacity=8)
+    assert b.rows == {keys[0]: 0} and b.cursor == 1
+
+    # a concurrent writer has flushed only part of its next log line
+    with open(a.log_path, "a", encoding="ascii") as f:
+        f.write("1 " + keys[1][:10])
+    b.refresh()
+    assert keys[1] not in b.rows and b.cursor == 1
+    with open(a.log_path, "a", encoding="ascii") as f:
+        f.write(keys[1][10:] + "\n")
+    b.refresh()
+    assert b.rows[keys[1]] == 1 and b.cursor == 2
+
+
+def test_reader_replays_a_log_compacted_by_another_process(tmp_path):
+    a = _ModelShelf(str(tmp_path), "m", capacity=4)
+    b = _ModelShelf(str(tmp_path), "m", capacity=4)
+    keys = [text_key(f"t{i}") for i in range(7)]
+    a.put_many(keys[:3], _vecs(3))
+    b.refresh()
+    assert b._log_offset == a._log_offset
+
+    a.put_many(keys[3:], _vecs(4, seed=1))
+    a._compact()  # a new file: b's offset no longer points at a line start
+    b.refresh()
+    assert b.rows == a.rows and b.cursor == a.cursor
+    assert all(b.get(k) is not None for k in keys[3:]) and b.get(keys[0]) is None
+
+    # b writes next: it must continue from a's cursor, not overwrite rows it never saw
+    b.put_many([text_key("new")], _vecs(1, seed=2))
+    a.refresh()
+    assert a.rows == b.rows and a.get(keys[3]) is None and a.get(keys[4]) is not None
+
+
+def test_malformed_log_lines_are_skipped(tmp_path):
+    a = _ModelShelf(str(tmp_path), "m", capacity=4)
+    key = text_key("a")
+    a.put_many([key], _vecs(1))
+    with open(a.log_path, "a", encoding="ascii") as f:
+        f.write("87\nx y z\n9 " + text_key("b") + "\n")
+    b = _ModelShelf(str(tmp_path), "m", capacity=4)
+    assert b.rows == {key: 0} and b.get(key) is not None
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from rag.embed_cache import EmbeddingCache
+from rag.embedder import HashingEmbedder, make_embedder, model_dim, resolve_backend
+from rag.net import shared_aiohttp_session
+
+
+def test_model_dim():
+    assert model_dim("hashing-96") == 96
+    assert model_dim("voyage-3") == 1024
+    assert model_dim("unknown-model") is None
+
+
+def test_resolve_backend_rejects_unknown():
+    assert resolve_backend("hashing", None) == ("hashing", "hashing-384")
+    with pytest.raises(ValueError):
+        resolve_backend("word2vec", None)
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    emb = HashingEmbedder("hashing-64", batch_size=2)
+    texts = ["roof U-value", "chiller COP", "roof U-value", "lighting LPD", ""]
+    vecs = emb.encode(texts)
+    assert vecs.shape == (5, 64) and vecs.dtype == np.float32
+    assert np.array_equal(vecs[0], vecs[2])
+    assert np.allclose(np.linalg.norm(vecs[:4], axis=1), 1.0, atol=1e-5)
+    assert np.array_equal(vecs, HashingEmbedder("hashing-64").encode(texts))
+
+
+def test_cache_serves_repeats(tmp_path):
+    calls = []
+
+    class Counting(HashingEmbedder):
+        def _embed(self, texts):
+            calls.append(list(texts))
+            return super()._embed(texts)
+
+    emb = Counting("hashing-32", cache=EmbeddingCache(str(tmp_path)))
+    first = emb.encode(["a roof", "a wall", "a roof"])
+    assert calls == [["a roof", "a wall"]]       # unique misses only
+    second = emb.encode(["a  wall", "a window"])   # whitespace variants share an entry
+    assert calls[-1] == ["a window"]
+    assert np.array_equal(second[0], first[1])
+
+
+def test_make_embedder_hashing_skips_cache(tmp_path):
+    emb = make_embedder("hashing", "hashing-16", cache=EmbeddingCache(str(tmp_path)))
+    assert isinstance(emb, HashingEmbedder) and emb.cache is None
+
+
+def test_voyage_aencode_awaits_the_async_client(fakes):
+    emb = make_embedder("voyage", "voyage-3-lite")
+    texts = [f"roof insulation {i}" for i in range(16)]
+    fakes.config["embed_latency_ms"] = 200
+    before = fakes.stats["voyage"].get("embeddings", 0)
+
+    async def run():
+        start = time.monotonic()
+        out = await asyncio.gather(*(emb.aencode([t]) for t in texts))
+        took = time.monotonic() - start
+        await shared_aiohttp_session().close()
+        return np.vstack(out), took
+
+    vecs, took = asyncio.run(run())
+    assert fakes.stats["voyage"]["embeddings"] - before == len(texts)
+    # In threads the voyage policy allows 4 calls at a time (4 rounds of 200 ms); awaited calls all overlap
+    assert took < 0.6
+    assert vecs.shape == (16, 512)
+    assert np.allclose(vecs, emb.encode(texts), atol=1e-6)
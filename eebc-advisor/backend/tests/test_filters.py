@@ -0,0 +1,64 @@
+import pytest
+
+from rag import agents, ann
+from rag.filters import where_key, ChunkMeta, FILTER_CONFIG
+from rag.index import VectorStore
+from tests.test_index import CHUNKS
+
+
+def test_where_key_normalises():
+    assert where_key(None) is None and where_key({}) is None and where_key({"source": []}) is None
+    assert where_key({"source": "excel_forms"}) == (("source", ("excel_forms",)),)
+    assert where_key({"section": ["9.3.", " 5"], "pages": ["30", 41]}) == \
+        (("pages", (30, 41)), ("section", ("5", "9.3")))
+    assert where_key({"source": ["b", "a"]}) == where_key({"source": ("a", "b")})
+    with pytest.raises(ValueError):
+        where_key({"chapter": "6"})
+
+
+def test_chunk_meta_mask():
+    chunks = [dict(c, chunk_id=f"c{i}") for i, c in enumerate(CHUNKS)]
+    chunks[3].pop("source")  # untagged chunks count as the default source
+    meta = ChunkMeta(chunks, "eebc_pdf")
+    assert list(meta.mask(where_key({"source": "excel_forms"}))) == [False, False, False, False, True]
+    assert list(meta.mask(where_key({"source": "eebc_pdf", "pages": (30, 41)}))) == [True, True, False, True, False]
+    # "6" covers 6.3.2 and 6.4; "9.3" covers 9.3.1 but "9.31" would not
+    assert list(meta.mask(where_key({"section": "6"}))) == [True, True, False, False, False]
+    assert list(meta.mask(where_key({"section": ["9.3", "5"]}))) == [False, False, True, True, True]
+    assert not meta.mask(where_key({"section": "9.31"})).any()
+
+
+@pytest.mark.parametrize("kind, exact_max", [("flat", 4096), ("hnsw", 4096), ("hnsw", 0)])
+def test_filtered_search(monkeypatch, kind, exact_max):
+    monkeypatch.setitem(ann.INDEX_CONFIG, "type", kind)
+    monkeypatch.setitem(FILTER_CONFIG, "exact_max", exact_max)  # 0: the HNSW ID-selector path
+    store = VectorStore(backend="hashing", model="hashing-64", retrieval_mode="dense")
+    store.build([dict(c, chunk_id=f"c{i}") for i, c in enumerate(CHUNKS)])
+    assert ann.index_type_of(store.index) == kind
+
+    hits = store.search("lighting power density for offices", top_k=5, where={"source": "excel_forms"})
+    assert [h["chunk_id"] for h in hits] == ["c4"]
+    hits = store.search("chiller COP", top_k=5, where={"section": "6"})
+    assert {h["chunk_id"] for h in hits} == {"c0", "c1"}
+    assert store.search("roof", top_k=5, where={"pages": (500, 600)}) == []
+    assert store.selection({"section": "6"}) is store.selection({"section": ["6"]})  # cached per key
+
+
+@pytest.mark.parametrize("message, where", [
+    ("What does page 40 say?", {"pages": (40, 40)}),
+    ("pp. 30-41 roof insulation", {"pages": (30, 41), "section": ["5"]}),
+    ("Which form sheet covers lighting?", {"source": "excel_forms"}),
+    ("Chiller COP and duct insulation", {"section": ["5", "6"]}),
+    ("Roof insulation, chiller COP and office lighting", None),  # three chapters: too broad
+    ("Does the code apply to us?", None),
+])
+def test_route(message, where):
+    assert agents.route(message) == where
+
+
+def test_route_falls_back_to_the_whole_index(tmp_path):
+    from tests.test_index import _built
+
+    store, _ = _built(tmp_path)
+    hits = agents._routed_search(store, ["office lighting"], 4, {"source": "excel_forms"})
+    assert len(hits) >= agents.ROUTE_MIN_HITS  # one form chunk is too few: searched again unfiltered
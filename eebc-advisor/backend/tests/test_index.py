@@ -0,0 +1,46 @@
+import pytest
+
+from rag.index import VectorStore, IndexMismatchError
+
+CHUNKS = [
+    {"page": 40, "source": "eebc_pdf", "section": "6.3.2", "text": "6.3.2 Chillers\nWater-cooled chillers shall have a COP of at least 5.8."},
+    {"page": 41, "source": "eebc_pdf", "section": "6.4", "text": "6.4 Ducts\nSupply ducts shall be insulated to R-1.41 outside the envelope."},
+    {"page": 88, "source": "eebc_pdf", "section": "9.3.1", "text": "9.3.1 Interior lighting power\nOffice LPD shall not exceed 9.5 W/m2."},
+    {"page": 30, "source": "eebc_pdf", "section": "5.2", "text": "5.2 Roofs\nRoof U-value shall not exceed 0.45 W/m2K."},
+    {"page": 3, "source": "excel_forms", "sheet": "Lighting (P)", "section": "9.3.1", "text": "Form 'Lighting (P)'\nSpace: Office; LPD (W/m2): 9.5"},
+]
+
+
+def _built(tmp_path, model="hashing-64"):
+    store = VectorStore(backend="hashing", model=model)
+    store.build([dict(c, chunk_id=f"c{i}") for i, c in enumerate(CHUNKS)])
+    paths = str(tmp_path / "index.faiss"), str(tmp_path / "chunks.json")
+    store.save(*paths)
+    return store, paths
+
+
+def test_load_rejects_other_model(tmp_path):
+    _, paths = _built(tmp_path)
+    other = VectorStore(backend="hashing", model="hashing-32")
+    with pytest.raises(IndexMismatchError):
+        other.load(*paths)
+    assert other.index is None and len(other.chunks) == 0
+
+
+def test_save_load_round_trip(tmp_path):
+    store, paths = _built(tmp_path)
+    loaded = VectorStore(backend="hashing", model="hashing-64")
+    loaded.load(*paths)
+    assert loaded.index.ntotal == len(CHUNKS)
+    assert [loaded.chunks[i]["chunk_id"] for i in range(len(CHUNKS))] == [f"c{i}" for i in range(len(CHUNKS))]
+    assert loaded.describe()["sources"] == {"eebc_pdf": 4, "excel_forms": 1}
+
+
+def test_search_many_merges_queries(tmp_path):
+    store, _ = _built(tmp_path)
+    hits = store.search_many(["chiller COP", "office lighting power density", "  "], top_k=2, mode="dense")
+    ids = [h["chunk_id"] for h in hits]
+    assert len(ids) == len(set(ids))  # one entry per chunk, best score kept
+    assert "c0" in ids and {"c2", "c4"} & set(ids)
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+    assert store.search_many(["", None], top_k=2) == []
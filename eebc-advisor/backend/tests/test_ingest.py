@@ -0,0 +1,59 @@
+import copy
+
+from rag import ingest
+from rag.manifest import IngestManifest, _changed_pages, sync_sources
+
+from tests.conftest import FORM_SHEETS, write_workbook
+
+
+def test_changed_pages_excel(tmp_path):
+    xlsx = write_workbook(tmp_path / "forms.xlsx")
+    source = {"name": "excel_forms", "path": xlsx, "kind": "excel"}
+    hashes, todo, pages = _changed_pages(source, [])
+    assert len(hashes) == len(FORM_SHEETS) and todo == {1, 2}
+    assert [p["sheet"] for p in pages] == list(FORM_SHEETS)
+
+    hashes2, todo, pages = _changed_pages(source, hashes)
+    assert hashes2 == hashes and todo == set() and list(pages) == []
+
+    sheets = copy.deepcopy(FORM_SHEETS)
+    sheets["HVAC(P)"][2][1] = 6.1
+    write_workbook(tmp_path / "forms.xlsx", sheets)
+    _, todo, pages = _changed_pages(source, hashes)
+    assert todo == {2} and [p["sheet"] for p in pages] == ["HVAC(P)"]
+
+
+def test_changed_pdf_page_also_rechunks_the_next(monkeypatch):
+    monkeypatch.setattr(ingest, "pdf_page_hashes", lambda path: ["h1", "h2*", "h3", "h4", "h5*"])
+    monkeypatch.setattr(ingest, "iter_pages", lambda path, pages: [{"page": p, "text": ""} for p in sorted(pages)])
+    source = {"name": "eebc_pdf", "path": "code.pdf", "kind": "pdf"}
+
+    # page 2 changed (page 3 may continue its clause); page 5 changed and is the last page
+    _, todo, pages = _changed_pages(source, ["h1", "h2", "h3", "h4", "h5"])
+    assert todo == {2, 3, 5}
+    assert [p["page"] for p in pages] == [2, 3, 5]
+
+    # pages appended to the PDF are new
+    _, todo, _ = _changed_pages(source, ["h1", "h2*", "h3"])
+    assert todo == {4, 5}
+
+
+def test_sync_patches_only_changed_sheets(tmp_path, store):
+    paths = str(tmp_path / "index.faiss"), str(tmp_path / "chunks.json"), str(tmp_path / "manifest.json")
+    xlsx = write_workbook(tmp_path / "forms.xlsx")
+    sources = [{"name": "excel_forms", "path": xlsx, "kind": "excel"}]
+    sync_sources(store, sources, *paths)
+    before = {c["chunk_id"]: c for c in store.chunks}
+    lighting = {cid for cid, c in before.items() if c["sheet"] == "Lighting (P)"}
+
+    sheets = copy.deepcopy(FORM_SHEETS)
+    sheets["HVAC(P)"][2][1] = 6.1
+    write_workbook(tmp_path / "forms.xlsx", sheets)
+    assert sync_sources(store, sources, *paths)
+
+    after = {c["chunk_id"]: c for c in store.chunks}
+    assert lighting <= set(after)                  # untouched sheet kept its chunks
+    assert any("6.1" in c["text"] for c in after.values() if c["sheet"] == "HVAC(P)")
+    assert not any("5.8" in c["text"] for c in after.values())
+    assert store.index.ntotal == len(store.chunks)
+    assert IngestManifest(paths[2]).sources["excel_forms"]["n_chunks"] == len(store.chunks)
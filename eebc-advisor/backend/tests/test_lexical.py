@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from rag.lexical import BM25Index, rrf, tokenize, is_clause_lookup
+
+DOCS = [
+    {"chunk_id": "a", "text": "Table 4.2 roof insulation U-value 0.45 W/m2K"},
+    {"chunk_id": "b", "text": "Chillers shall meet the minimum COP in Table 6.3"},
+    {"chunk_id": "c", "text": "Lighting power density for offices, clause 9.3.1"},
+    {"chunk_id": "d", "text": "Roof and wall insulation requirements for the envelope"},
+]
+
+
+def test_tokenize_keeps_clause_numbers():
+    assert tokenize("What does Table 4.2.1 say about kWth?") == ["table", "4.2.1", "say", "about", "kwth"]
+
+
+@pytest.mark.parametrize("query,expected", [
+    ("Table 4.2", True),
+    ("clause 5.3.1 requirements", True),
+    ("Annex B", True),
+    ("roof insulation", False),
+    ("table", False),
+    ("what does table 4.2 say about roof insulation in hot climates", False),
+])
+def test_is_clause_lookup(query, expected):
+    assert is_clause_lookup(query) is expected
+
+
+def test_rrf_unweighted():
+    fused = rrf([[(1, 9.0), (2, 8.0)], [(2, 0.5), (3, 0.4)]], k=60)
+    assert [d for d, _ in fused] == [2, 1, 3]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+
+def test_bm25_ranks_and_masks():
+    bm = BM25Index.build(DOCS)
+    assert bm.search("roof insulation", 2)[0][0] in (0, 3)
+    assert {d for d, _ in bm.search("roof insulation", 4)} == {0, 3}
+    assert bm.search("Table 6.3", 1)[0][0] == 1
+    assert bm.search("chilers", 1)[0][0] == 1       # fuzzy match of a typo
+    assert bm.search("nothing relevant here", 4) == []
+    mask = np.array([False, True, True, True])
+    assert [d for d, _ in bm.search("roof insulation", 4, mask)] == [3]
+
+
+def test_bm25_save_load(tmp_path):
+    bm = BM25Index.build(DOCS)
+    path = str(tmp_path / "bm25.npz")
+    bm.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.fingerprint == bm.fingerprint
+    assert loaded.search("lighting power density", 3) == bm.search("lighting power density", 3)
+def test_rrf_weights_shift_the_order():
+    a, b = [(1, 0.0), (2, 0.0)], [(2, 0.0), (1, 0.0)]
+    assert rrf([a, b])[0][1] == pytest.approx(rrf([a, b])[1][1])  # a tie without weights
+    assert rrf([a, b], weights=[1.0, 0.5])[0][0] == 1
+    assert rrf([a, b], weights=[0.5, 1.0])[0][0] == 2
+    assert dict(rrf([a], k=0, weights=[2.0]))[1] == pytest.approx(2.0)
+
+
@@ -0,0 +1,59 @@
+import os
+
+from rag.index import VectorStore
+from rag.manifest import IngestManifest, sync_sources
+
+from tests.conftest import FORM_SHEETS, write_workbook
+
+
+def _paths(tmp_path):
+    return str(tmp_path / "index.faiss"), str(tmp_path / "chunks.json"), str(tmp_path / "manifest.json")
+
+
+def test_manifest_round_trip(tmp_path):
+    xlsx = write_workbook(tmp_path / "forms.xlsx")
+    m = IngestManifest(str(tmp_path / "manifest.json"))
+    fp = m.fingerprint({"path": xlsx}, "hashing-64")
+    assert not m.is_current("forms", fp)
+    m.record("forms", fp, 7, pages=["a", "b"])
+    m.save()
+
+    m2 = IngestManifest(m.path)
+    assert m2.is_current("forms", fp)
+    assert not m2.is_current("forms", dict(fp, model="voyage-3"))
+    assert m2.can_patch("forms", fp, 7)
+    assert not m2.can_patch("forms", fp, 6)  # index no longer matches the record
+
+
+def test_sync_is_idempotent(tmp_path, store):
+    faiss_path, chunks_path, manifest_path = _paths(tmp_path)
+    sources = [{"name": "excel_forms", "path": write_workbook(tmp_path / "forms.xlsx"), "kind": "excel"}]
+
+    assert sync_sources(store, sources, faiss_path, chunks_path, manifest_path)
+    n = len(store.chunks)
+    assert n and store.source_counts() == {"excel_forms": n}
+    assert not sync_sources(store, sources, faiss_path, chunks_path, manifest_path)
+
+    reloaded = VectorStore(backend="hashing", model="hashing-64")
+    reloaded.load(faiss_path, chunks_path)
+    assert not sync_sources(reloaded, sources, faiss_path, chunks_path, manifest_path)
+    assert len(reloaded.chunks) == n
+
+
+def test_missing_source_is_skipped(tmp_path, store):
+    faiss_path, chunks_path, manifest_path = _paths(tmp_path)
+    sources = [{"name": "excel_forms", "path": str(tmp_path / "nope.xlsx"), "kind": "excel"}]
+    assert not sync_sources(store, sources, faiss_path, chunks_path, manifest_path)
+    assert not os.path.exists(manifest_path)
+
+
+def test_model_change_reingests(tmp_path, store):
+    faiss_path, chunks_path, manifest_path = _paths(tmp_path)
+    sources = [{"name": "excel_forms", "path": write_workbook(tmp_path / "forms.xlsx"), "kind": "excel"}]
+    sync_sources(store, sources, faiss_path, chunks_path, manifest_path)
+
+    other = VectorStore(backend="hashing", model="hashing-32")
+    assert sync_sources(other, sources, faiss_path, chunks_path, manifest_path)
+    assert other.index.d == 32
+    assert IngestManifest(manifest_path).sources["excel_forms"]["model"] == "hashing-32"
+    assert len(FORM_SHEETS) == len(IngestManifest(manifest_path).sources["excel_forms"]["pages"])
@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+from rag.metrics import Counter, Histogram, request_trace, stage, traced, render
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, stage="x")
+    samples = {(name, tuple(labels)): v for name, labels, v in h.samples()}
+    assert samples[("t_seconds_bucket", (("stage", "x"), ("le", "0.1")))] == 1
+    assert samples[("t_seconds_bucket", (("stage", "x"), ("le", "1")))] == 2
+    assert samples[("t_seconds_bucket", (("stage", "x"), ("le", "+Inf")))] == 3
+    assert samples[("t_seconds_count", (("stage", "x"),))] == 3
+
+
+def test_counter_sums_per_label_set():
+    c = Counter("t_total", "test", ("kind",))
+    c.inc(kind="a")
+    c.inc(2, kind="a")
+    c.inc(kind="b")
+    assert c.samples() == [("t_total", [("kind", "a")], 3), ("t_total", [("kind", "b")], 1)]
+
+
+def test_trace_collects_stages_and_calls():
+    @traced("work")
+    def work():
+        return 1
+
+    with request_trace() as trace:
+        work()
+        work()
+        with pytest.raises(ValueError):
+            with stage("broken"):
+                raise ValueError("x")
+    header = trace.server_timing()
+    assert re.search(r'work;dur=[\d.]+;desc="x2"', header)
+    assert "broken;dur=" in header and header.split(", ")[-1].startswith("total;dur=")
+    assert set(trace.as_dict()) == {"work", "broken", "total"}
+    assert 'eebc_stage_errors_total{stage="broken",error="ValueError"}' in render()
+
+
+def test_generators_are_timed_until_exhausted():
+    @traced("stream")
+    def chunks():
+        yield "a"
+        yield "b"
+
+    with request_trace() as trace:
+        gen = chunks()
+        assert next(gen) == "a"
+        assert "stream" not in trace.as_dict()
+        assert list(gen) == ["b"]
+    assert "stream" in trace.as_dict()
@@ -0,0 +1,148 @@
+import gc
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rag import utils
+from rag.net import (DeadlineExceeded, ProviderPolicy, SingleFlight, TokenBucket, classify, remaining,
+                     request_deadline, stage_deadline, submit)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.headers = headers or {}
+
+
+@pytest.mark.parametrize("exc,expected", [
+    (HTTPError(429, {"retry-after-ms": "250"}), (True, 0.25)),
+    (HTTPError(429, {"retry-after": "2"}), (True, 2.0)),
+    (HTTPError(503), (True, None)),
+    (HTTPError(400), (False, None)),
+    (TimeoutError(), (True, None)),
+    (ValueError("bad json"), (False, None)),
+])
+def test_classify(exc, expected):
+    assert classify(exc) == expected
+
+
+def _policy(**kw):
+    return ProviderPolicy("test", **dict(dict(max_retries=3, base_delay=0.001, max_delay=0.002), **kw))
+
+
+def test_retries_transient_errors_then_succeeds():
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise HTTPError(503)
+        return "ok"
+
+    p = _policy()
+    assert p.call(fn) == "ok"
+    assert len(calls) == 3 and p.stats["retries"] == 2
+
+
+def test_does_not_retry_client_errors():
+    p = _policy()
+    with pytest.raises(HTTPError):
+        p.call(lambda t: (_ for _ in ()).throw(HTTPError(400)))
+    assert p.stats == {"calls": 1, "retries": 0, "errors": 1, "deadline_exceeded": 0}
+
+
+def test_retry_after_beyond_the_deadline_gives_up():
+    p = _policy()
+    with request_deadline(0.2), pytest.raises(HTTPError):
+        p.call(lambda t: (_ for _ in ()).throw(HTTPError(429, {"retry-after": "5"})))
+    assert p.stats["deadline_exceeded"] == 1
+
+
+def test_call_timeout_is_capped_by_the_deadline():
+    p = _policy(timeout=30.0)
+    with request_deadline(1.0):
+        assert p.call(lambda t: t) <= 1.0
+    with request_deadline(0.001):
+        time.sleep(0.01)
+        with pytest.raises(DeadlineExceeded):
+            p.call(lambda t: t)
+
+
+def test_stage_deadline_only_tightens():
+    assert remaining() is None
+    with stage_deadline(5.0):
+        assert 4.5 < remaining() <= 5.0
+    with request_deadline(1.0), stage_deadline(5.0):
+        assert remaining() <= 1.0
+
+
+def test_submit_carries_the_deadline():
+    with ThreadPoolExecutor(1) as pool, request_deadline(2.0):
+        assert 0 < submit(pool, remaining).result() <= 2.0
+        assert pool.submit(remaining).result() is None
+
+
+def test_token_bucket_refuses_waits_past_the_deadline():
+    bucket = TokenBucket(rate=1.0, burst=1)
+    bucket.acquire()
+    with request_deadline(0.1), pytest.raises(DeadlineExceeded):
+        bucket.acquire()
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    sf, calls, gate = SingleFlight(), [], threading.Event()
+
+    def slow():
+        calls.append(1)
+        gate.wait(1.0)
+        return 42
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(sf.do, "k", slow) for _ in range(4)]
+        time.sleep(0.05)
+        gate.set()
+        assert [f.result() for f in futures] == [42] * 4
+    assert len(calls) == 1 and sf.coalesced == 3
+
+
+def test_single_flight_shares_errors_and_forgets_the_key():
+    sf = SingleFlight()
+    with pytest.raises(KeyError):
+        sf.do("k", lambda: {}["missing"])
+    assert sf.do("k", lambda: 1) == 1
+
+
+def test_reset_after_fork_holds_objects_weakly():
+    class Thing:
+        pass
+
+    before = len(utils._fork_resets)
+    t = Thing()
+    utils.reset_after_fork(t, lambda o: None)
+    assert len(utils._fork_resets) == before + 1
+    del t
+    gc.collect()
+    assert len(utils._fork_resets) == before
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_reset_after_fork_runs_in_the_child():
+    class Conn:
+        pid = None
+
+    c = Conn()
+    utils.reset_after_fork(c, lambda o: setattr(o, "pid", os.getpid()))
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(w, str(c.pid == os.getpid()).encode())
+        os._exit(0)
+    os.close(w)
+    assert os.read(r, 16) == b"True"
+    os.close(r)
+    os.waitpid(pid, 0)
+    assert c.pid is None  # the parent is untouched
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rag import agents
+
+
+def test_timed_out_stages_release_the_pool(fakes, monkeypatch):
+    fakes.config["llm_latency_ms"] = 1500
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(agents, "_pool", pool)
+    monkeypatch.setitem(agents.PIPELINE_CONFIG, "timeouts", {"intake": 0.3, "queries": 0.3, "search": 0.3})
+
+    start = time.monotonic()
+    ctx, hits = agents.intake_and_retrieve_concurrent("Which rules cover our new office building?", None, None)
+    assert time.monotonic() - start < 1.0
+    assert ctx is not None and hits == []  # regex-only context, no store
+
+    # Both workers ran an LLM call that nobody waits for any more; they must stop
+    # at the stage deadline, not when the 1.5 s reply arrives
+    queued = time.monotonic()
+    pool.submit(lambda: None).result(timeout=5)
+    assert time.monotonic() - queued < 0.6
+    pool.shutdown()
+
+
+QUESTION = "What COP do water-cooled chillers need?"
+
+
+def _events(store):
+    return list(agents.run_pipeline_stream(QUESTION, None, store))
+
+
+async def _aevents(store):
+    return [e async for e in agents.arun_pipeline_stream(QUESTION, None, store)]
+
+
+def _check_stream(events, answer):
+    assert [e for e, _ in events][0] == "meta" and events[-1] == ("done", {"answer": answer})
+    assert "".join(d["text"] for e, d in events if e == "token").strip() == answer
+    return events[0][1]
+
+
+def test_entry_points_share_the_steps(fakes, tmp_path):
+    from tests.test_index import _built
+
+    store, _ = _built(tmp_path)
+    answer, applies, reason, sources = agents.run_pipeline(QUESTION, None, store)
+    assert answer.startswith("- ") and sources
+    meta = _check_stream(_events(store), answer)
+    assert meta == {"applies": applies, "reason": reason, "sources": sources}
+
+    assert asyncio.run(agents.arun_pipeline(QUESTION, None, store)) == (answer, applies, reason, sources)
+    assert _check_stream(asyncio.run(_aevents(store)), answer) == meta
+
+
+def test_async_pipeline_awaits_query_embeddings(fakes, tmp_path, monkeypatch):
+    from tests.test_index import _built
+
+    store, _ = _built(tmp_path)
+    expected = agents.run_pipeline(QUESTION, None, store)
+
+    def blocking_encode(texts):
+        raise AssertionError("query embedded on a worker thread")
+
+    monkeypatch.setattr(store.embedder, "encode", blocking_encode)
+    assert asyncio.run(agents.arun_pipeline(QUESTION, None, store)) == expected
+
+
+def test_fast_path_emits_the_same_events(fakes, store):
+    message = "Does the EEBC apply to a new 1200 m2 office building?"
+    fast = agents.applicability_fast_path(message, None, store)
+    assert fast is not None
+    assert agents.run_pipeline(message, None, store) == fast
+    events = list(agents.run_pipeline_stream(message, None, store))
+    assert events == [("meta", {"applies": fast[1], "reason": fast[2], "sources": fast[3]}),
+                      ("token", {"text": fast[0]}), ("done", {"answer": fast[0]})]
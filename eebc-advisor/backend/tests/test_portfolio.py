@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from rag import portfolio
+from rag.agents import applicability
+from rag.portfolio import read_portfolio, normalize_portfolio, classify, screen, to_ndjson, row_context, columns
+
+EDGES = [  # floor area, kVA, cooling, heating -> applies
+    ({"floor_area_m2": 1000}, "yes"),  # inclusive
+    ({"floor_area_m2": 999.9}, "no"),
+    ({"electrical_demand_kva": 500}, "yes"),  # inclusive
+    ({"electrical_demand_kva": 499}, "no"),
+    ({"cooling_capacity_kwth": 350}, "no"),  # exclusive
+    ({"cooling_capacity_kwth": 350.1}, "yes"),
+    ({"heating_capacity_kwth": 250}, "no"),  # exclusive
+    ({"heating_capacity_kwth": 251}, "yes"),
+    ({}, "unknown"),
+]
+
+
+def _frame(rows):
+    return normalize_portfolio(read_portfolio([dict(r, id=f"b{i}") for i, r in enumerate(rows)]))
+
+
+def test_classify_threshold_edges():
+    df = _frame([dict({"floor_area_m2": None}, **values) for values, _ in EDGES])
+    applies, met, known = classify(df)
+    assert list(applies) == [want for _, want in EDGES]
+    assert met.shape == known.shape == (len(EDGES), 4)
+    cols = columns(df)
+    # Same verdicts as the per-request applicability()
+    assert [applicability(row_context(cols, i))[0] for i in range(len(df))] == list(applies)
+
+
+def test_headers_units_and_numbers_are_normalised():
+    df = normalize_portfolio(read_portfolio([{"Building": "A", "GFA sqft": "12,000 ft²", "Cooling TR": 100}]))
+    assert df["floor_area_m2"][0] == pytest.approx(12000 * 0.09290304)
+    assert df["cooling_capacity_kwth"][0] == pytest.approx(351.685)
+    with pytest.raises(ValueError):
+        normalize_portfolio(read_portfolio([{"name": "A", "colour": "red"}]))
+
+
+def test_screen_rules_only_and_ndjson():
+    df = _frame([{"floor_area_m2": 2400}, {"floor_area_m2": 200}, {"floor_area_m2": None, "notes": "a shop"}])
+    lines = [json.loads(line) for line in to_ndjson(screen(df, llm="off"))]
+    rows, summary = lines[:-1], lines[-1]["summary"]
+    assert [r["applies"] for r in rows] == ["yes", "no", "unknown"]
+    assert rows[0]["values"] == {"floor_area_m2": 2400} and rows[1]["below"] == ["floor_area_m2"]
+    assert summary["rows"] == 3 and summary["llm_rows"] == 0 and summary["errors"] == 0
+    assert (summary["yes"], summary["no"], summary["unknown"]) == (1, 1, 1)
+
+
+def test_failed_intake_is_flagged(monkeypatch):
+    def broken(message, ctx, strict=False):
+        assert strict
+        raise RuntimeError("429 Too Many Requests")
+
+    monkeypatch.setattr(portfolio, "intake", broken)
+    df = _frame([{"floor_area_m2": None, "notes": "warehouse with 1,500 m2 floor area"},
+                 {"floor_area_m2": 1200}])
+    rows = list(screen(df, llm="auto"))
+    assert rows[0]["row"] == 1 and "error" not in rows[0]
+    flagged = rows[1]
+    assert flagged["llm"] is False and "429" in flagged["error"]
+    assert flagged["applies"] == "yes"  # regex still read the notes
+    assert rows[-1]["summary"]["errors"] == 1 and rows[-1]["summary"]["llm_rows"] == 1
+
+
+def test_llm_rows_read_notes(fakes):
+    df = _frame([{"floor_area_m2": None, "notes": "new office, 1,800 m2 gross floor area"}])
+    row = next(screen(df, llm="auto"))
+    assert row["llm"] is True and "error" not in row
+    assert row["applies"] == "yes" and row["values"]["floor_area_m2"] == pytest.approx(1800)
@@ -0,0 +1,36 @@
+import pytest
+
+from rag.rerank import LexicalReranker, make_reranker
+
+
+def _cands():
+    return [
+        {"chunk_id": "x", "page": 10, "source": "eebc_pdf", "text": "General definitions of terms used in the code."},
+        {"chunk_id": "y", "page": 44, "source": "eebc_pdf", "text": "Table 6.3 minimum chiller COP 5.8 for water-cooled chillers."},
+        {"chunk_id": "z", "page": 45, "source": "eebc_pdf", "text": "Chiller controls and sequencing."},
+    ]
+
+
+def test_lexical_rerank_prefers_exact_terms_and_clause_numbers():
+    out = LexicalReranker().rerank("Table 6.3 chiller COP", _cands())
+    assert out[0]["chunk_id"] == "y"
+    assert [c["rerank_score"] for c in out] == sorted((c["rerank_score"] for c in out), reverse=True)
+
+
+def test_pair_scores_are_cached():
+    r = LexicalReranker()
+    r.rerank("chiller COP", _cands())
+    r.rerank("  Chiller   COP ", _cands())         # same normalized query
+    assert r.stats["pairs_scored"] == 3 and r.stats["cache_hits"] == 3
+
+
+def test_single_candidate_is_untouched():
+    one = _cands()[:1]
+    assert LexicalReranker().rerank("anything", one) is one
+
+
+def test_make_reranker():
+    assert make_reranker("none") is None
+    assert isinstance(make_reranker("lexical"), LexicalReranker)
+    with pytest.raises(ValueError):
+        make_reranker("bm42")
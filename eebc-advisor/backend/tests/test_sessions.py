@@ -0,0 +1,77 @@
+import time
+
+import numpy as np
+import pytest
+
+from rag import agents
+from rag.index import VectorStore
+from rag.sessions import SessionStore, MemoryBackend, SqliteBackend, valid_session_id
+from tests.test_index import CHUNKS
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    store = SessionStore(MemoryBackend())
+    monkeypatch.setattr(agents, "_sessions", store)
+    return store
+
+
+@pytest.fixture
+def dense_store():
+    store = VectorStore(backend="hashing", model="hashing-64", retrieval_mode="dense")
+    store.build([dict(c, chunk_id=f"c{i}") for i, c in enumerate(CHUNKS)])
+    return store
+
+
+def test_sessions_are_opt_in(sessions, monkeypatch):
+    assert agents.session_id_for(None) is None
+    sid = agents.session_id_for("new")
+    assert valid_session_id(sid) and agents.session_id_for(sid) == sid
+    monkeypatch.setattr(agents, "_sessions", None)
+    assert agents.session_id_for(sid) is None
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_backends_round_trip_and_expire(kind, tmp_path):
+    backend = MemoryBackend() if kind == "memory" else SqliteBackend(str(tmp_path / "s.sqlite"))
+    store = SessionStore(backend, ttl_seconds=60, max_entries=2)
+    vecs = np.ones((2, 4), dtype=np.float16)
+    store.save("a" * 16, {"ctx": {"floor_area_m2": 1200}, "history": [], "turns": 1, "vecs": vecs})
+    got = store.get("a" * 16)
+    assert got["ctx"] == {"floor_area_m2": 1200} and np.array_equal(got["vecs"], vecs)
+    assert store.get("b" * 16) is None and (store.hits, store.misses) == (1, 1)
+
+    for sid in ("b" * 16, "c" * 16):  # LRU bound
+        store.save(sid, {"ctx": {}, "history": [], "turns": 1, "vecs": None})
+    assert store.get("a" * 16) is None and backend.size() == 2
+    backend.put("d" * 16, {"ctx": {}, "vecs": None}, time.time() - 120)  # idle past the ttl
+    assert store.get("d" * 16) is None
+
+
+def test_followup_carries_context_and_pool_without_bm25(fakes, sessions, dense_store):
+    sid = agents.session_id_for("new")
+    agents.run_pipeline("We are building a 1,200 m2 office. What COP do water-cooled chillers need?",
+                        None, dense_store, sid)
+    sess = sessions.get(sid)
+    assert sess["turns"] == 1 and sess["ctx"]["floor_area_m2"] == 1200
+    assert sess["candidates"] and sess["vecs"].shape == (len(sess["candidates"]), dense_store.index.d)
+    assert sess["fingerprint"] == dense_store.fingerprint
+
+    answer, _, _, sources = agents.run_pipeline("And how must supply ducts be insulated?", None, dense_store, sid)
+    sess = sessions.get(sid)
+    assert sess["turns"] == 2 and [h["q"] for h in sess["history"]][0].startswith("We are building")
+    assert sess["ctx"]["floor_area_m2"] == 1200 and sources
+    assert dense_store._lexical is None  # dense-only index: sessions never build BM25
+
+
+def test_cache_hit_keeps_the_carried_pool(fakes, sessions, dense_store, monkeypatch):
+    sid = agents.session_id_for("new")
+    agents.run_pipeline("What COP do water-cooled chillers need?", None, dense_store, sid)
+    pool = sessions.get(sid)["candidates"]
+
+    hit = {"answer": "- cached (p.40).", "applies": "unknown", "reason": "r",
+           "sources": [{"page": 40, "chunk_id": "c0", "excerpt": "x"}]}
+    monkeypatch.setattr(agents, "_cache_probe", lambda *a, **k: (None, None, hit))
+    assert agents.run_pipeline("Chiller COP?", None, dense_store, sid)[0] == hit["answer"]
+    sess = sessions.get(sid)
+    assert sess["turns"] == 2 and sess["candidates"] == pool
@@ -0,0 +1,42 @@
+import pytest
+
+from rag import agents
+from rag.verify import check_answer, cited_pages, threshold_values
+
+SOURCES = [{"page": 40, "excerpt": "Water-cooled chillers shall have a COP of at least 5.8."},
+           {"page": 3, "sheet": "Lighting (P)", "excerpt": "Office LPD 9.5 W/m2"}]
+PROMPT = "Question: what COP do chillers need? [S1] p.40: COP of at least 5.8. [S2] Form 'Lighting (P)': LPD 9.5 W/m2"
+
+
+@pytest.mark.parametrize("answer, failed", [
+    ("- Water-cooled chillers need a COP of at least 5.8 (p.40).", []),
+    ("- Office LPD must stay at or below 9.5 W/m2 (Form 'Lighting (P)').", []),
+    ("- Too short (p.40).", ["empty"]),
+    ("- Water-cooled chillers need a COP of at least 5.8 per the code.", ["citations"]),
+    ("- Water-cooled chillers need a COP of at least 5.8 (p.41).", ["pages"]),
+    ("- Water-cooled chillers need a COP of at least 6.1 (p.40).", ["numbers"]),
+    ("- Chillers need a COP of 6.1 and ducts R-1.41 (Form 'HVAC(P)').", ["pages", "numbers"]),
+])
+def test_check_answer(answer, failed):
+    assert check_answer(answer, PROMPT, SOURCES) == failed
+
+
+def test_page_ranges_and_clause_numbers():
+    assert cited_pages("see (pp. 40-42) and p.7") == {40, 42, 7}
+    # Clause numbers and citations are not threshold values; 40 % is
+    assert threshold_values("Per 6.3.2 (p.40), keep WWR below 40 %.") == ["40", "40"]
+    assert check_answer("- Keep the window-to-wall ratio below 40 % overall (p.40).",
+                        "WWR 0.4 maximum", SOURCES) == []  # 0.4 grounds 40 %
+
+
+@pytest.mark.parametrize("miss_rate, escalated", [(0.0, 0), (1.0, 1)])
+def test_cascade_escalates_failed_drafts(fakes, monkeypatch, miss_rate, escalated):
+    fakes.config["draft_miss_rate"] = miss_rate
+    monkeypatch.setitem(agents.GROQ_CONFIG, "answer_mode", "cascade")
+    monkeypatch.setattr(agents, "_cascade_counts", {"drafts": 0, "escalated": 0})
+    sys, user, sources = agents.answer_prompt("What COP do chillers need?", agents.BuildingContext(),
+                                              [dict(SOURCES[0], chunk_id="c0", text=SOURCES[0]["excerpt"], score=1.0)],
+                                              "unknown", "r")
+    answer = "".join(agents._answer_deltas(sys, user, sources))
+    assert check_answer(answer, user, sources) == []  # served drafts and reason answers both cite
+    assert agents._cascade_counts == {"drafts": 1, "escalated": escalated}
@@ -53,6 +53,10 @@ export default function App() {
 
   const contextPayload = useMemo(() => cleanContext(ctx), [ctx]);
 
+  // Server-side conversation session: follow-ups reuse its context and retrieved chunks.
+  // The first turn sends "new"; the server answers with the id to send from then on.
+  const [sessionId, setSessionId] = useState(null);
+
   const [messages, setMessages] = useState([
     {
       id: uid(),
@@ -92,27 +96,63 @@ export default function App() {
     try {
       const API_BASE = import.meta.env.VITE_API_BASE_URL; // set in Render Static Site env vars
 
-      const res = await fetch(`${API_BASE}/api/chat`, {
+      const res = await fetch(`${API_BASE}/api/chat/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: text, context: contextPayload }),
+        body: JSON.stringify({ message: text, context: contextPayload, session_id: sessionId ?? "new" }),
       });
 
-      if (!res.ok) {
+      if (!res.ok || !res.body) {
         const raw = await res.text();
         throw new Error(`Backend error (${res.status}): ${raw}`);
       }
 
-      const data = await res.json();
-      const botMsg = {
-        id: uid(),
-        role: "assistant",
-        content: data.answer ?? "",
-        meta: { applies: data.applies ?? "unknown", reason: data.reason ?? "" },
-        sources: data.sources ?? [],
-        ts: Date.now(),
-      };
-      setMessages((m) => [...m, botMsg]);
+      // Server-sent events: "meta" (applies/reason/sources/session_id) arrives as soon as
+      // retrieval is done, then "token" deltas, then "done".
+      const botId = uid();
+      const patchBot = (fn) => setMessages((m) => m.map((x) => (x.id === botId ? fn(x) : x)));
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buf = "";
+
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+
+        let sep;
+        while ((sep = buf.indexOf("\n\n")) !== -1) {
+          const block = buf.slice(0, sep);
+          buf = buf.slice(sep + 2);
+          const event = block.match(/^event: (.*)$/m)?.[1];
+          const dataLine = block.match(/^data: (.*)$/m)?.[1];
+          if (!event || !dataLine) continue;
+          const data = JSON.parse(dataLine);
+
+          if (event === "meta") {
+            setBusy(false);
+            if (data.session_id) setSessionId(data.session_id);
+            setMessages((m) => [
+              ...m,
+              {
+                id: botId,
+                role: "assistant",
+                content: "",
+                meta: { applies: data.applies ?? "unknown", reason: data.reason ?? "" },
+                sources: data.sources ?? [],
+                ts: Date.now(),
+              },
+            ]);
+          } else if (event === "token") {
+            patchBot((x) => ({ ...x, content: x.content + data.text }));
+          } else if (event === "done") {
+            patchBot((x) => ({ ...x, content: data.answer ?? x.content }));
+          } else if (event === "error") {
+            throw new Error(data.error || "Something went wrong.");
+          }
+        }
+      }
     } catch (e) {
       setToast(e?.message || "Something went wrong.");
     } finally {
@@ -285,7 +325,7 @@ function ChatBubble({ msg }) {
               {msg.sources.map((s, i) => (
                 <div className="src" key={s.chunk_id || i}>
                   <div className="srcTop">
-                    <span className="srcTag">p.{s.page}</span>
+                    <span className="srcTag">{s.sheet ? `Form '${s.sheet}'` : `p.${s.page}`}</span>
                     <span className="srcId">{s.chunk_id}</span>
                     {typeof s.score === "number" && <span className="srcScore">{s.score.toFixed(3)}</span>}
                   </div>